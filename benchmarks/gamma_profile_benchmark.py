@@ -0,0 +1,71 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from benchmarks.iv_benchmark import PROJECT_ROOT, current_commit
+from benchmarks.synthetic_chain import generate_chain
+from processing import gamma_profile, schema
+from processing.iv_models import bs_kernel
+
+# ---------------------------- Configuration ---------------------------- #
+
+RESULTS_FILE = PROJECT_ROOT / "outputs" / "benchmarks" / "gamma_profile.csv"
+
+# ---------------------------- Reference Profile ---------------------------- #
+
+def reference_profile(chain, grid):
+    """Profile from bs_kernel.calculate_greeks re-run at every grid spot (one full greek pass per level)."""
+    K = chain["strikePrice"].to_numpy(dtype=float)
+    T = chain["T"].to_numpy(dtype=float)
+    r = chain["SOFR"].to_numpy(dtype=float)
+    sigma = chain["impliedVolatility"].to_numpy(dtype=float)
+    oi = chain["openInterest"].to_numpy(dtype=float)
+    is_call = (chain["putCall"] == "CALL").to_numpy()
+    sign = np.where(is_call, 1.0, -1.0)
+    profile = []
+    for spot in grid:
+        terms = bs_kernel.shared_terms(np.full(len(K), spot), K, T, r)
+        gamma = bs_kernel.calculate_greeks(terms, sigma, is_call)["gamma"]
+        profile.append(np.nansum(gamma * oi * spot ** 2 * 100 * sign) / 1_000_000)
+    return np.array(profile)
+
+# ---------------------------- Main Execution ---------------------------- #
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the spot-sweep gamma profile on a synthetic chain.")
+    parser.add_argument("--strikes", type=int, default=400, help="Strikes each side of spot.")
+    parser.add_argument("--expirations", type=int, default=23, help="Number of daily expirations (EoM-sized by default).")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    chain = schema.enforce(generate_chain(expiration_days=tuple(range(args.expirations)),
+                                          strikes_each_side=args.strikes), "chain")
+    chain["impliedVolatility"] = chain.pop("true_iv")
+    spot = float(chain["spotPrice"].iloc[0])
+
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        profile, level = gamma_profile.sweep(chain, spot)
+        timings.append(time.perf_counter() - start)
+
+    grid = profile["spot"].to_numpy()
+    reference = reference_profile(chain, grid[::25])
+    max_error = float(np.max(np.abs(profile["GEX"].to_numpy()[::25] - reference)))
+
+    report = pd.DataFrame([{
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": current_commit(),
+        "contracts": len(chain),
+        "spots": len(grid),
+        "seconds": min(timings),
+        "zero_gamma": level,
+        "max_abs_error": max_error,
+    }])
+    print(report.drop(columns=["timestamp"]).to_string(index=False, float_format=lambda v: f"{v:.6g}"))
+
+    RESULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(RESULTS_FILE, mode="a", header=not RESULTS_FILE.exists(), index=False)
+    print(f"Results appended to {RESULTS_FILE}")
@@ -0,0 +1,139 @@
+import argparse
+import subprocess
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+from loguru import logger
+
+from benchmarks.synthetic_chain import generate_chain
+from processing import schema
+from processing.iv_models import iv_stage, bs_kernel
+
+# ---------------------------- Configuration ---------------------------- #
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_FILE = PROJECT_ROOT / "outputs" / "benchmarks" / "iv_benchmark.csv"
+
+# The stage logs one summary per model per call; keep benchmark output readable
+logger.disable("processing.iv_models.iv_stage")
+
+# ---------------------------- Helpers ---------------------------- #
+
+def current_commit():
+    """Short hash of the checked-out commit ('unknown' outside a git checkout)."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def score_model(chain, model, results):
+    """IV and gamma errors of one model's results against the generating volatility."""
+    truth = chain.set_index(["expirationDays", "strikePrice", "putCall"])["true_iv"]
+    res = iv_stage.select_model(results, model)
+    keys = pd.MultiIndex.from_frame(res[["expirationDays", "strikePrice", "putCall"]])
+    true_iv = truth.reindex(keys).to_numpy()
+    iv_error = np.abs(res["impliedVolatility"].to_numpy() - true_iv)
+
+    terms = bs_kernel.shared_terms(res["spotPrice"], res["strikePrice"], res["T"], res["SOFR"])
+    is_call = (res["putCall"] == "CALL").to_numpy()
+    true_gamma = bs_kernel.calculate_greeks(terms, true_iv, is_call)["gamma"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gamma_error = np.abs(res["gamma"].to_numpy() - true_gamma) / np.abs(true_gamma)
+    solved = (res["iv_source"] == "solved").to_numpy()
+    return {
+        "coverage": len(res) / len(chain),
+        "iv_mae": float(np.nanmean(iv_error)) if iv_error.size else np.nan,
+        "iv_p95_error": float(np.nanpercentile(iv_error, 95)) if iv_error.size else np.nan,
+        "iv_mae_solved": float(np.nanmean(iv_error[solved])) if solved.any() else np.nan,
+        "gamma_median_rel_error": float(np.nanmedian(gamma_error)) if gamma_error.size else np.nan,
+    }
+
+# ---------------------------- Benchmark ---------------------------- #
+
+def run_benchmark(models, index="SPX", chains=20, minutes_to_close=120, strikes_each_side=None,
+                  price_noise=0.01, smile_fit=True):
+    """
+    Run every model over `chains` synthetic chains (different noise seeds) and return one
+    summary row per model: throughput, per-chain latency percentiles and accuracy.
+    """
+    iv_stage.smile_fit_enabled = smile_fit
+    generated = [schema.enforce(generate_chain(index=index, minutes_to_close=minutes_to_close,
+                                               strikes_each_side=strikes_each_side,
+                                               price_noise=price_noise, seed=seed), "chain")
+                 for seed in range(chains)]
+    rows_per_chain = len(generated[0])
+
+    # Warm-up so import/first-call costs do not land in the latency figures
+    iv_stage.run_models(generated[0], models)
+
+    summary = []
+    for model in models:
+        latencies = []
+        scores = []
+        for chain in generated:
+            start = time.perf_counter()
+            results, _, _ = iv_stage.run_models(chain, [model])
+            latencies.append(time.perf_counter() - start)
+            scores.append(score_model(chain, model, results))
+        latencies = np.array(latencies)
+        scores = pd.DataFrame(scores).mean()
+        summary.append({
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": current_commit(),
+            "model": model,
+            "index": index,
+            "chains": chains,
+            "contracts_per_chain": rows_per_chain,
+            "minutes_to_close": minutes_to_close,
+            "price_noise": price_noise,
+            "smile_fit": smile_fit,
+            "contracts_per_sec": rows_per_chain * chains / latencies.sum(),
+            "latency_p50_ms": np.percentile(latencies, 50) * 1000,
+            "latency_p99_ms": np.percentile(latencies, 99) * 1000,
+            **scores.to_dict(),
+        })
+    return pd.DataFrame(summary)
+
+def store_results(summary):
+    """Append the run to the results file and print it next to the previous commit's run."""
+    previous = pd.read_csv(RESULTS_FILE) if RESULTS_FILE.exists() else pd.DataFrame()
+    RESULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    summary.to_csv(RESULTS_FILE, mode="a", header=not RESULTS_FILE.exists(), index=False)
+    print(f"Results appended to {RESULTS_FILE}")
+
+    print(summary.drop(columns=["timestamp"]).to_string(index=False, float_format=lambda v: f"{v:.5g}"))
+    if previous.empty:
+        return
+    scenario = ["model", "index", "contracts_per_chain", "minutes_to_close", "price_noise", "smile_fit"]
+    earlier = previous[previous["commit"] != summary["commit"].iloc[0]]
+    if earlier.empty:
+        return
+    baseline = earlier.groupby(scenario, as_index=False).last()
+    compare = summary.merge(baseline, on=scenario, suffixes=("", "_prev"))
+    if compare.empty:
+        return
+    print("\nAgainst the last run on another commit:")
+    for _, row in compare.iterrows():
+        print(f"{row['model']}: {row['contracts_per_sec']:.0f} vs {row['contracts_per_sec_prev']:.0f} contracts/s "
+              f"({row['commit_prev']}), p99 {row['latency_p99_ms']:.1f} vs {row['latency_p99_ms_prev']:.1f} ms, "
+              f"IV MAE {row['iv_mae']:.5f} vs {row['iv_mae_prev']:.5f}")
+
+# ---------------------------- Main Execution ---------------------------- #
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="IV/Greeks speed and accuracy benchmark on synthetic chains.")
+    parser.add_argument("--models", nargs="+", default=list(iv_stage.MODELS), choices=list(iv_stage.MODELS))
+    parser.add_argument("--index", default="SPX", choices=["SPX", "NDX"])
+    parser.add_argument("--chains", type=int, default=20, help="Number of synthetic chains per model.")
+    parser.add_argument("--minutes", type=int, default=120, help="Minutes to the close (0DTE time to expiry).")
+    parser.add_argument("--strikes", type=int, default=None, help="Strikes each side of spot.")
+    parser.add_argument("--noise", type=float, default=0.01, help="Relative noise on traded prices.")
+    parser.add_argument("--no-smile-fit", action="store_true", help="Disable the smile-fit fallback.")
+    args = parser.parse_args()
+
+    store_results(run_benchmark(args.models, index=args.index, chains=args.chains,
+                                minutes_to_close=args.minutes, strikes_each_side=args.strikes,
+                                price_noise=args.noise, smile_fit=not args.no_smile_fit))
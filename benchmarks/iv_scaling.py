@@ -0,0 +1,66 @@
+import argparse
+import os
+import time
+import pandas as pd
+from datetime import datetime
+from loguru import logger
+
+from benchmarks.iv_benchmark import PROJECT_ROOT, current_commit
+from benchmarks.synthetic_chain import generate_chain
+from processing import schema
+from processing.iv_models import iv_stage
+
+# ---------------------------- Configuration ---------------------------- #
+
+RESULTS_FILE = PROJECT_ROOT / "outputs" / "benchmarks" / "iv_scaling.csv"
+
+logger.disable("processing.iv_models.iv_stage")
+
+# ---------------------------- Scaling Report ---------------------------- #
+
+def scaling_report(models, max_workers, chain, repeats=3):
+    """
+    Time the IV stage with 1..max_workers processes on the same chain. Efficiency is
+    speedup / workers against the in-process (1 worker) run; every parallel run is checked
+    against the serial results.
+    """
+    serial, _, _ = iv_stage.run_models(chain, models, workers=1)
+    rows = []
+    for workers in range(1, max_workers + 1):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            results, _, _ = iv_stage.run_models(chain, models, workers=workers)
+            timings.append(time.perf_counter() - start)
+        identical = results.equals(serial)
+        rows.append({"workers": workers, "seconds": min(timings), "identical": identical})
+
+    report = pd.DataFrame(rows)
+    report["speedup"] = report["seconds"].iloc[0] / report["seconds"]
+    report["efficiency"] = report["speedup"] / report["workers"]
+    report.insert(0, "contracts", len(chain))
+    report.insert(0, "models", "+".join(models))
+    report.insert(0, "commit", current_commit())
+    report.insert(0, "timestamp", datetime.now().isoformat(timespec="seconds"))
+    return report
+
+# ---------------------------- Main Execution ---------------------------- #
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scaling of the sharded IV stage from 1 to N worker processes.")
+    parser.add_argument("--models", nargs="+", default=list(iv_stage.MODELS), choices=list(iv_stage.MODELS))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Largest worker count to try.")
+    parser.add_argument("--index", default="SPX", choices=["SPX", "NDX"])
+    parser.add_argument("--strikes", type=int, default=400, help="Strikes each side of spot.")
+    parser.add_argument("--expirations", type=int, default=20, help="Number of daily expirations.")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    chain = schema.enforce(generate_chain(index=args.index, expiration_days=tuple(range(args.expirations)),
+                                          strikes_each_side=args.strikes), "chain")
+    report = scaling_report(args.models, args.workers, chain, repeats=args.repeats)
+    print(report.drop(columns=["timestamp"]).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+    RESULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(RESULTS_FILE, mode="a", header=not RESULTS_FILE.exists(), index=False)
+    print(f"Results appended to {RESULTS_FILE}")
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from scipy.stats import norm
+
+# ---------------------------- Synthetic Option Chain ---------------------------- #
+# Builds chains with the same columns as SPX_Option_Chain.xlsx from a known volatility
+# smile, so IV models can be scored against the volatility that generated the prices.
+
+SECONDS_IN_TRADING_YEAR = 252 * 24 * 60 * 60
+
+# Index presets: spot, strike spacing, strikes each side of spot
+INDEX_PRESETS = {
+    "SPX": {"spot": 5800.0, "strike_step": 5.0, "strikes_each_side": 120},
+    "NDX": {"spot": 20500.0, "strike_step": 10.0, "strikes_each_side": 150},
+}
+
+
+def smile_volatility(log_moneyness, T, atm_vol=0.15, skew=-0.8, curvature=2.5):
+    """Ground-truth volatility: skewed quadratic smile in log-moneyness scaled by sqrt(T)."""
+    x = log_moneyness / np.sqrt(np.maximum(T, 1e-8))
+    vol = atm_vol * (1 + skew * x * 0.1 + curvature * (x * 0.1) ** 2)
+    return np.clip(vol, 0.05, 3.0)
+
+
+def black_scholes_price(S, K, T, r, sigma, is_call):
+    """Black-Scholes price used to generate the synthetic quotes."""
+    sqrt_t = np.sqrt(T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * sqrt_t)
+    d2 = d1 - sigma * sqrt_t
+    call = S * norm.cdf(d1) - K * np.exp(-r * T) * norm.cdf(d2)
+    put = K * np.exp(-r * T) * norm.cdf(-d2) - S * norm.cdf(-d1)
+    return np.where(is_call, call, put)
+
+
+def generate_chain(index="SPX", expiration_days=(0, 1, 2, 5, 10, 20), minutes_to_close=120,
+                   strikes_each_side=None, strike_step=None, spot=None, rate=0.0428,
+                   price_noise=0.01, spread=0.10, tick=0.05, seed=0):
+    """
+    Generate one synthetic chain.
+
+    expiration_days: calendar offsets from today; 0 is a 0DTE expiration whose T is
+    minutes_to_close minutes (can be set down to a few minutes).
+    price_noise: relative noise applied to the traded (last) price.
+    spread: bid/ask width around the theoretical price, quotes rounded to tick.
+
+    Returns a DataFrame with the chain columns plus "true_iv" (the generating volatility).
+    """
+    preset = INDEX_PRESETS[index]
+    spot = preset["spot"] if spot is None else spot
+    strike_step = preset["strike_step"] if strike_step is None else strike_step
+    strikes_each_side = preset["strikes_each_side"] if strikes_each_side is None else strikes_each_side
+    rng = np.random.default_rng(seed)
+
+    atm = round(spot / strike_step) * strike_step
+    strikes = atm + strike_step * np.arange(-strikes_each_side, strikes_each_side + 1)
+    today = datetime.now().date()
+
+    frames = []
+    for days in expiration_days:
+        if days == 0:
+            T = minutes_to_close * 60 / SECONDS_IN_TRADING_YEAR
+        else:
+            T = (days * 24 * 60 + minutes_to_close) * 60 / SECONDS_IN_TRADING_YEAR
+        for put_call in ("CALL", "PUT"):
+            frames.append(pd.DataFrame({
+                "strikePrice": strikes,
+                "putCall": put_call,
+                "expirationDate": today + timedelta(days=days),
+                "T": T,
+            }))
+    chain = pd.concat(frames, ignore_index=True)
+    n = len(chain)
+
+    S = np.full(n, spot)
+    K = chain["strikePrice"].to_numpy()
+    T = chain["T"].to_numpy()
+    is_call = (chain["putCall"] == "CALL").to_numpy()
+    true_iv = smile_volatility(np.log(K / (S * np.exp(rate * T))), T)
+    theo = black_scholes_price(S, K, T, rate, true_iv, is_call)
+
+    half_spread = 0.5 * spread * np.maximum(1.0, np.sqrt(theo))
+    bid = np.maximum(np.round((theo - half_spread) / tick) * tick, 0.0)
+    ask = np.maximum(np.round((theo + half_spread) / tick) * tick, tick)
+    last = np.maximum(np.round(theo * (1 + rng.normal(0, price_noise, n)) / tick) * tick, tick)
+    mid = (bid + ask) / 2
+
+    # Option symbols in the Schwab layout (root padded to 6, yymmdd, C/P, strike x 1000)
+    chain["symbol"] = [f"{index + 'W':<6}{e:%y%m%d}{pc[0]}{round(k * 1000):08d}" for e, k, pc in
+                       zip(chain["expirationDate"], K, chain["putCall"])]
+    chain["description"] = [f"{index} {e} {k:g} {pc[0]}" for e, k, pc in
+                            zip(chain["expirationDate"], K, chain["putCall"])]
+    chain["last"] = last
+    chain["mark"] = mid
+    chain["openInterest"] = rng.integers(0, 5000, n)
+    chain["totalVolume"] = rng.integers(0, 2000, n)
+    chain["bid"] = bid
+    chain["ask"] = ask
+    chain["mid"] = mid
+    chain["dividend_yield"] = 0.013
+    chain["SOFR"] = rate
+    chain["spotPrice"] = spot
+    chain["true_iv"] = true_iv
+    return chain
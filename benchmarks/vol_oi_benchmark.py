@@ -0,0 +1,96 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from benchmarks.iv_benchmark import PROJECT_ROOT, current_commit
+from benchmarks.synthetic_chain import generate_chain
+from processing import expiration_buckets, schema
+from processing.oi_vol import vol_oi_initial
+
+# ---------------------------- Configuration ---------------------------- #
+
+RESULTS_FILE = PROJECT_ROOT / "outputs" / "benchmarks" / "vol_oi.csv"
+RANGE_WIDTH = 500
+
+# ---------------------------- Reference Tables ---------------------------- #
+
+def reference_tables(raw, spot, today, timestamp):
+    """
+    Bucket tables built the way the stage used to: four row-wise apply passes for the vol/oi
+    columns, then a date filter and a groupby per bucket on the raw chain.
+    """
+    data = raw[(raw["strikePrice"] >= spot - RANGE_WIDTH) & (raw["strikePrice"] <= spot + RANGE_WIDTH)].copy()
+    data["call vol"] = data.apply(lambda row: row["totalVolume"] if row["putCall"] == "CALL" else 0, axis=1)
+    data["call oi"] = data.apply(lambda row: row["openInterest"] if row["putCall"] == "CALL" else 0, axis=1)
+    data["put vol"] = data.apply(lambda row: row["totalVolume"] if row["putCall"] == "PUT" else 0, axis=1)
+    data["put oi"] = data.apply(lambda row: row["openInterest"] if row["putCall"] == "PUT" else 0, axis=1)
+    data["expirationDate"] = pd.to_datetime(data["expirationDate"]).dt.date
+    tables = {}
+    for bucket, cutoff in expiration_buckets.bucket_cutoffs(today).items():
+        rows = data[(data["expirationDate"] >= today) & (data["expirationDate"] <= cutoff)]
+        grouped = rows.groupby(["strikePrice", "expirationDate"]).agg(
+            {"call vol": "sum", "call oi": "sum", "put vol": "sum", "put oi": "sum"}).reset_index()
+        grouped["timestamp"] = timestamp
+        grouped["spotPrice"] = spot
+        grouped.rename(columns={"strikePrice": "strike"}, inplace=True)
+        tables[bucket] = grouped.sort_values(by=["expirationDate", "strike"]).reset_index(drop=True)
+    return tables
+
+
+def pivot_tables(chain, spot, today, timestamp):
+    """Bucket tables from the stage's single pivot of the in-memory chain."""
+    table = vol_oi_initial.vol_oi_table(chain, spot, RANGE_WIDTH)
+    return {bucket: vol_oi_initial.bucket_table(table, bucket, today, timestamp, spot).drop(columns="expirationDays")
+            for bucket in expiration_buckets.BUCKETS}
+
+
+def best_time(function, repeats):
+    """Fastest of repeated runs and the last result."""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+# ---------------------------- Main Execution ---------------------------- #
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the vol/oi stage (row-wise apply vs one pivot) on an EoM chain.")
+    parser.add_argument("--strikes", type=int, default=400, help="Strikes each side of spot.")
+    parser.add_argument("--expirations", type=int, default=23, help="Number of daily expirations (EoM-sized by default).")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    raw = generate_chain(expiration_days=tuple(range(args.expirations)), strikes_each_side=args.strikes)
+    raw["openInterest"] = np.random.default_rng(0).integers(0, 5000, len(raw))
+    raw = raw.drop(columns="true_iv")
+    chain = schema.enforce(raw, "chain")
+    spot = float(chain["spotPrice"].iloc[0])
+    today = datetime.now().date()
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    apply_seconds, reference = best_time(lambda: reference_tables(raw, spot, today, timestamp), args.repeats)
+    pivot_seconds, pivoted = best_time(lambda: pivot_tables(chain, spot, today, timestamp), args.repeats)
+    identical = all(
+        pivoted[bucket][reference[bucket].columns].astype({col: "float64" for col in ["call vol", "call oi", "put vol", "put oi"]})
+        .equals(reference[bucket].astype({col: "float64" for col in ["call vol", "call oi", "put vol", "put oi"]}))
+        for bucket in expiration_buckets.BUCKETS
+    )
+
+    report = pd.DataFrame([{
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": current_commit(),
+        "contracts": len(chain),
+        "apply_seconds": apply_seconds,
+        "pivot_seconds": pivot_seconds,
+        "speedup": apply_seconds / pivot_seconds,
+        "identical": identical,
+    }])
+    print(report.drop(columns=["timestamp"]).to_string(index=False, float_format=lambda v: f"{v:.6g}"))
+
+    RESULTS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    report.to_csv(RESULTS_FILE, mode="a", header=not RESULTS_FILE.exists(), index=False)
+    print(f"Results appended to {RESULTS_FILE}")
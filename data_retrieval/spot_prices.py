@@ -5,7 +5,8 @@ import pandas as pd
 from datetime import datetime
 from dateutil.relativedelta import relativedelta, FR
 from loguru import logger
-from schwab_api import get_access_token
+from data_retrieval.schwab_api import get_access_token
+from processing import market_context
 
 # -------------------------- Configuration --------------------------
 
@@ -90,17 +91,28 @@ def get_spot_price(schwab_symbol):
         logger.error(f"Error fetching spot price for {schwab_symbol}: {e}")
         return None
 
+def first_value(option_chain, column):
+    """First non-null value of a chain column (SOFR / dividend_yield are the same on every row)."""
+    if column not in option_chain.columns or option_chain[column].dropna().empty:
+        logger.warning(f"Column '{column}' not found in option chain; storing NaN in the market context.")
+        return float("nan")
+    return float(option_chain[column].dropna().iloc[0])
+
 # -------------------------- Main Logic --------------------------
 
 def calculate_spot_price_differences():
     """
     Retrieves SPX, SPY, and ES spot prices, calculates differences,
     updates the SPX option chain with the SPX spot price,
-    and saves results to a new Excel file in the step_one folder.
+    saves results to a new Excel file in the step_one folder and writes the
+    market context (processing/market_context.py) the later stages read.
     """
     # Ensure step_one folder exists
     STEP_ONE_FOLDER.mkdir(parents=True, exist_ok=True)
 
+    # The previous cycle's context must not outlive it: if any quote below fails, this cycle has none
+    market_context.invalidate()
+
     # Load the SPX option chain
     try:
         option_chain = pd.read_excel(OPTION_CHAIN_FILE)
@@ -153,6 +165,18 @@ def calculate_spot_price_differences():
     except Exception as e:
         logger.error(f"Failed to save spot prices to {OUTPUT_FILE}: {e}")
 
+    # Market context for this cycle: one snapshot of the scalars every later stage needs
+    try:
+        context = market_context.build(
+            "SPX", spx_spot_price, "SPY", spy_spot_price, es_contract, es_spot_price,
+            sofr=first_value(option_chain, "SOFR"),
+            dividend_yield=first_value(option_chain, "dividend_yield"),
+        )
+        context.save()
+        logger.info(f"Market context saved to {market_context.CONTEXT_FILE}.")
+    except Exception as e:
+        logger.error(f"Failed to save market context: {e}")
+
 # -------------------------- Main Execution --------------------------
 
 if __name__ == "__main__":
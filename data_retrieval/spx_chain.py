@@ -163,6 +163,7 @@ def flatten_options_data(data):
                 for strike, options in strikes.items():
                     for option in options:
                         flat_option = {
+                            "symbol": option.get("symbol"),
                             "description": option.get("description"),
                             "last": option.get("last"),
                             "mark": option.get("mark"),
@@ -1,6 +1,7 @@
 import csv
 import logging
 import json
+from datetime import datetime
 from pathlib import Path
 
 # Instead of connecting directly to ZeroPanelWidget, we import FilterManager.
@@ -13,6 +14,18 @@ from PySide6.QtWidgets import (
     QTableWidgetItem,
     QMessageBox, QAbstractItemView
 )
+from processing import history_store, schema
+
+# Model whose tables the page shows (the csv_paths.json entries point at hybrid_one)
+STORE_MODEL = "hybrid_one"
+# Unusual activity events shown (latest cycle first) and premium blocks shown (most premium first)
+ACTIVITY_ROWS = 50
+PREMIUM_BLOCK_ROWS = 50
+# Filter panel ranges (filter_data "<key>_min" / "<key>_max") -> table column
+ACTIVITY_FILTERS = {"volume": "volume", "premium": "premium", "strike": "strikePrice", "lastPrice": "mark"}
+PREMIUM_BLOCK_FILTERS = {"volume": "volume", "oi": "oi", "premium": "premium", "strike": "strike", "lastPrice": "mark"}
+# Chain table: ranges checked on each side's columns (lastPrice is the side's mark)
+CHAIN_SIDE_FILTERS = {"volume": "{side} vol", "oi": "{side} oi", "premium": "{side} premium", "lastPrice": "{side} mark"}
 
 class NGController:
     def __init__(self, ui):
@@ -142,56 +155,76 @@ class NGController:
     def onFiltersUpdated(self, filter_data: dict):
         self.logger.debug(f"onFiltersUpdated called with: {filter_data}")
         self.apply_filters_to_table(self.ui.tableWidget_6, filter_data)
-        user_opt_type = filter_data.get("option_type", "All")
-        if user_opt_type == "Calls":
-            self.ui.tableWidget_6.setColumnHidden(4, True)
-            self.ui.tableWidget_6.setColumnHidden(5, True)
-            self.ui.tableWidget_6.setColumnHidden(6, True)
-            self.ui.tableWidget_6.setColumnHidden(0, False)
-            self.ui.tableWidget_6.setColumnHidden(1, False)
-            self.ui.tableWidget_6.setColumnHidden(2, False)
-        elif user_opt_type == "Puts":
-            self.ui.tableWidget_6.setColumnHidden(0, True)
-            self.ui.tableWidget_6.setColumnHidden(1, True)
-            self.ui.tableWidget_6.setColumnHidden(2, True)
-            self.ui.tableWidget_6.setColumnHidden(4, False)
-            self.ui.tableWidget_6.setColumnHidden(5, False)
-            self.ui.tableWidget_6.setColumnHidden(6, False)
-        else:
-            for col in [0,1,2,4,5,6]:
-                self.ui.tableWidget_6.setColumnHidden(col, False)
+        self.show_side_columns(self.ui.tableWidget_6, filter_data.get("option_type", "All"))
+        self.apply_column_filters(self.ui.tableWidget_7, filter_data, PREMIUM_BLOCK_FILTERS)
+        self.apply_column_filters(self.ui.tableWidget_11, filter_data, ACTIVITY_FILTERS)
+
+    @staticmethod
+    def table_headers(table_widget):
+        """Header labels of a table widget's columns."""
+        return [table_widget.horizontalHeaderItem(c).text() if table_widget.horizontalHeaderItem(c) else ""
+                for c in range(table_widget.columnCount())]
+
+    @staticmethod
+    def filter_range(filter_data: dict, key: str):
+        """(min, max) of a filter panel range; blank or invalid bounds are open."""
+        try:
+            low = float(filter_data.get(f"{key}_min", "") or "-inf")
+            high = float(filter_data.get(f"{key}_max", "") or "inf")
+        except ValueError:
+            low, high = float("-inf"), float("inf")
+        return low, high
+
+    @staticmethod
+    def cell_in_range(table_widget, row, headers, column, bounds):
+        """Whether a row's value in the named column is within bounds (True without the column or a number)."""
+        if column not in headers:
+            return True
+        item = table_widget.item(row, headers.index(column))
+        try:
+            return not item or bounds[0] <= float(item.text()) <= bounds[1]
+        except ValueError:
+            return True
+
+    def show_side_columns(self, table_widget, option_type):
+        """Hide the put columns for "Calls" and the call columns for "Puts"."""
+        hidden = {"Calls": "put", "Puts": "call"}.get(option_type)
+        for col, header in enumerate(self.table_headers(table_widget)):
+            table_widget.setColumnHidden(col, hidden is not None and header.startswith(hidden))
 
     def apply_filters_to_table(self, table_widget, filter_data: dict):
-        row_count = table_widget.rowCount()
-        for row in range(row_count):
-            hide_row = False
-            try:
-                vol_min = float(filter_data.get("volume_min", "0") or "0")
-                vol_max = float(filter_data.get("volume_max", "99999999") or "99999999")
-            except ValueError:
-                vol_min, vol_max = 0, 99999999
-            call_vol_item = table_widget.item(row, 0)
-            if call_vol_item:
-                try:
-                    call_vol = float(call_vol_item.text())
-                    if call_vol < vol_min or call_vol > vol_max:
-                        hide_row = True
-                except ValueError:
-                    pass
-            try:
-                strike_min = float(filter_data.get("strike_min", "0") or "0")
-                strike_max = float(filter_data.get("strike_max", "99999999") or "99999999")
-            except ValueError:
-                strike_min, strike_max = 0, 99999999
-            strike_item = table_widget.item(row, 3)
-            if strike_item:
-                try:
-                    strike_val = float(strike_item.text())
-                    if strike_val < strike_min or strike_val > strike_max:
-                        hide_row = True
-                except ValueError:
-                    pass
-            table_widget.setRowHidden(row, hide_row)
+        """
+        Chain table filters: the strike range, and the volume / OI / premium / lastPrice (the
+        side's mark) ranges on the side(s) the option type shows. A row stays when its strike is
+        in range and one shown side passes every range.
+        """
+        headers = self.table_headers(table_widget)
+        sides = {"Calls": ["call"], "Puts": ["put"]}.get(filter_data.get("option_type", "All"), ["call", "put"])
+        strike_bounds = self.filter_range(filter_data, "strike")
+        side_bounds = {template: self.filter_range(filter_data, key) for key, template in CHAIN_SIDE_FILTERS.items()}
+        for row in range(table_widget.rowCount()):
+            keep = self.cell_in_range(table_widget, row, headers, "strike", strike_bounds) and any(
+                all(self.cell_in_range(table_widget, row, headers, template.format(side=side), bounds)
+                    for template, bounds in side_bounds.items())
+                for side in sides
+            )
+            table_widget.setRowHidden(row, not keep)
+
+    def apply_column_filters(self, table_widget, filter_data: dict, ranges: dict, side_column="putCall"):
+        """
+        Hide the rows outside the filter panel's ranges, each range applied to the column with
+        the mapped header, and the rows of the other side when one option type is chosen.
+        """
+        headers = self.table_headers(table_widget)
+        bounds = {column: self.filter_range(filter_data, key) for key, column in ranges.items()}
+        side = {"Calls": "CALL", "Puts": "PUT"}.get(filter_data.get("option_type", "All"))
+        for row in range(table_widget.rowCount()):
+            keep = all(self.cell_in_range(table_widget, row, headers, column, column_bounds)
+                       for column, column_bounds in bounds.items())
+            if side and side_column in headers:
+                item = table_widget.item(row, headers.index(side_column))
+                keep = keep and (not item or item.text() == side)
+            table_widget.setRowHidden(row, not keep)
 
     def show_full_panel(self):
         self.full_panel = FullPanelWidget()
@@ -281,17 +314,23 @@ class NGController:
             "tableWidget_6":  "Chain",
             "tableWidget_9":  "Greeks",
             "tableWidget_4":  "Greek Ratios",
-            "tableWidget_13": "Greek Ranked"
+            "tableWidget_13": "Greek Ranked",
+            "tableWidget_7":  "Premium Blocks",
+            "tableWidget_11": "Unusual Activity"
         }
         columns_to_extract = {
             "Chain": [
                 "call vol",
                 "call oi",
                 "call_vol/oi",
+                "call premium",
+                "call mark",
                 "strike",
                 "put vol",
                 "put oi",
-                "put_vol/oi"
+                "put_vol/oi",
+                "put premium",
+                "put mark"
             ],
             "Greeks": [
                 "strikePrice",
@@ -305,6 +344,11 @@ class NGController:
                 "GEX",
                 "VEX",
                 "CEX",
+                "VOMEX",
+                "ZOMEX",
+                "SPDEX",
+                "COLEX",
+                "VETEX",
                 "Gamma Flip"
             ],
             "Greek Ratios": [
@@ -321,11 +365,40 @@ class NGController:
                 "Rank",
                 "Greek",
                 "Value"
+            ],
+            "Premium Blocks": [
+                "timestamp",
+                "expirationDate",
+                "strike",
+                "putCall",
+                "volume",
+                "oi",
+                "mark",
+                "premium"
+            ],
+            "Unusual Activity": [
+                "timestamp",
+                "expirationDate",
+                "strikePrice",
+                "putCall",
+                "volume",
+                "premium",
+                "mark",
+                "vol_oi",
+                "zscore",
+                "score",
+                "reasons"
             ]
         }
         for widget_name, final_segment in table_map.items():
             if hasattr(self.ui, widget_name):
                 table_widget = getattr(self.ui, widget_name)
+                wanted_cols = columns_to_extract.get(final_segment, None)
+                frame = self.query_store(final_segment, time_segment)
+                if frame is not None:
+                    self.load_frame_into_table(table_widget, frame, wanted_cols)
+                    continue
+
                 csv_key = f"{self.current_index}|{time_segment}|{final_segment}"
                 csv_path = self.csv_paths.get(csv_key, "")
                 self.logger.debug(
@@ -337,11 +410,59 @@ class NGController:
                     )
                     continue
 
-                wanted_cols = columns_to_extract.get(final_segment, None)
                 self.load_csv_into_table(table_widget, csv_path, wanted_cols)
             else:
                 self.logger.warning(f"Widget '{widget_name}' not found in UI. Skipping.")
 
+    def query_store(self, final_segment: str, time_segment: str):
+        """
+        The last recorded cycle of a table from the day's history store, or None when there is
+        none (then the CSV from csv_paths.json is loaded). The SPX pipeline records its cycles.
+        """
+        if self.current_index != "SPX":
+            return None
+        try:
+            if final_segment == "Chain":
+                return history_store.vol_oi(index=self.current_index, bucket=time_segment)
+            if final_segment == "Greeks":
+                df = history_store.contracts(index=self.current_index, model=STORE_MODEL, bucket=time_segment)
+                if df is not None:
+                    df.insert(1, "expirationDate", schema.expiration_dates(df["expirationDays"], datetime.now().date()))
+                return df
+            if final_segment == "Greek Ratios":
+                return history_store.greek_totals(index=self.current_index, model=STORE_MODEL, bucket=time_segment)
+            if final_segment == "Greek Ranked":
+                return history_store.latest_rankings(index=self.current_index, model=STORE_MODEL, bucket=time_segment)
+            if final_segment == "Premium Blocks":
+                df = history_store.premium_blocks(index=self.current_index, bucket=time_segment, n=PREMIUM_BLOCK_ROWS)
+                if df is not None:
+                    df.insert(1, "expirationDate", schema.expiration_dates(df["expirationDays"], datetime.now().date()))
+                return df
+            if final_segment == "Unusual Activity":
+                # Every recorded expiration (the "Full" frame), not only the time segment's
+                df = history_store.activity(index=self.current_index)
+                if df is not None:
+                    df = df.head(ACTIVITY_ROWS)
+                    df.insert(1, "expirationDate", schema.expiration_dates(df["expirationDays"], datetime.now().date()))
+                return df
+        except Exception as e:
+            self.logger.error(f"History store query for '{final_segment}' failed: {e}")
+        return None
+
+    def load_frame_into_table(self, table_widget: QTableWidget, frame, columns=None):
+        """Fill a table widget from a store query, with the same column selection and formatting as the CSVs."""
+        final_headers = [c for c in columns if c in frame.columns] if columns else list(frame.columns)
+        values = frame[final_headers]
+        values = values.astype(object).where(values.notna(), "")
+        table_widget.clear()
+        table_widget.setRowCount(len(values))
+        table_widget.setColumnCount(len(final_headers))
+        table_widget.setHorizontalHeaderLabels(final_headers)
+        for r, row_data in enumerate(values.itertuples(index=False, name=None)):
+            for c, cell_value in enumerate(row_data):
+                table_widget.setItem(r, c, QTableWidgetItem(self.format_cell_value(str(cell_value))))
+        self.logger.debug(f"Loaded {len(values)} rows from the history store with columns {final_headers}.")
+
     def load_csv_into_table(self, table_widget: QTableWidget, csv_file_path: str, columns=None):
         self.logger.debug(f"Attempting to load CSV from '{csv_file_path}' into table widget.")
         csv_file = Path(self.project_root / csv_file_path)
@@ -2,12 +2,15 @@ import json
 import logging
 from pathlib import Path
 
-from PySide6.QtCore import Qt, QUrl, QPoint
+from PySide6.QtCore import Qt, QPoint
 from PySide6.QtWidgets import QMenu, QToolButton, QMessageBox, QButtonGroup
 from PySide6.QtGui import QAction, QIcon
 from PySide6.QtWebEngineWidgets import QWebEngineView
 from PySide6.QtWebEngineCore import QWebEngineSettings
-from utils.html_lookup import load_html_configurations, get_html_path
+from utils.html_lookup import load_html_configurations, get_html_path, load_chart, push_chart_data
+
+# QWebEngineViews of the OW page's charts
+CHART_VIEWS = ["p5_gex_web", "p5_dex_web", "p5_cex_web", "p5_vex_web", "p5_Oi_web", "p5_Vol_web", "p5_VolOi_web"]
 
 
 class OWController:
@@ -64,6 +67,10 @@ class OWController:
             settings.setAttribute(QWebEngineSettings.LocalContentCanAccessRemoteUrls, True)
             self.logger.debug("Enabled remote URL access for ow_wev.")
 
+        # Chart views: a chart shell is loaded once and drawn on loadFinished; later updates
+        # push the new data into it (no reload)
+        self.setup_chart_views()
+
         # Create drop-down menu for the interval toolbutton
         self.setup_interval_toolbutton_menu()
 
@@ -86,6 +93,26 @@ class OWController:
 
         self.logger.debug("OWController initialization complete.")
 
+    def setup_chart_views(self):
+        """
+        Enables JavaScript and remote URL access (plotly.js comes from the CDN) on the 7 chart
+        views and connects their loadFinished to push_chart_data, once.
+        """
+        for view_name in CHART_VIEWS:
+            if hasattr(self.ui, view_name) and isinstance(getattr(self.ui, view_name), QWebEngineView):
+                qweb = getattr(self.ui, view_name)
+                qweb.settings().setAttribute(QWebEngineSettings.LocalContentCanAccessRemoteUrls, True)
+                qweb.settings().setAttribute(QWebEngineSettings.JavascriptEnabled, True)
+                qweb.loadFinished.connect(lambda ok, vn=view_name, q=qweb: self.on_chart_loaded(vn, q, ok))
+            else:
+                self.logger.warning(f"{view_name} QWebEngineView not found in UI.")
+
+    def on_chart_loaded(self, view_name, qweb, ok):
+        """Draws a newly loaded chart shell with its current data."""
+        self.logger.debug(f"{view_name} finished loading: {ok}")
+        if ok:
+            push_chart_data(qweb)
+
     def setup_interval_toolbutton_menu(self):
         """
         Creates and assigns a QMenu to p5_interval_toolbutton.
@@ -216,7 +243,8 @@ class OWController:
         """
         Uses the saved settings (Index, Expiration, IV Method) to construct keys
         and look up the correct HTML file paths from the configuration dictionaries.
-        Loads the charts into the 7 QWebEngineViews on the OW page.
+        Loads the charts into the 7 QWebEngineViews on the OW page; a view already
+        showing its chart only gets the new data pushed into it (no page reload).
         
         For the Greek charts, the keys are constructed as:
            "{index}|{iv_method}|{expiration}|{option}"
@@ -256,15 +284,9 @@ class OWController:
                 self.logger.debug(f"Absolute path for Greek {option}: {abs_path}")
                 if not abs_path.exists():
                     self.logger.error(f"File not found: {abs_path}")
-                # Get the QWebEngineView and set necessary attributes for remote content
                 if hasattr(self.ui, view_name) and isinstance(getattr(self.ui, view_name), QWebEngineView):
-                    qweb = getattr(self.ui, view_name)
-                    qweb.settings().setAttribute(QWebEngineSettings.LocalContentCanAccessRemoteUrls, True)
-                    qweb.settings().setAttribute(QWebEngineSettings.JavascriptEnabled, True)
-                    # Connect a loadFinished signal to log when loading completes.
-                    qweb.loadFinished.connect(lambda ok, vn=view_name: self.logger.debug(f"{vn} finished loading: {ok}"))
-                    qweb.setUrl(QUrl.fromLocalFile(str(abs_path)))
-                    self.logger.debug(f"Loaded Greek chart '{option}' into {view_name}")
+                    action = load_chart(getattr(self.ui, view_name), abs_path)
+                    self.logger.debug(f"Greek chart '{option}' {action} in {view_name}")
                 else:
                     self.logger.warning(f"{view_name} QWebEngineView not found in UI.")
             else:
@@ -287,12 +309,8 @@ class OWController:
                 if not abs_path.exists():
                     self.logger.error(f"File not found: {abs_path}")
                 if hasattr(self.ui, view_name) and isinstance(getattr(self.ui, view_name), QWebEngineView):
-                    qweb = getattr(self.ui, view_name)
-                    qweb.settings().setAttribute(QWebEngineSettings.LocalContentCanAccessRemoteUrls, True)
-                    qweb.settings().setAttribute(QWebEngineSettings.JavascriptEnabled, True)
-                    qweb.loadFinished.connect(lambda ok, vn=view_name: self.logger.debug(f"{vn} finished loading: {ok}"))
-                    qweb.setUrl(QUrl.fromLocalFile(str(abs_path)))
-                    self.logger.debug(f"Loaded Vol/OI chart '{option}' into {view_name}")
+                    action = load_chart(getattr(self.ui, view_name), abs_path)
+                    self.logger.debug(f"Vol/OI chart '{option}' {action} in {view_name}")
                 else:
                     self.logger.warning(f"{view_name} QWebEngineView not found in UI.")
             else:
@@ -22,7 +22,7 @@ class TVController:
             OR
                (B) Greek Exposure submenu →
                      IV Model submenu (with options: Brent Black Scholes, Grok, Hybrid_one) →
-                           Final options: GEX, DEX, VEX, CEX
+                           Final options: GEX, DEX, VEX, CEX (+ VOMEX, ZOMEX, SPDEX, COLEX, VETEX for SPX)
 
     For greek exposure, the key is constructed as:
          "{index}|{iv_model}|{expiration}|{final_option}"
@@ -173,7 +173,7 @@ class TVController:
                 for iv_model in ["Brent Black Scholes", "Grok", "Hybrid_one"]:
                     iv_menu = QMenu(iv_model, iv_model_sub)
                     iv_menu.aboutToShow.connect(lambda im=iv_model, vw=view_number: self.logger.debug(f"View {vw}: IV Model '{im}' submenu about to show."))
-                    for g_item in ["GEX", "DEX", "VEX", "CEX"]:
+                    for g_item in ["GEX", "DEX", "VEX", "CEX", "VOMEX", "ZOMEX", "SPDEX", "COLEX", "VETEX"]:
                         act_g = QAction(g_item, iv_menu)
                         act_g.triggered.connect(lambda checked, idx=index, xp=exp, cat="greek", sub=g_item, model=iv_model, vw=view_number:
                                                   self.load_html_for_view(vw, idx, xp, cat, sub, model))
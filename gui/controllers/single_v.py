@@ -6,8 +6,9 @@ import logging
 from pathlib import Path
 from PySide6.QtWidgets import QMenu, QToolButton, QMessageBox
 from PySide6.QtGui import QAction
-from PySide6.QtCore import Qt, QUrl, QTimer
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtWebEngineCore import QWebEngineSettings
+from utils.html_lookup import load_chart, push_chart_data
 
 class SingleVController:
     """
@@ -49,6 +50,8 @@ class SingleVController:
         self.ui.p3_wev.settings().setAttribute(QWebEngineSettings.LocalContentCanAccessFileUrls, True)
         self.ui.p3_wev.settings().setAttribute(QWebEngineSettings.LocalContentCanAccessRemoteUrls, True)
         self.logger.debug("Enabled local file and remote URL access for p3_wev")
+        # A chart shell is drawn once loaded; later refreshes push data into it (no reload)
+        self.ui.p3_wev.loadFinished.connect(lambda ok: ok and push_chart_data(self.ui.p3_wev))
 
         # Setup drop menus (Index, IV Model, Expiration, Chart, Vol/OI, Interval)
         self.setup_drop_menus()
@@ -166,7 +169,8 @@ class SingleVController:
 
     def create_chart_menu(self):
         menu = QMenu(self.ui.toolButton_4)
-        for item in ["GEX", "DEX", "VEX", "CEX"]:
+        for item in ["GEX", "DEX", "VEX", "CEX", "VOMEX", "ZOMEX", "SPDEX", "COLEX", "VETEX",
+                     "GEX Heatmap", "GEX Surface"]:
             action = QAction(item, menu)
             action.triggered.connect(lambda checked, i=item: self.set_chart(i))
             menu.addAction(action)
@@ -273,26 +277,14 @@ class SingleVController:
         abs_path = self.project_root / rel_path
         self.logger.debug(f"Absolute path resolved as: {abs_path}")
 
-        short_err_msg = f"No file was found for {index} {iv_model} {expiration} {chart}"
-        try:
-            with open(abs_path, "r", encoding="utf-8") as f:
-                html_content = f.read()
-        except FileNotFoundError:
-            QMessageBox.critical(None, "File Not Found", short_err_msg, QMessageBox.Ok)
-            return
-        except OSError:
-            QMessageBox.critical(None, "Error", short_err_msg, QMessageBox.Ok)
+        if not abs_path.is_file():
+            QMessageBox.critical(None, "File Not Found",
+                                 f"No file was found for {index} {iv_model} {expiration} {chart}", QMessageBox.Ok)
             return
 
-        if index == "NDX":
-            base_folder = self.project_root / "visualization" / "NDX" / "plotly" / "full"
-        else:
-            base_folder = self.project_root / "visualization" / "plotly" / "full"
-        base_url = QUrl.fromLocalFile(str(base_folder))
-        self.logger.debug(f"Base URL set to: {base_url.toString()}")
-
-        self.ui.p3_wev.setHtml(html_content, baseUrl=base_url)
-        self.logger.debug(f"Loaded Greek Expo HTML from {abs_path} with base URL {base_url.toString()}")
+        # The chart shell loads once; while it is shown, a refresh only pushes the new data
+        action = load_chart(self.ui.p3_wev, abs_path)
+        self.logger.debug(f"Greek Expo chart {abs_path}: {action}")
         self.last_page_type = "greek_expo"
 
     def load_vol_oi_html(self):
@@ -325,8 +317,8 @@ class SingleVController:
 
         rel_path = config[key]
         abs_path = self.project_root / rel_path
-        self.ui.p3_wev.setUrl(QUrl.fromLocalFile(str(abs_path)))
-        self.logger.debug(f"Loaded Vol/OI HTML from {abs_path}")
+        action = load_chart(self.ui.p3_wev, abs_path)
+        self.logger.debug(f"Vol/OI chart {abs_path}: {action}")
         self.last_page_type = "vol_oi"
 
     ### Auto-Refresh Methods
@@ -363,14 +355,14 @@ class SingleVController:
 
     def auto_refresh_slot(self):
         """
-        Called by the QTimer to auto-refresh the current HTML in p3_wev.
-        Uses self.last_page_type to determine which function to call.
+        Called by the QTimer to auto-refresh the current chart in p3_wev (its new data is pushed
+        into the loaded page). Uses self.last_page_type to determine which function to call.
         """
         if self.last_page_type == "greek_expo":
-            self.logger.debug("Auto-refresh: reloading Greek Expo HTML")
+            self.logger.debug("Auto-refresh: refreshing Greek Expo chart")
             self.load_greek_expo_html()
         elif self.last_page_type == "vol_oi":
-            self.logger.debug("Auto-refresh: reloading Vol/OI HTML")
+            self.logger.debug("Auto-refresh: refreshing Vol/OI chart")
             self.load_vol_oi_html()
         else:
             self.logger.debug("Auto-refresh: No valid page type set, so not reloading.")
@@ -3114,7 +3114,7 @@ class Ui_MainWindow(object):
         self.pushButton_30.setText(QCoreApplication.translate("MainWindow", u"...", None))
         self.label_38.setText(QCoreApplication.translate("MainWindow", u"Full", None))
         self.pushButton_34.setText(QCoreApplication.translate("MainWindow", u"...", None))
-        self.label_40.setText(QCoreApplication.translate("MainWindow", u"*Top 50 Premium Blocks", None))
+        self.label_40.setText(QCoreApplication.translate("MainWindow", u"Unusual Activity", None))
         self.pushButton_36.setText(QCoreApplication.translate("MainWindow", u"...", None))
         self.label_34.setText(QCoreApplication.translate("MainWindow", u"Greek Totals", None))
         self.label_36.setText(QCoreApplication.translate("MainWindow", u"Greek Rank", None))
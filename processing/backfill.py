@@ -0,0 +1,178 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
+from loguru import logger
+
+from processing import expiration_buckets, exposure_cube, gamma_flip_series, gamma_profile, history_store
+from processing.exposure_calculations import abso_expo, clean, ranking, ratio
+from processing.iv_models import iv_stage
+
+# ---------------------------- Historical Backfill ---------------------------- #
+# Recompute recorded sessions from the chains kept in the history store: every cycle's
+# chain is re-run through IV -> exposures -> ranking -> gamma flip with the current models,
+# formulas and settings, and the results replace that cycle's rows in the day's store (the
+# stage CSVs of the live cycle are not touched). Cycles are independent, so they run in
+# parallel across processes. Each finished cycle is marked in the store, so an interrupted
+# backfill resumes where it stopped.
+#
+#   python -m processing.backfill --start 2026-10-01 --end 2026-10-16 [--models grok] [--force]
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Configure logger
+LOG_DIR = PROJECT_ROOT / "logs" / "backfill"
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+logger.add(
+    LOG_DIR / "backfill.log",
+    rotation="1 MB",
+    level="INFO",
+    backtrace=True,
+    diagnose=True
+)
+
+INDEX = "SPX"
+# Worker processes (one cycle each); the IV solve inside a cycle runs in-process
+WORKERS = max(1, (os.cpu_count() or 1) - 1)
+
+# ---------------------------- Cycle Recompute ---------------------------- #
+
+def recompute_bucket(df, cube, model, bucket, spot, es_multiplier, day, timestamp, index, root):
+    """
+    Greek totals, ranked levels and gamma flips of one bucket (and its kClean variant when
+    enabled) from the cube's per (strike, side) totals, written to the store. Returns the
+    ranked row count. The "change" ranking key needs the previous cycle, so it is not
+    recomputed here.
+    """
+    view = expiration_buckets.bucket_view(df, bucket, day)
+    if view.empty:
+        return 0
+    totals = cube.strike_side_totals(today=day, bucket=bucket)
+    stem = Path(expiration_buckets.bucket_file_name(bucket, model)).stem
+    variants = {"results": (stem, totals)}
+    if abso_expo.process_clean_data == "Yes":
+        matched = cube.matched_strikes(today=day, bucket=bucket)
+        variants["clean"] = (clean.clean_stem(stem), totals[totals["strikePrice"].isin(matched)])
+
+    rows = 0
+    for variant, (variant_stem, variant_totals) in variants.items():
+        flip = ratio.gamma_flip(ratio.strike_gex(variant_totals), variant_stem)
+        greek_totals = ratio.calculate_greek_totals(variant_totals)
+        greek_totals.insert(0, "timestamp", timestamp)
+        history_store.append_greek_totals(greek_totals, index, model, bucket, variant, day, root)
+        if es_multiplier is not None:
+            ranked = ranking.ranked_frame(variant_totals, es_multiplier, bucket, flip=flip, timestamp=timestamp)
+            rows += history_store.append_rankings(ranked, index, model, bucket, variant, day, root)
+        zero_gamma = gamma_profile.sweep(view, spot)[1] if variant == "results" else None
+        gamma_flip_series.record(index, model, bucket, variant, timestamp, flip, zero_gamma, spot, es_multiplier,
+                                 day, root)
+    return rows
+
+
+def recompute_cycle(day, timestamp, models, buckets, index=INDEX, root=history_store.HISTORY_DIR):
+    """
+    Re-run one recorded cycle for the models and replace its outputs in the day's store.
+    Returns the number of ranked rows written.
+    """
+    chain = history_store.chain(day, index, timestamp, root=root)
+    if chain is None or chain.empty:
+        raise ValueError(f"no chain recorded for {timestamp}")
+    context = history_store.context(day, index, timestamp, root)
+    spot = context.spot if context is not None else float(chain["spotPrice"].iloc[0])
+    # Without the cycle's context there is no Theo ES, so no ranked levels (as in the live stage)
+    es_multiplier = context.futures_multiplier if context is not None else None
+
+    results, _, _ = iv_stage.run_models(chain.drop(columns="timestamp"), models)
+    rows = 0
+    for model in models:
+        history_store.clear_cycle(index, model, timestamp, buckets, day, root)
+        df = iv_stage.master_frame(results, model) if not results.empty else None
+        if df is None:
+            continue
+        df = df.reset_index(drop=True)
+        exposures = abso_expo.calculate_exposures(df)
+        if exposures is None:
+            continue
+        df = df.join(exposures)
+        stored = expiration_buckets.bucket_view(df, history_store.CONTRACT_BUCKET, day)
+        history_store.append_contracts(stored, index, model, timestamp, day, root)
+        cube = exposure_cube.ExposureCube.from_frame(df, list(exposures.columns), day)
+        for bucket in buckets:
+            rows += recompute_bucket(df, cube, model, bucket, spot, es_multiplier, day, timestamp, index, root)
+    history_store.mark_recomputed(index, models, timestamp, day, root)
+    return rows
+
+# ---------------------------- Backfill ---------------------------- #
+
+def recorded_days(start, end, root=history_store.HISTORY_DIR):
+    """Days in [start, end] that have a history store."""
+    days = [start + timedelta(days=n) for n in range((end - start).days + 1)]
+    return [day for day in days if history_store.store_path(day, root).exists()]
+
+
+def pending_cycles(days, models, index=INDEX, force=False, root=history_store.HISTORY_DIR):
+    """(day, timestamp) of every recorded chain not yet recomputed for all the models (all of them with force)."""
+    pending = []
+    for day in days:
+        done = set()
+        if not force:
+            done = set.intersection(*(history_store.recomputed_cycles(day, index, model, root) for model in models))
+        pending.extend((day, timestamp) for timestamp in history_store.chain_cycles(day, index, root=root)
+                       if timestamp not in done)
+    return pending
+
+
+def backfill(start, end, models, buckets, workers=WORKERS, force=False, index=INDEX, root=history_store.HISTORY_DIR):
+    """Recompute every pending cycle of the recorded days in [start, end] in parallel. Returns (done, failed)."""
+    days = recorded_days(start, end, root)
+    tasks = pending_cycles(days, models, index, force, root)
+    logger.info(f"Backfill {start} .. {end}: {len(tasks)} cycle(s) to recompute on {len(days)} recorded day(s) "
+                f"for {', '.join(models)} ({', '.join(buckets)}) with {workers} worker(s).")
+    if not tasks:
+        return 0, 0
+
+    started = time.perf_counter()
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(recompute_cycle, day, timestamp, models, buckets, index, root): timestamp
+                   for day, timestamp in tasks}
+        for future in as_completed(futures):
+            timestamp = futures[future]
+            try:
+                rows = future.result()
+                done += 1
+                status = f"{rows} ranked rows"
+            except Exception as e:
+                failed += 1
+                status = f"failed: {e}"
+            finished = done + failed
+            elapsed = time.perf_counter() - started
+            remaining = elapsed / finished * (len(tasks) - finished)
+            logger.info(f"[{finished}/{len(tasks)}] {timestamp}: {status} "
+                        f"(elapsed {elapsed:.0f}s, remaining ~{remaining:.0f}s)")
+    logger.info(f"Backfill finished: {done} cycle(s) recomputed, {failed} failed "
+                f"(failed cycles are retried by the next run).")
+    return done, failed
+
+# ---------------------------- Main Execution ---------------------------- #
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute recorded sessions from the chains in the history store.")
+    parser.add_argument("--start", required=True, help="First day (YYYY-MM-DD).")
+    parser.add_argument("--end", help="Last day (YYYY-MM-DD), default the start day.")
+    parser.add_argument("--models", nargs="+", choices=list(iv_stage.MODELS),
+                        help="IV models to recompute, default the IV method selection.")
+    parser.add_argument("--buckets", nargs="+", choices=expiration_buckets.BUCKETS,
+                        help="Expiration buckets, default the expiration selection.")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--force", action="store_true", help="Recompute cycles already recomputed.")
+    args = parser.parse_args()
+
+    start = datetime.strptime(args.start, "%Y-%m-%d").date()
+    end = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else start
+    backfill(start, end,
+             args.models or iv_stage.selected_models(),
+             args.buckets or expiration_buckets.selected_buckets(abso_expo.expiration_option),
+             args.workers, args.force)
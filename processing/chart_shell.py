@@ -0,0 +1,91 @@
+import os
+import time
+from pathlib import Path
+
+# ---------------------------- Chart Shells ---------------------------- #
+# Charts the GUI keeps open are written as a persistent HTML shell plus a JSON payload. The
+# shell loads plotly.js once and exposes updateChart(figure), which redraws in place with
+# Plotly.react; it is written the first time and rewritten only when its template changes.
+# Each cycle only replaces the payload ({chart}.json next to the shell), and the GUI pushes
+# it into the page it already shows (utils/html_lookup.py), so a refresh does not reload the
+# page, re-parse plotly.js or reset the user's zoom.
+
+PLOTLY_CONFIG = '{"responsive": true}'
+
+SHELL_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<script src="{plotly_src}"></script>
+<style>html, body, #chart {{ margin: 0; width: 100%; height: 100%; background: #111111; }}</style>
+</head>
+<body>
+<div id="chart"></div>
+<script>
+const CONFIG = {config};
+function updateChart(figure) {{
+    Plotly.react("chart", figure.data, figure.layout, CONFIG);
+}}
+</script>
+</body>
+</html>
+"""
+
+
+def payload_path(html_path):
+    """The JSON payload of a chart shell."""
+    return Path(html_path).with_suffix(".json")
+
+
+def plotly_src():
+    """CDN URL of the plotly.js matching the installed plotly (what write_html(include_plotlyjs="cdn") uses)."""
+    from plotly.offline import get_plotlyjs_version
+    return f"https://cdn.plot.ly/plotly-{get_plotlyjs_version()}.min.js"
+
+
+def _replace(path, text, attempts=5):
+    """Write text to a temporary file and move it over path, so a reader never sees a partial file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_text(text, encoding="utf-8")
+    for attempt in range(attempts):
+        try:
+            os.replace(temporary, path)
+            return
+        except PermissionError:
+            # Windows refuses to replace a file the GUI is reading at that moment
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.05)
+
+
+def write_shell(html_path, config=PLOTLY_CONFIG):
+    """Write a chart's shell unless the current one is already there. Returns True when written."""
+    html = SHELL_TEMPLATE.format(plotly_src=plotly_src(), config=config)
+    path = Path(html_path)
+    if path.exists() and path.read_text(encoding="utf-8") == html:
+        return False
+    _replace(path, html)
+    return True
+
+
+def write_figure(fig, html_path, config=PLOTLY_CONFIG):
+    """
+    Write a figure as the payload of its chart shell (and the shell when it is missing or
+    outdated). uirevision keeps the user's zoom and hidden traces across updates. Returns the
+    payload path.
+    """
+    fig.update_layout(uirevision=Path(html_path).stem)
+    write_shell(html_path, config)
+    path = payload_path(html_path)
+    _replace(path, fig.to_json())
+    return path
+
+
+def update_script(html_path):
+    """JavaScript drawing a loaded shell with its chart's current payload, or None without one."""
+    path = payload_path(html_path)
+    if not path.exists():
+        return None
+    return f"if (window.updateChart) {{ updateChart({path.read_text(encoding='utf-8')}); }}"
@@ -0,0 +1,87 @@
+import calendar
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from processing import schema
+
+# ---------------------------- Expiration Buckets ---------------------------- #
+# The 0DTE / 1DTE / EoW / EoM buckets are nested date ranges starting today, so a bucket
+# is just a filter on the expirationDays offset (processing/schema.py) of a single results
+# table, or on the expiration axis of the exposure cube (processing/exposure_cube.py).
+
+BUCKETS = ["0DTE", "1DTE", "EoW", "EoM"]
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+# One results table per IV model, written by the IV stage (abso_expo adds the exposures in memory)
+MASTER_DIR = PROJECT_ROOT / "outputs" / "step_two" / "master"
+
+
+def master_path(model):
+    """Path of one model's master results table."""
+    return MASTER_DIR / f"{model}_results.csv"
+
+
+def load_master(model, today=None):
+    """Read one model's master results table (exposures schema), or None if the IV stage produced none."""
+    path = master_path(model)
+    if not path.exists():
+        return None
+    return schema.read_table(path, "exposures", today)
+
+
+def bucket_file_name(bucket, model):
+    """File name of a materialized bucket view (the name the later stages have always read)."""
+    return f"{bucket}_{model}_results.csv"
+
+
+def get_last_trading_day(year, month):
+    """Calculate the last trading day of a given month."""
+    last_day = calendar.monthrange(year, month)[1]
+    last_date = datetime(year, month, last_day).date()
+    if last_date.weekday() == 5:  # Saturday
+        last_date -= timedelta(days=1)
+    elif last_date.weekday() == 6:  # Sunday
+        last_date -= timedelta(days=2)
+    return last_date
+
+
+def get_upcoming_friday(today):
+    """Return the upcoming Friday (end-of-week) for today's date."""
+    days_to_friday = (4 - today.weekday()) % 7
+    return today + timedelta(days=days_to_friday)
+
+
+def bucket_cutoffs(today):
+    """Last expiration date included in each bucket."""
+    return {
+        "0DTE": today,
+        "1DTE": today + timedelta(days=1),
+        "EoW": get_upcoming_friday(today),
+        "EoM": get_last_trading_day(today.year, today.month),
+    }
+
+
+def selected_buckets(expiration_option):
+    """Buckets to produce for the expiration config value ("All" or a single bucket)."""
+    return list(BUCKETS) if expiration_option == "All" else [expiration_option]
+
+
+def bucket_day_limits(today):
+    """Largest expirationDays offset included in each bucket."""
+    return {bucket: (cutoff - today).days for bucket, cutoff in bucket_cutoffs(today).items()}
+
+
+def widest_bucket(buckets, today):
+    """The bucket of the list reaching furthest out (EoW can end after EoM at month end)."""
+    limits = bucket_day_limits(today)
+    return max(buckets, key=limits.get)
+
+
+def bucket_mask(days, bucket, today):
+    """Boolean mask of the expiration day offsets that fall in the bucket."""
+    return (days >= 0) & (days <= bucket_day_limits(today)[bucket])
+
+
+def bucket_view(df, bucket, today, column="expirationDays"):
+    """Rows of the master table that belong to the bucket."""
+    return df[bucket_mask(df[column], bucket, today)]
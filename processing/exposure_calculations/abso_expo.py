@@ -3,6 +3,11 @@ import numpy as np
 from pathlib import Path
 from loguru import logger
 import json
+from datetime import datetime
+
+from processing import (expiration_buckets, exposure_cube, gamma_flip_series, gamma_profile, heatmap,
+                        history_store, market_context, schema)
+from processing.exposure_calculations import clean, ranking, ratio
 
 # ---------------------------- Configuration ---------------------------- #
 
@@ -19,15 +24,26 @@ logger.add(
     diagnose=True
 )
 
-# Target directories containing IV method results (CSV files)
-target_dirs = [
-    PROJECT_ROOT / "outputs" / "step_two" / "grok",
-    PROJECT_ROOT / "outputs" / "step_two" / "hybrid_one",
-    PROJECT_ROOT / "outputs" / "step_two" / "brent_bs"
-]
+# Per-model directories the expiration bucket tables are written to
+STEP_TWO_DIR = PROJECT_ROOT / "outputs" / "step_two"
+# Index this stage processes (the NDX pipeline has its own ndx_* scripts)
+INDEX = "SPX"
+# Decimals the exposures are shown with in the bucket view CSVs
+EXPOSURE_DECIMALS = 3
 
 # Exposure columns to calculate
 EXPOSURE_COLUMNS = ["DEX", "GEX", "VEX", "CEX"]
+# Higher-order exposures, calculated when the IV stage supplied the matching greek
+HIGHER_ORDER_EXPOSURES = {
+    "VOMEX": "vomma",
+    "ZOMEX": "zomma",
+    "SPDEX": "speed",
+    "COLEX": "color",
+    "VETEX": "veta",
+}
+
+# Heatmap buffers for the surface series, reused by every model the stage processes
+engine = heatmap.HeatmapEngine()
 
 # ---------------------------- Load IV Method Selection ---------------------------- #
 IV_METHOD_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "iv_method_config.json"
@@ -46,11 +62,12 @@ iv_method_mapping = {
     "Hybrid_one": "hybrid_one"
 }
 
-# ---------------------------- Load kClean (Clean Data) Selection ---------------------------- #
+# ---------------------------- Load kClean Configuration ---------------------------- #
 KCLEAN_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "kClean_config.json"
 try:
     with open(KCLEAN_CONFIG_PATH, "r") as f:
         kclean_config = json.load(f)
+    # Expected values: "Yes" or "No"
     process_clean_data = kclean_config.get("value", "Yes")
     logger.info(f"User clean data selection: {process_clean_data}")
 except Exception as e:
@@ -76,7 +93,20 @@ except Exception as e:
 
 def calculate_exposures(df):
     """
-    Calculate exposure columns (DEX, GEX, VEX, CEX) based on option rules.
+    Calculate the exposure columns (normalized to millions, unrounded) for the contract rows
+    of df and return them as a new DataFrame on the same index:
+      - DEX: delta * OI * S
+      - GEX: gamma * OI * S^2 * 100 (puts negated)
+      - VEX: vanna * OI * S * IV
+      - CEX: charm * OI * S * 365
+    plus the higher-order exposures for the greeks present (see HIGHER_ORDER_EXPOSURES):
+      - VOMEX: vomma * OI * IV * 100 (vega exposure change per 1.00 of vol)
+      - ZOMEX: zomma * OI * S^2 * 100 * IV (GEX change per 1.00 of vol, puts negated like GEX)
+      - SPDEX: OI * 100 * (speed * S^2 + 2 * gamma * S) (GEX change per point: the derivative of
+        gamma * OI * S^2 * 100 in S, puts negated like GEX)
+      - COLEX: color * OI * S^2 * 100 / 365 (GEX change per day, puts negated like GEX)
+      - VETEX: veta * OI * 100 / 365 (vega exposure change per day)
+    Rounding is left to the outputs that present the values.
     """
     try:
         required_columns = [
@@ -88,93 +118,187 @@ def calculate_exposures(df):
             logger.warning(f"Missing required columns for exposure calculation: {missing_columns}. Skipping file.")
             return None
 
-        # Calculate DEX (normalized to millions)
-        df["DEX"] = df["delta"] * df["openInterest"] * df["spotPrice"]
-        df["DEX"] = df["DEX"].apply(lambda x: round(x / 1_000_000, 3))
-
-        # Calculate GEX (normalized to millions)
-        df["GEX"] = df["gamma"] * df["openInterest"] * (df["spotPrice"] ** 2) * 100
-        df["GEX"] = df["GEX"].apply(lambda x: round(x / 1_000_000, 3))
-        # Adjust GEX for puts
-        df.loc[df["putCall"].str.upper() == "PUT", "GEX"] *= -1
+        def column(name):
+            return df[name].to_numpy(dtype=np.float64)
 
-        # Calculate VEX (normalized to millions)
-        df["VEX"] = df["vanna"] * df["openInterest"] * df["spotPrice"] * df["impliedVolatility"]
-        df["VEX"] = df["VEX"].apply(lambda x: round(x / 1_000_000, 3))
+        spot = column("spotPrice")
+        spot_sq = spot * spot
+        iv = column("impliedVolatility")
+        # Open interest pre-scaled to millions; put sign from the categorical side (a code compare, no string ops)
+        oi_m = column("openInterest") / 1_000_000
+        put_sign = np.where((df["putCall"] == "PUT").to_numpy(), -1.0, 1.0)
 
-        # Calculate CEX (normalized to millions)
-        df["CEX"] = df["charm"] * df["openInterest"] * df["spotPrice"] * 365
-        df["CEX"] = df["CEX"].apply(lambda x: round(x / 1_000_000, 3))
+        exposures = {
+            "DEX": column("delta") * oi_m * spot,
+            "GEX": column("gamma") * oi_m * spot_sq * 100 * put_sign,
+            "VEX": column("vanna") * oi_m * spot * iv,
+            "CEX": column("charm") * oi_m * spot * 365,
+        }
+        available = [col for col, greek in HIGHER_ORDER_EXPOSURES.items() if greek in df.columns]
+        if "VOMEX" in available:
+            exposures["VOMEX"] = column("vomma") * oi_m * iv * 100
+        if "ZOMEX" in available:
+            exposures["ZOMEX"] = column("zomma") * oi_m * spot_sq * 100 * iv * put_sign
+        if "SPDEX" in available:
+            exposures["SPDEX"] = (column("speed") * spot_sq + 2 * column("gamma") * spot) * oi_m * 100 * put_sign
+        if "COLEX" in available:
+            exposures["COLEX"] = column("color") * oi_m * spot_sq * 100 / 365 * put_sign
+        if "VETEX" in available:
+            exposures["VETEX"] = column("veta") * oi_m * 100 / 365
 
-        logger.info(f"Calculated exposures: {EXPOSURE_COLUMNS}.")
-        return df
+        logger.info(f"Calculated exposures: {list(exposures)}.")
+        return pd.DataFrame(exposures, index=df.index)
     except Exception as e:
         logger.error(f"Error calculating exposures: {e}")
         return None
 
-def process_file(file_path):
+def write_bucket_analytics(totals, model, stem, bucket, variant, es_multiplier, today, cycle_ts):
+    """
+    Reductions of one bucket variant ("results", or "clean" = strikes quoted on both sides),
+    each written exactly once:
+      - Greek totals / ratios (step_three/ratio)
+      - ranked levels with the gamma flip attached (step_three), when Theo ES is available
+    both also recorded in the day's history store.
+    Returns the gamma flip (cum, vec) computed from the per (strike, side) totals.
+    """
+    flip = ratio.gamma_flip(ratio.strike_gex(totals), stem)
+    greek_totals = ratio.save_greek_totals(ratio.calculate_greek_totals(totals), stem, cycle_ts)
+    history_store.append_greek_totals(greek_totals, INDEX, model, bucket, variant, today)
+    if es_multiplier is not None:
+        ranked = ranking.ranked_frame(totals, es_multiplier, bucket, stem, flip, cycle_ts)
+        ranking.save_ranked(ranked, stem)
+        rows = history_store.append_rankings(ranked, INDEX, model, bucket, variant, today)
+        logger.info(f"Appended {rows} ranked rows to {history_store.store_path(today)}")
+    return flip
+
+def write_gamma_profile(contracts, spot, stem):
+    """
+    Sweep one bucket's contracts over the spot grid and publish its gamma profile; returns
+    the zero-gamma level (None when there is no crossing or the sweep failed).
+    """
+    try:
+        profile, level = gamma_profile.sweep(contracts, spot)
+        output_path = gamma_profile.publish(profile, level, spot, stem)
+        logger.info(f"Zero gamma for {stem}: {level} ({len(contracts)} contracts x {len(profile)} spots) -> {output_path}")
+        return level
+    except Exception as e:
+        logger.error(f"Error computing gamma profile for {stem}: {e}")
+        return None
+
+def record_gamma_flip(model, bucket, variant, flip, zero_gamma, spot, es_multiplier, today, cycle_ts):
+    """Add a bucket table's flips to the gamma flip series (history store)."""
+    try:
+        gamma_flip_series.record(INDEX, model, bucket, variant, cycle_ts, flip, zero_gamma, spot, es_multiplier, today)
+    except Exception as e:
+        logger.error(f"Error recording gamma flip for {bucket} {model} ({variant}): {e}")
+
+def record_surface(cube, model, today, spot, cycle_ts):
+    """Add the cycle's GEX heatmap (widest selected bucket) to the model's surface series of the day."""
+    try:
+        bucket = expiration_buckets.widest_bucket(expiration_buckets.selected_buckets(expiration_option), today)
+        for greek, series in heatmap.record_surface(cube, model, cycle_ts, today, bucket, spot, engine=engine).items():
+            logger.info(f"Surface series {greek} ({model}): {series.size} cycle(s) on "
+                        f"{len(series.strikes)} strikes x {len(series.expirations)} expirations.")
+    except Exception as e:
+        logger.error(f"Error recording surface series for {model}: {e}")
+
+def process_bucket(df, cube, model, bucket, es_multiplier, spot, today, cycle_ts):
     """
-    Process a single CSV file to add exposure columns.
-    Overwrites the original file with updated exposures.
+    All outputs of one expiration bucket from the cube's per (strike, side) totals: the results
+    reductions and, with kClean enabled, the clean ones from the same totals restricted to the
+    strikes quoted on both sides. The step_two table is written once with both flips and a
+    "clean" mask column instead of a separate _clean copy. Flips go to the gamma flip series.
+    """
+    view = expiration_buckets.bucket_view(df, bucket, today)
+    if view.empty:
+        logger.info(f"No data for bucket {bucket} ({model}); no CSV created.")
+        return
+    stem = Path(expiration_buckets.bucket_file_name(bucket, model)).stem
+    totals = cube.strike_side_totals(today=today, bucket=bucket)
+    logger.info(f"Processing {bucket} ({model}): {len(view)} contracts, {len(totals)} strike/side totals.")
+    flip = write_bucket_analytics(totals, model, stem, bucket, "results", es_multiplier, today, cycle_ts)
+    table = view.assign(cum_gam=flip[0], cum_vec=flip[1])
+
+    if process_clean_data == "Yes":
+        matched = cube.matched_strikes(today=today, bucket=bucket)
+        clean_flip = write_bucket_analytics(totals[totals["strikePrice"].isin(matched)], model, clean.clean_stem(stem),
+                                            bucket, "clean", es_multiplier, today, cycle_ts)
+        table = table.assign(clean=view["strikePrice"].isin(matched), clean_cum_gam=clean_flip[0],
+                             clean_cum_vec=clean_flip[1])
+        logger.info(f"kClean mask: {int(table['clean'].sum())} of {len(table)} contracts on {len(matched)} strikes.")
+        record_gamma_flip(model, bucket, "clean", clean_flip, None, spot, es_multiplier, today, cycle_ts)
+
+    output_path = STEP_TWO_DIR / model / f"{stem}.csv"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    schema.write_table(table, output_path, today)
+    logger.info(f"Bucket table saved: {output_path}")
+
+    zero_gamma = write_gamma_profile(view, spot, stem)
+    record_gamma_flip(model, bucket, "results", flip, zero_gamma, spot, es_multiplier, today, cycle_ts)
+
+def process_model(model, today, es_multiplier, spot=None, cycle_ts=None):
+    """
+    Calculate exposures once on a model's master table (every expiration), in memory, build
+    the exposure cube and write every output of the selected expiration buckets once: the
+    bucket tables (exposures rounded for display, gamma flip attached), Greek totals, ranked
+    levels and gamma profiles. The master table itself is not rewritten; its rows (with the
+    unrounded exposures) up to history_store.CONTRACT_BUCKET are recorded in the day's store.
     """
     try:
-        logger.info(f"Processing file: {file_path}")
-        df = pd.read_csv(file_path)
-        df = calculate_exposures(df)
+        master_file = expiration_buckets.master_path(model)
+        df = expiration_buckets.load_master(model, today)
         if df is None:
-            logger.warning(f"Skipping file due to exposure calculation issues: {file_path}")
+            logger.warning(f"No master results table for {model} at {master_file}; skipping.")
             return
-        df.to_csv(file_path, index=False)
-        logger.info(f"Processed file saved: {file_path}")
+        logger.info(f"Processing master table: {master_file} ({len(df)} rows)")
+        exposures = calculate_exposures(df)
+        if exposures is None:
+            logger.warning(f"Skipping {model} due to exposure calculation issues.")
+            return
+        cube = exposure_cube.ExposureCube.from_frame(df.join(exposures), list(exposures.columns), today)
+        cube.save(exposure_cube.cube_path(model))
+        logger.info(f"Exposure cube saved: {exposure_cube.cube_path(model)} "
+                    f"({len(cube.strikes)} strikes x {len(cube.expirations)} expirations x {len(cube.greeks)} greeks)")
+        if spot is None and not df.empty:
+            spot = float(df["spotPrice"].iloc[0])
+        cycle_ts = cycle_ts or history_store.cycle_timestamp()
+        record_surface(cube, model, today, spot, cycle_ts)
+        stored = expiration_buckets.bucket_view(df.join(exposures), history_store.CONTRACT_BUCKET, today)
+        rows = history_store.append_contracts(stored, INDEX, model, cycle_ts, today)
+        logger.info(f"Recorded {rows} contract rows for {model} in {history_store.store_path(today)}")
+        rounded = df.join(exposures.round(EXPOSURE_DECIMALS))
+        for bucket in expiration_buckets.selected_buckets(expiration_option):
+            process_bucket(rounded, cube, model, bucket, es_multiplier, spot, today, cycle_ts)
     except Exception as e:
-        logger.error(f"Error processing file {file_path}: {e}")
+        logger.error(f"Error processing master table for {model}: {e}")
 
 # ---------------------------- Main Execution ---------------------------- #
 
+def selected_models():
+    """Model identifiers for the current IV method selection."""
+    if selected_iv_method == "All":
+        return list(iv_method_mapping.values())
+    model = iv_method_mapping.get(selected_iv_method)
+    if model is None:
+        logger.warning(f"No identifier mapping found for IV method '{selected_iv_method}'. Processing all models.")
+        return list(iv_method_mapping.values())
+    return [model]
+
 def calculate_total_exposure():
     """
-    Process all CSV files in the target directories to calculate exposure columns.
-    Only files matching the selected expiration option are processed.
+    Exposure / analytics stage: for each selected model, calculate exposures once on the
+    master table and write the bucket tables, Greek totals, ranked levels and gamma profiles
+    (results and kClean variants), each once per cycle with the gamma flip already attached.
     """
     try:
         logger.info("Starting total exposure calculations.")
-        all_files = []
-        for d in target_dirs:
-            files = list(d.glob("*.csv"))
-            logger.info(f"Found {len(files)} CSV files in {d}")
-            all_files.extend(files)
-
-        # Filter based on IV method selection if needed
-        if selected_iv_method != "All":
-            identifier = iv_method_mapping.get(selected_iv_method)
-            if identifier:
-                original_count = len(all_files)
-                all_files = [f for f in all_files if identifier in f.name.lower()]
-                logger.info(f"Filtered CSV files: {len(all_files)} of {original_count} match IV method '{selected_iv_method}'.")
-            else:
-                logger.warning(f"No identifier mapping found for IV method '{selected_iv_method}'. Processing all files.")
-
-        # Filter based on kClean selection if applicable
-        if process_clean_data == "No":
-            original_count = len(all_files)
-            all_files = [f for f in all_files if not f.name.lower().endswith('_clean.csv')]
-            logger.info(f"Filtered CSV files: {len(all_files)} of {original_count} remain after skipping '_clean.csv' files (kClean set to 'No').")
-
-        # Filter based on expiration configuration only if not "All"
-        if expiration_option != "All":
-            original_count = len(all_files)
-            all_files = [f for f in all_files if f.name.lower().startswith(expiration_option.lower())]
-            logger.info(f"Filtered CSV files: {len(all_files)} of {original_count} match expiration option '{expiration_option}'.")
-        else:
-            logger.info("Expiration option 'All' selected; processing all files regardless of expiration indicator.")
-
-        if not all_files:
-            logger.warning("No CSV files found to process after filtering.")
-            return
-
-        for file_path in all_files:
-            process_file(file_path)
-
+        today = datetime.now().date()
+        context = market_context.load()  # once per cycle: the ES multiplier and the cycle key come from it
+        es_multiplier = ranking.es_multiplier(context)  # shared by every ranked table
+        spot = context.spot if context is not None else None  # else each model's master spotPrice
+        cycle_ts = history_store.cycle_timestamp(context)  # the key of every row the cycle records
+        for model in selected_models():
+            process_model(model, today, es_multiplier, spot, cycle_ts)
         logger.info("Total exposure calculations completed successfully.")
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
@@ -1,171 +1,10 @@
-import pandas as pd
-import json
-from pathlib import Path
-from loguru import logger
-
-# ---------------------------- Configuration ---------------------------- #
-
-PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
-
-# Configure logger
-LOG_DIR = PROJECT_ROOT / "logs" / "data_cleaning"
-LOG_DIR.mkdir(parents=True, exist_ok=True)
-logger.add(
-    LOG_DIR / "data_cleaning.log",
-    rotation="1 MB",
-    level="DEBUG",
-    backtrace=True,
-    diagnose=True
-)
-
-# Define the 6 target directories
-target_dirs = [
-    PROJECT_ROOT / "outputs" / "step_two" / "grok",
-    PROJECT_ROOT / "outputs" / "step_two" / "hybrid_one",
-    PROJECT_ROOT / "outputs" / "step_two" / "brent_bs"
-]
-
-# Output directory (cleaned files will be saved in the same location, with modified names)
-OUTPUT_DIR = PROJECT_ROOT / "outputs" / "step_two"
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-# ---------------------------- Load JSON Configurations ---------------------------- #
-# Load IV method configuration
-IV_METHOD_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "iv_method_config.json"
-try:
-    with open(IV_METHOD_CONFIG_PATH, "r") as f:
-        iv_method_config = json.load(f)
-    # Expected values: "All", "Hybrid_one", "Brent Black Scholes", or "Grok"
-    selected_iv_method = iv_method_config.get("value", "All")
-    logger.info(f"Selected IV method: {selected_iv_method}")
-except Exception as e:
-    logger.warning(f"Could not load IV method config; defaulting to 'All'. Error: {e}")
-    selected_iv_method = "All"
-
-# Mapping from IV method to an identifier substring in the filenames
-iv_method_mapping = {
-    "Brent Black Scholes": "brent_bs",
-    "Grok": "grok",
-    "Hybrid_one": "hybrid_one"
-}
-
-# Load kClean configuration
-KCLEAN_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "kClean_config.json"
-try:
-    with open(KCLEAN_CONFIG_PATH, "r") as f:
-        kclean_config = json.load(f)
-    # Expected values: "Yes" or "No"
-    process_clean_data = kclean_config.get("value", "Yes")
-    logger.info(f"User clean data selection: {process_clean_data}")
-except Exception as e:
-    logger.warning(f"Could not load kClean config; defaulting to 'Yes'. Error: {e}")
-    process_clean_data = "Yes"
-
-# ---------------------------- Load Expiration Configuration ---------------------------- #
-EXPIRATION_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "expiration_config.json"
-try:
-    with open(EXPIRATION_CONFIG_PATH, "r") as cf:
-        exp_config = json.load(cf)
-    expiration_option = exp_config.get("value", "EoM")
-    # Allow "All" as a valid option
-    if expiration_option not in ["0DTE", "1DTE", "EoW", "EoM", "All"]:
-        logger.warning(f"Invalid expiration option '{expiration_option}' found in config; defaulting to 'EoM'.")
-        expiration_option = "EoM"
-    logger.info(f"Expiration configuration set to: {expiration_option}")
-except Exception as e:
-    logger.error(f"Error loading expiration configuration: {e}. Defaulting to 'EoM'.")
-    expiration_option = "EoM"
+# ---------------------------- Strike Cleaning ---------------------------- #
+# kClean: the clean variant of a bucket keeps only strikes quoted on both sides. It is a mask
+# (ExposureCube.matched_strikes -> the "clean" column of the bucket table), not a copy of the
+# table; the exposure stage reduces both variants from the same totals.
 
 # ---------------------------- Utility Functions ---------------------------- #
 
-def validate_columns(df, required_columns):
-    """Check if required columns are present in the DataFrame."""
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    if missing_columns:
-        raise ValueError(f"Missing required columns: {missing_columns}")
-
-def filter_matching_strikes(df):
-    """
-    Retains only rows where each strikePrice has both a CALL and a PUT entry.
-    """
-    try:
-        grouped = df.groupby("strikePrice")["putCall"].nunique()
-        valid_strikes = grouped[grouped == 2].index
-        filtered_df = df[df["strikePrice"].isin(valid_strikes)]
-        logger.info(f"Filtered {len(df) - len(filtered_df)} rows. Retaining {len(filtered_df)} valid entries.")
-        return filtered_df
-    except Exception as e:
-        logger.error(f"Error filtering strike prices: {e}")
-        return df
-
-def process_file(file_path):
-    """Process a single CSV file and create a cleaned version."""
-    try:
-        logger.info(f"Processing file: {file_path}")
-        df = pd.read_csv(file_path)
-
-        required_columns = ["strikePrice", "putCall"]
-        validate_columns(df, required_columns)
-
-        cleaned_df = filter_matching_strikes(df)
-
-        # Create a cleaned filename by replacing "_results" with "_clean" in the file stem
-        output_file_name = file_path.stem.replace("_results", "_clean") + ".csv"
-        output_path = file_path.parent / output_file_name
-        cleaned_df.to_csv(output_path, index=False)
-        logger.info(f"Cleaned data saved to: {output_path}")
-    except ValueError as ve:
-        logger.warning(f"Validation error in {file_path}: {ve}")
-    except Exception as e:
-        logger.error(f"Error processing file {file_path}: {e}")
-
-# ---------------------------- Main Processing ---------------------------- #
-
-def clean_all_csv_files():
-    """Main function to process all CSV files and clean the data from all target directories."""
-    try:
-        if process_clean_data != "Yes":
-            logger.info("Data cleaning is disabled in kClean config. Skipping cleaning process.")
-            return
-
-        logger.info("Starting data cleaning process.")
-
-        all_csv_files = []
-        for directory in target_dirs:
-            files = list(directory.glob("*_results.csv"))
-            logger.info(f"Found {len(files)} CSV files in {directory}")
-            all_csv_files.extend(files)
-
-        # Filter based on IV method selection if not "All"
-        if selected_iv_method != "All":
-            identifier = iv_method_mapping.get(selected_iv_method)
-            if identifier:
-                original_count = len(all_csv_files)
-                all_csv_files = [f for f in all_csv_files if identifier in f.name.lower()]
-                logger.info(f"Filtered CSV files: {len(all_csv_files)} of {original_count} match IV method '{selected_iv_method}'.")
-            else:
-                logger.warning(f"No identifier mapping found for IV method '{selected_iv_method}'. Processing all files.")
-
-        # Filter based on expiration configuration only if not "All"
-        if expiration_option != "All":
-            original_count = len(all_csv_files)
-            all_csv_files = [f for f in all_csv_files if f.name.lower().startswith(expiration_option.lower())]
-            logger.info(f"Filtered CSV files: {len(all_csv_files)} of {original_count} match expiration option '{expiration_option}'.")
-        else:
-            logger.info("Expiration option 'All' selected; processing all CSV files regardless of expiration indicator.")
-
-        if not all_csv_files:
-            logger.warning("No valid CSV files found in the target directories after filtering.")
-            return
-
-        for file_path in all_csv_files:
-            process_file(file_path)
-
-        logger.info("Data cleaning process completed successfully.")
-    except Exception as e:
-        logger.error(f"An unexpected error occurred: {e}")
-
-# ---------------------------- Entry Point ---------------------------- #
-
-if __name__ == "__main__":
-    clean_all_csv_files()
+def clean_stem(stem):
+    """Stem of the clean variant's outputs ("_results" replaced by "_clean")."""
+    return stem.replace("_results", "_clean")
@@ -1,235 +1,219 @@
+import numpy as np
 import pandas as pd
 import json
+import shutil
 from pathlib import Path
 from loguru import logger
 from datetime import datetime
 
+from processing import market_context, schema
+
 # ---------------------------- Configuration ---------------------------- #
+# Ranking of per-strike exposure totals. Used by the exposure stage (abso_expo), which
+# attaches the bucket's gamma flip before writing each ranked table once per cycle.
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 
-# Configure logger
-LOG_DIR = PROJECT_ROOT / "logs" / "ranking"
-LOG_DIR.mkdir(parents=True, exist_ok=True)
-logger.add(
-    LOG_DIR / "ranking.log",
-    rotation="1 MB",
-    level="DEBUG",
-    backtrace=True,
-    diagnose=True
-)
-
-# Define the 6 target directories for input CSV files
-target_dirs = [
-    PROJECT_ROOT / "outputs" / "step_two" / "grok",
-    PROJECT_ROOT / "outputs" / "step_two" / "hybrid_one",
-    PROJECT_ROOT / "outputs" / "step_two" / "brent_bs",
-]
-
 # Centralized output directory for ranked results
 OUTPUT_DIR = PROJECT_ROOT / "outputs" / "step_three"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-
-SPX_SPOT_DIFF_FILE = PROJECT_ROOT / "outputs" / "step_one" / "spot_price_differences.xlsx"
-
-# ---------------------------- Load IV Method Configuration ---------------------------- #
-
-IV_METHOD_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "iv_method_config.json"
+# Per-strike totals of the day's last two cycles, kept for the "change" ranking key (one folder
+# per day, so the first cycle of a session is not compared with the previous session's close)
+PREVIOUS_TOTALS_DIR = OUTPUT_DIR / "previous"
+
+# Exposures ranked in every file, plus the higher-order ones when abso_expo produced them
+EXPOSURE_COLUMNS = ["DEX", "GEX", "VEX", "CEX"]
+HIGHER_ORDER_EXPOSURES = ["VOMEX", "ZOMEX", "SPDEX", "COLEX", "VETEX"]
+
+# ---------------------------- Load Ranking Configuration ---------------------------- #
+# top_n: levels ranked on each side; per_greek / per_bucket override it ({"GEX": 10},
+# {"0DTE": 3} or {"0DTE": {"GEX": 8}}); extra_keys adds "abs" (largest |exposure|) and/or
+# "change" (largest rise / fall since the previous cycle) rankings.
+RANKING_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "ranking_config.json"
+DEFAULT_RANKING_CONFIG = {"top_n": 5, "per_greek": {}, "per_bucket": {}, "extra_keys": []}
 try:
-    with open(IV_METHOD_CONFIG_PATH, "r") as f:
-        iv_method_config = json.load(f)
-    # Expected values: "All", "Hybrid_one", "Brent Black Scholes", or "Grok"
-    selected_iv_method = iv_method_config.get("value", "All")
-    logger.info(f"Selected IV method: {selected_iv_method}")
+    with open(RANKING_CONFIG_PATH, "r") as f:
+        ranking_config = {**DEFAULT_RANKING_CONFIG, **json.load(f).get("value", {})}
+    logger.info(f"Ranking configuration: {ranking_config}")
 except Exception as e:
-    logger.warning(f"Could not load IV method config; defaulting to 'All'. Error: {e}")
-    selected_iv_method = "All"
-
-# Mapping from IV method to an identifier substring in the filenames
-iv_method_mapping = {
-    "Brent Black Scholes": "brent_bs",
-    "Grok": "grok",
-    "Hybrid_one": "hybrid_one"
-}
-
-# ---------------------------- Load kClean Configuration ---------------------------- #
-
-KCLEAN_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "kClean_config.json"
-try:
-    with open(KCLEAN_CONFIG_PATH, "r") as f:
-        kclean_config = json.load(f)
-    # Expected values: "Yes" or "No"
-    process_clean_data = kclean_config.get("value", "Yes")
-    logger.info(f"User clean data selection: {process_clean_data}")
-except Exception as e:
-    logger.warning(f"Could not load kClean config; defaulting to 'Yes'. Error: {e}")
-    process_clean_data = "Yes"
-
-# ---------------------------- Load Expiration Configuration ---------------------------- #
-EXPIRATION_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "expiration_config.json"
-try:
-    with open(EXPIRATION_CONFIG_PATH, "r") as cf:
-        exp_config = json.load(cf)
-    expiration_option = exp_config.get("value", "EoM")
-    # Allow "All" as a valid option
-    if expiration_option not in ["0DTE", "1DTE", "EoW", "EoM", "All"]:
-        logger.warning(f"Invalid expiration option '{expiration_option}' found in config; defaulting to 'EoM'.")
-        expiration_option = "EoM"
-    logger.info(f"Expiration configuration set to: {expiration_option}")
-except Exception as e:
-    logger.error(f"Error loading expiration configuration: {e}. Defaulting to 'EoM'.")
-    expiration_option = "EoM"
+    logger.warning(f"Could not load ranking config; defaulting to top 5 per greek. Error: {e}")
+    ranking_config = dict(DEFAULT_RANKING_CONFIG)
 
 # ---------------------------- Utility Functions ---------------------------- #
 
-def validate_columns(df, required_columns):
-    """Check if required columns are present in the DataFrame."""
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    if missing_columns:
-        raise ValueError(f"Missing required columns: {missing_columns}")
-
-def extract_es_multiplier():
+def es_multiplier(context):
     """
-    Extracts the SPX-ES % Diff multiplier from spot_price_differences.xlsx.
-    Aborts execution if the value cannot be retrieved.
+    SPX-ES basis (as a fraction) from the cycle's market context (market_context.load), or
+    None (no Theo ES, so no ranked tables) if the cycle has no context.
     """
-    try:
-        df = pd.read_excel(SPX_SPOT_DIFF_FILE, sheet_name=0)
-        # Debug: Print first few rows to verify structure
-        print("Extracted DataFrame from Excel:")
-        print(df.head(10))
-        required_columns = ["Symbol", "Spot Price"]
-        if not all(col in df.columns for col in required_columns):
-            raise ValueError("Expected columns not found. Verify Excel format.")
-        row = df[df["Symbol"] == "SPX-ES % Diff"]
-        if row.empty:
-            raise ValueError("SPX-ES % Diff row not found in Excel.")
-        es_value = row["Spot Price"].values[0]
-        if pd.isna(es_value):
-            raise ValueError("Extracted ES multiplier is NaN or empty.")
-        es_multiplier = es_value / 100.0
-        logger.info(f"Extracted ES Multiplier from Excel: {es_multiplier}")
-        print(f"Extracted ES Multiplier: {es_multiplier}")
-        return es_multiplier
-    except Exception as e:
-        logger.critical(f"Failed to extract ES multiplier from {SPX_SPOT_DIFF_FILE}: {e}")
-        raise SystemExit("Aborting script due to missing ES multiplier.")
-
-def calculate_theo_es(strike_price, multiplier):
-    """Calculate the theoretical ES price for a given strike price and multiplier."""
-    try:
-        theo_price = strike_price + (strike_price * multiplier)
-        return round(theo_price * 4) / 4  # Round to nearest 0.25
-    except Exception as e:
-        logger.error(f"Error calculating Theo ES for strike price {strike_price}: {e}")
+    if context is None:
+        logger.critical(f"No current market context at {market_context.CONTEXT_FILE}; cannot compute Theo ES.")
         return None
+    logger.info(f"ES multiplier from market context ({context.timestamp}): {context.futures_multiplier}")
+    return context.futures_multiplier
+
+def calculate_theo_es(strike_prices, multiplier):
+    """Theoretical futures (ES) prices for an array of strikes, rounded to the 0.25 tick."""
+    strike_prices = np.asarray(strike_prices, dtype=np.float64)
+    return np.round((strike_prices + strike_prices * multiplier) * 4) / 4
+
+def top_k(greek, bucket=None):
+    """Number of levels ranked per side for a greek, with the per-bucket then per-greek overrides applied."""
+    bucket_setting = ranking_config["per_bucket"].get(bucket)
+    if isinstance(bucket_setting, dict) and greek in bucket_setting:
+        return int(bucket_setting[greek])
+    if isinstance(bucket_setting, (int, float)):
+        return int(bucket_setting)
+    return int(ranking_config["per_greek"].get(greek, ranking_config["top_n"]))
+
+def largest(values, ks):
+    """
+    Row indices of the ks[j] largest values of each column j, largest first. One argpartition
+    over all columns selects the candidates; only those max(ks) rows per column get sorted.
+    """
+    n = values.shape[0]
+    kmax = min(max(ks, default=0), n)
+    if kmax == 0:
+        return [np.empty(0, dtype=np.int64) for _ in ks]
+    if kmax < n:
+        candidates = np.argpartition(-values, kmax - 1, axis=0)[:kmax]
+    else:
+        candidates = np.broadcast_to(np.arange(n)[:, None], values.shape)
+    order = np.argsort(-np.take_along_axis(values, candidates, axis=0), axis=0, kind="stable")
+    ranked = np.take_along_axis(candidates, order, axis=0)
+    return [ranked[:min(k, n), j] for j, k in enumerate(ks)]
+
+def strike_totals(df, greeks):
+    """Per-strike totals of the greeks: cube totals pass through, contract rows are summed in one groupby."""
+    if df["strikePrice"].is_unique:
+        return df[["strikePrice"] + greeks]
+    return df.groupby("strikePrice", sort=True)[greeks].sum().reset_index()
+
+def previous_totals_path(stem, timestamp):
+    """File of a ranked table's saved totals for the day of a cycle timestamp."""
+    day = datetime.strptime(str(timestamp)[:10], "%Y-%m-%d")
+    return PREVIOUS_TOTALS_DIR / f"{day:%Y%m%d}" / f"{stem}_totals.npz"
+
+def load_saved_totals(path):
+    """Saved per-strike totals keyed by cycle timestamp (empty without a file)."""
+    if not path.exists():
+        return {}
+    with np.load(path) as data:
+        return {str(ts): pd.DataFrame(data[f"values_{i}"], columns=[str(g) for g in data[f"greeks_{i}"]],
+                                      index=pd.Index(data[f"strikes_{i}"], name="strikePrice"))
+                for i, ts in enumerate(data["timestamps"])}
+
+def load_previous_totals(stem, timestamp):
+    """
+    Per-strike totals of the cycle before timestamp on the same day for a ranked table, or
+    None (a re-run of a cycle is compared with the cycle before it, not with itself).
+    """
+    saved = load_saved_totals(previous_totals_path(stem, timestamp))
+    earlier = [ts for ts in saved if ts < str(timestamp)]
+    return saved[max(earlier)] if earlier else None
 
-def rank_exposures(df, exposure_column, top_n=5):
-    """Rank exposures (DEX, GEX, VEX, CEX) and return top and lowest rankings."""
-    try:
-        es_multiplier = extract_es_multiplier()  # Get dynamic multiplier
-        aggregated = (
-            df.groupby("strikePrice")[exposure_column]
-            .sum()
-            .reset_index()
-            .sort_values(by=exposure_column, ascending=False)
-        )
-        aggregated["Theo ES"] = aggregated["strikePrice"].apply(lambda x: calculate_theo_es(x, es_multiplier))
-        top_levels = aggregated.head(top_n).copy()
-        bottom_levels = aggregated.tail(top_n).copy()
-        top_levels["Rank"] = [f"Call {exposure_column} {i + 1}" for i in range(len(top_levels))]
-        bottom_levels["Rank"] = [f"Put {exposure_column} {top_n - i}" for i in range(len(bottom_levels))]
-        top_levels["Greek"] = exposure_column
-        bottom_levels["Greek"] = exposure_column
-        top_levels["Value"] = top_levels[exposure_column]
-        bottom_levels["Value"] = bottom_levels[exposure_column]
-        ranked_levels = pd.concat([top_levels, bottom_levels], axis=0).reset_index(drop=True)
-        logger.info(f"Top {top_n} and lowest {top_n} rankings for {exposure_column} identified.")
-        return ranked_levels
-    except Exception as e:
-        logger.error(f"Failed to rank exposures for {exposure_column}: {e}")
-        return pd.DataFrame()
-
-def process_file(file_path):
-    """Process a single CSV file to rank exposures and save outputs."""
-    try:
-        logger.info(f"Processing file: {file_path}")
-        df = pd.read_csv(file_path)
-        required_columns = ["strikePrice", "DEX", "GEX", "VEX", "CEX", "putCall"]
-        if not all(col in df.columns for col in required_columns):
-            raise ValueError(f"Missing required columns in {file_path}")
-        for col in ["DEX", "GEX", "VEX", "CEX", "strikePrice"]:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors="coerce")
-        ranked_data = []
-        for greek in ["DEX", "GEX", "VEX", "CEX"]:
-            ranked = rank_exposures(df, greek)
-            ranked_data.append(ranked)
-        final_df = pd.concat(ranked_data, ignore_index=True)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        final_df["timestamp"] = timestamp
-        final_df = final_df[["timestamp", "strikePrice", "Theo ES", "Rank", "Greek", "Value"]]
-        numerical_columns = ["strikePrice", "Theo ES", "Value"]
-        final_df[numerical_columns] = final_df[numerical_columns].round(3)
-        output_file_name = file_path.stem + "_ranked.csv"
-        output_path = OUTPUT_DIR / output_file_name
-        final_df.to_csv(output_path, index=False)
-        logger.info(f"Ranked results saved to: {output_path}")
-    except ValueError as ve:
-        logger.warning(f"Validation error in {file_path}: {ve}")
-    except Exception as e:
-        logger.error(f"Error processing file {file_path}: {e}")
-
-# ---------------------------- Main Processing ---------------------------- #
-
-def rank_all_exposures():
-    """Main function to process all CSV files from target directories for ranking exposures."""
-    try:
-        logger.info("Starting exposure ranking process.")
-        all_csv_files = []
-        for directory in target_dirs:
-            files = list(directory.glob("*.csv"))
-            logger.info(f"Found {len(files)} CSV files in {directory}")
-            all_csv_files.extend(files)
-
-        if process_clean_data != "Yes":
-            original_count = len(all_csv_files)
-            all_csv_files = [f for f in all_csv_files if "clean" not in f.stem.lower()]
-            logger.info(f"{len(all_csv_files)} CSV files remain after skipping files with 'clean' in the name (kClean set to 'No').")
-        else:
-            logger.info("kClean is set to 'Yes'; processing all files, including those with 'clean' in the name.")
-
-        if selected_iv_method != "All":
-            identifier = iv_method_mapping.get(selected_iv_method)
-            if identifier:
-                original_count = len(all_csv_files)
-                all_csv_files = [f for f in all_csv_files if identifier in f.stem.lower()]
-                logger.info(f"Filtered CSV files: {len(all_csv_files)} of {original_count} match IV method '{selected_iv_method}'.")
-            else:
-                logger.warning(f"No identifier mapping found for IV method '{selected_iv_method}'. Processing all files.")
-
-        # Filter based on expiration configuration only if not "All"
-        if expiration_option != "All":
-            original_count = len(all_csv_files)
-            all_csv_files = [f for f in all_csv_files if f.stem.lower().startswith(expiration_option.lower())]
-            logger.info(f"Filtered CSV files: {len(all_csv_files)} of {original_count} match expiration option '{expiration_option}'.")
+def save_previous_totals(totals, greeks, stem, timestamp):
+    """
+    Keep this cycle's per-strike totals, with those of the cycle before it, for the next
+    cycle's change ranking. Folders of earlier days are removed.
+    """
+    path = previous_totals_path(stem, timestamp)
+    for stale in PREVIOUS_TOTALS_DIR.glob("*"):
+        if stale == path.parent:
+            continue
+        if stale.is_dir():
+            shutil.rmtree(stale)
         else:
-            logger.info("Expiration option 'All' selected; processing all CSV files regardless of expiration indicator.")
-
-        if not all_csv_files:
-            logger.warning("No CSV files found to process after filtering.")
-            return
-
-        # Optionally sort files; here we use a sort key that prioritizes files containing '_results' in their stem
-        all_csv_files.sort(key=lambda f: ("_results" in f.stem, f.stem))
-        for file_path in all_csv_files:
-            logger.info(f"Processing file: {file_path}")
-            process_file(file_path)
-        logger.info("Exposure ranking process completed successfully.")
-    except Exception as e:
-        logger.error(f"An unexpected error occurred: {e}")
-
-# ---------------------------- Entry Point ---------------------------- #
-
-if __name__ == "__main__":
-    rank_all_exposures()
+            stale.unlink()
+    saved = load_saved_totals(path)
+    earlier = [ts for ts in saved if ts < str(timestamp)]
+    frames = {max(earlier): saved[max(earlier)]} if earlier else {}
+    frames[str(timestamp)] = totals.set_index("strikePrice")[greeks]
+    arrays = {"timestamps": np.array(list(frames))}
+    for i, frame in enumerate(frames.values()):
+        arrays.update({f"strikes_{i}": frame.index.to_numpy(), f"greeks_{i}": np.array(frame.columns, dtype=str),
+                       f"values_{i}": frame.to_numpy(dtype=np.float64)})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, **arrays)
+
+def exposure_changes(totals, greeks, previous):
+    """Change of each strike's totals since the previous cycle (new strikes count from 0; new greeks as unchanged)."""
+    current = totals.set_index("strikePrice")[greeks]
+    before = previous.reindex(index=current.index, columns=greeks).fillna(0.0)
+    missing = [greek for greek in greeks if greek not in previous.columns]
+    before[missing] = current[missing]
+    return (current - before).to_numpy(dtype=np.float64)
+
+def rank_exposures(totals, greeks, es_multiplier, bucket=None, changes=None):
+    """
+    Rank per-strike totals for every greek at once: the top / bottom k levels ("Call GEX 1",
+    "Put GEX 1" = most negative), plus "Abs" and "Up" / "Down" (change since the previous
+    cycle) levels when those keys are enabled and available.
+    """
+    strikes = totals["strikePrice"].to_numpy(dtype=np.float64)
+    values = totals[greeks].to_numpy(dtype=np.float64)
+    ks = [top_k(greek, bucket) for greek in greeks]
+    keys = {
+        "Call": (largest(values, ks), values),
+        "Put": ([idx[::-1] for idx in largest(-values, ks)], values),
+    }
+    if "abs" in ranking_config["extra_keys"]:
+        keys["Abs"] = (largest(np.abs(values), ks), values)
+    if changes is not None:
+        # Only strikes that actually moved are listed
+        rises = [idx[changes[idx, j] > 0] for j, idx in enumerate(largest(changes, ks))]
+        falls = [idx[changes[idx, j] < 0][::-1] for j, idx in enumerate(largest(-changes, ks))]
+        keys["Up"] = (rises, changes)
+        keys["Down"] = (falls, changes)
+
+    rows, columns, labels, ranked_values = [], [], [], []
+    for j, greek in enumerate(greeks):
+        for key, (selected, source) in keys.items():
+            idx = selected[j]
+            # Bottom-side keys are listed from the k-th level down to level 1
+            numbers = range(len(idx), 0, -1) if key in ("Put", "Down") else range(1, len(idx) + 1)
+            rows.append(idx)
+            columns.append(np.full(len(idx), j))
+            ranked_values.append(source[idx, j])
+            labels.extend(f"{key} {greek} {n}" for n in numbers)
+    if not rows:
+        return pd.DataFrame(columns=["strikePrice", "Theo ES", "Rank", "Greek", "Value"])
+    rows, columns = np.concatenate(rows), np.concatenate(columns)
+    logger.info(f"Ranked {len(greeks)} greeks ({', '.join(keys)}) over {len(strikes)} strikes.")
+    return pd.DataFrame({
+        "strikePrice": strikes[rows],
+        "Theo ES": calculate_theo_es(strikes[rows], es_multiplier),
+        "Rank": labels,
+        "Greek": np.array(greeks)[columns],
+        "Value": np.concatenate(ranked_values),
+    })
+
+def ranked_frame(df, es_multiplier, bucket=None, stem=None, flip=(None, None), timestamp=None):
+    """
+    Rank every exposure present in df (contract rows, per strike / side or per-strike totals)
+    into one table, with the bucket's gamma flip (cum, vec) as the last two columns.
+    With the "change" key enabled, the totals are also kept under stem for the next cycle.
+    timestamp defaults to now (the exposure stage passes its cycle timestamp).
+    """
+    timestamp = str(timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    greeks = [col for col in EXPOSURE_COLUMNS + HIGHER_ORDER_EXPOSURES if col in df.columns]
+    totals = strike_totals(df, greeks)
+    changes = None
+    if stem is not None and "change" in ranking_config["extra_keys"]:
+        previous = load_previous_totals(stem, timestamp)
+        if previous is not None:
+            changes = exposure_changes(totals, greeks, previous)
+        save_previous_totals(totals, greeks, stem, timestamp)
+    final_df = rank_exposures(totals, greeks, es_multiplier, bucket, changes)
+    final_df.insert(0, "timestamp", timestamp)
+    numerical_columns = ["strikePrice", "Theo ES", "Value"]
+    final_df[numerical_columns] = final_df[numerical_columns].astype("float64").round(3)
+    final_df = schema.enforce(final_df, "ranking")
+    final_df["Gamma Flip (cum)"], final_df["Gamma Flip (vec)"] = flip
+    return final_df
+
+def save_ranked(final_df, stem):
+    """Write a ranked table as {stem}_ranked.csv in the step_three directory."""
+    output_path = OUTPUT_DIR / (stem + "_ranked.csv")
+    schema.write_table(final_df, output_path)
+    logger.info(f"Ranked results saved to: {output_path}")
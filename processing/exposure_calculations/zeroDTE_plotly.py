@@ -6,6 +6,9 @@ from pathlib import Path
 from datetime import datetime
 import concurrent.futures
 
+from processing import chart_shell, expiration_buckets, exposure_cube, heatmap
+from processing.exposure_calculations import clean
+
 # -----------------------------------------------------------------------------
 # Input/output directories
 # -----------------------------------------------------------------------------
@@ -15,13 +18,21 @@ PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
 INPUT_SUBDIRS = ["grok", "hybrid_one", "brent_bs"]
 INPUT_BASE_DIR = PROJECT_ROOT / "outputs" / "step_two"
 
-# Where we want to output the final HTML charts
+# Where we want to output the final HTML charts: each chart is a persistent shell plus the
+# JSON payload rewritten every cycle (processing/chart_shell.py)
 OUTPUT_DIR_CLEAN = PROJECT_ROOT / "visualization" / "plotly" / "clean"
 OUTPUT_DIR_FULL  = PROJECT_ROOT / "visualization" / "plotly" / "full"
 
 # CSVs with per-greek totals + ratio live in "step_three/ratio"
 RATIO_DIR = PROJECT_ROOT / "outputs" / "step_three" / "ratio"
 
+# Charts produced per file; higher-order exposures only when the input has them
+EXPOSURE_COLUMNS = ["DEX", "GEX", "VEX", "CEX"]
+HIGHER_ORDER_EXPOSURES = ["VOMEX", "ZOMEX", "SPDEX", "COLEX", "VETEX"]
+
+# Strike x expiration heatmaps (and their intraday surface) are drawn for these exposures
+HEATMAP_EXPOSURES = heatmap.SURFACE_GREEKS
+
 # Ensure output directories exist
 OUTPUT_DIR_CLEAN.mkdir(parents=True, exist_ok=True)
 OUTPUT_DIR_FULL.mkdir(parents=True, exist_ok=True)
@@ -43,6 +54,9 @@ def load_strike_range():
 
 STRIKE_RANGE = load_strike_range()
 
+# Heatmap buffers, reused by every table a worker process charts
+engine = heatmap.HeatmapEngine()
+
 # -----------------------------------------------------------------------------
 # Load IV method configuration
 # -----------------------------------------------------------------------------
@@ -112,6 +126,28 @@ def group_by_greek(df: pd.DataFrame, greek_name: str) -> pd.DataFrame:
     )
     return grouped
 
+def table_bucket_model(csv_path: Path):
+    """(bucket, model) of a {bucket}_{model}_results.csv bucket table, or None."""
+    bucket, _, rest = csv_path.stem.partition("_")
+    if bucket not in expiration_buckets.BUCKETS or not rest.endswith("_results"):
+        return None
+    return bucket, rest[:-len("_results")]
+
+def cube_strike_totals(csv_path: Path, min_strike: float, max_strike: float):
+    """
+    Per-strike totals of a {bucket}_{model}_results.csv bucket, reduced from the model's
+    exposure cube instead of re-grouping the CSV rows. Returns None when there is no cube.
+    """
+    table = table_bucket_model(csv_path)
+    if table is None:
+        return None
+    bucket, model = table
+    cube = exposure_cube.ExposureCube.load(exposure_cube.cube_path(model))
+    if cube is None:
+        return None
+    totals = cube.strike_totals(today=datetime.now().date(), bucket=bucket)
+    return totals[(totals["strikePrice"] >= min_strike) & (totals["strikePrice"] <= max_strike)]
+
 def create_plotly_figure(
     grouped_df: pd.DataFrame,
     spot_price: float,
@@ -128,7 +164,8 @@ def create_plotly_figure(
     Creates a horizontal bar chart (dark theme) showing total (CALL+PUT)
     exposures by strikePrice for one Greek.
     """
-    color_map = {"GEX": "green", "VEX": "blue", "DEX": "red", "CEX": "pink"}
+    color_map = {"GEX": "green", "VEX": "blue", "DEX": "red", "CEX": "pink",
+                 "VOMEX": "purple", "ZOMEX": "teal", "SPDEX": "orange", "COLEX": "gold", "VETEX": "cyan"}
     bar_color = color_map.get(greek_name, "gray")
 
     fig = go.Figure()
@@ -204,34 +241,8 @@ def create_plotly_figure(
 
     return fig
 
-# -----------------------------------------------------------------------------
-# Process Single CSV with Dynamic Strike Range
-# -----------------------------------------------------------------------------
-def process_single_csv(csv_path: Path):
-    """
-    Reads one CSV from one of the new input folders, then produces DEX/GEX/VEX/CEX horizontal bar charts.
-    Only strike prices within the user-defined strike range around the spot price are included.
-    """
-    df = pd.read_csv(csv_path)
-    if df.empty:
-        print(f"Skipping empty file: {csv_path.name}")
-        return
-
-    file_name = csv_path.name
-
-    # Determine output directory by suffix
-    if file_name.endswith("_clean.csv"):
-        out_dir = OUTPUT_DIR_CLEAN
-    elif file_name.endswith("_results.csv"):
-        out_dir = OUTPUT_DIR_FULL
-    else:
-        print(f"Skipping file (no recognized suffix): {csv_path.name}")
-        return
-
-    base_no_ext = file_name.rsplit(".", 1)[0]
-    ratio_csv_name = f"{base_no_ext}_greek_totals.csv"
-    ratio_csv_path = RATIO_DIR / ratio_csv_name
-
+def load_ratio_data(ratio_csv_path: Path, file_name: str) -> dict:
+    """Per-greek (Call, Put, Ratio) from a step_three/ratio CSV; empty when missing."""
     ratio_data = {}
     if ratio_csv_path.exists():
         df_ratios = pd.read_csv(ratio_csv_path)
@@ -247,34 +258,23 @@ def process_single_csv(csv_path: Path):
             print(f"Missing columns in ratio CSV for {file_name}: {ratio_csv_path}")
     else:
         print(f"No ratio CSV found for {file_name} at {ratio_csv_path}")
+    return ratio_data
 
+def render_charts(df: pd.DataFrame, strike_totals, out_dir: Path, base_no_ext: str, expiration: str,
+                  timestamp_str: str, cum_gam_value, cum_vec_value, min_strike: float, max_strike: float):
+    """Write one horizontal bar chart per exposure column of df (rows already in the strike range)."""
+    ratio_data = load_ratio_data(RATIO_DIR / f"{base_no_ext}_greek_totals.csv", base_no_ext)
     spot_price = df["spotPrice"].iloc[0]
-    min_strike = spot_price - STRIKE_RANGE
-    max_strike = spot_price + STRIKE_RANGE
-
-    df = df[(df["strikePrice"] >= min_strike) & (df["strikePrice"] <= max_strike)]
-    if df.empty:
-        print(f"Skipping {csv_path.name}, no strikes in range ±{STRIKE_RANGE}")
-        return
-
-    print(f"Processing {csv_path.name} with strike range ±{STRIKE_RANGE}...")
-
-    mod_time = os.path.getmtime(csv_path)
-    timestamp_str = datetime.fromtimestamp(mod_time).strftime("%m.%d.%Y %H:%M:%S")
-
-    # Extract expiration from the file name (assumes first token is expiration)
-    expiration_from_file = csv_path.stem.split("_")[0]
-
-    cum_gam_value = df["cum_gam"].iloc[0] if "cum_gam" in df.columns else None
-    cum_vec_value = df["cum_vec"].iloc[0] if "cum_vec" in df.columns else None
-
 
-    for greek_name in ["DEX", "GEX", "VEX", "CEX"]:
-        grouped_df = group_by_greek(df, greek_name)
+    for greek_name in EXPOSURE_COLUMNS + [col for col in HIGHER_ORDER_EXPOSURES if col in df.columns]:
+        if strike_totals is not None and greek_name in strike_totals.columns:
+            grouped_df = strike_totals[["strikePrice", greek_name]].rename(columns={greek_name: "exposure"}).round(3)
+        else:
+            grouped_df = group_by_greek(df, greek_name)
         call_val, put_val, ratio_val = (None, None, None)
         if greek_name in ratio_data:
             call_val, put_val, ratio_val = ratio_data[greek_name]
-        chart_title = f"SPX {expiration_from_file} {greek_name} {timestamp_str}"
+        chart_title = f"SPX {expiration} {greek_name} {timestamp_str}"
         if ratio_val is not None:
             chart_title += f" (Ratio: {ratio_val:.4f})"
 
@@ -293,19 +293,122 @@ def process_single_csv(csv_path: Path):
 
         html_name = f"{base_no_ext}_{greek_name}.html"
         html_path = out_dir / html_name
-        fig.write_html(html_path, include_plotlyjs="cdn", full_html=True, config={"responsive": True})
+        chart_shell.write_figure(fig, html_path)
+        print(f"Produced: {html_path}")
+
+def create_heatmap_figure(z, x, y, spot_price: float, title: str, xaxis_title: str) -> go.Figure:
+    """Strike (y) heatmap, diverging around 0, with the spot price marked."""
+    fig = go.Figure(go.Heatmap(z=z, x=x, y=y, colorscale="RdBu", zmid=0,
+                               hovertemplate="%{y} %{x}: %{z}<extra></extra>"))
+    fig.add_hline(y=spot_price, line_dash="dash", line_color="yellow")
+    fig.update_layout(template="plotly_dark", title=title, autosize=True,
+                      xaxis_title=xaxis_title, yaxis_title="Strike Price")
+    return fig
+
+def render_heatmaps(csv_path: Path, base_no_ext: str, expiration: str, timestamp_str: str,
+                    spot_price: float, min_strike: float, max_strike: float):
+    """
+    Write, for each heatmap exposure, the bucket's strike x expiration heatmap from the exposure
+    cube and the strike x time heatmap of the day's surface series (how it evolved intraday).
+    """
+    table = table_bucket_model(csv_path)
+    if table is None:
+        return
+    bucket, model = table
+    cube = exposure_cube.ExposureCube.load(exposure_cube.cube_path(model))
+    if cube is None:
+        return
+    today = datetime.now().date()
+    strike_range = (min_strike, max_strike)
+    for greek_name in HEATMAP_EXPOSURES:
+        if greek_name not in cube.greeks:
+            continue
+        grid = engine.exposure(cube, greek_name, today, bucket, strike_range)
+        fig = create_heatmap_figure(grid.values, [str(d) for d in grid.expiration_dates()], grid.strikes, spot_price,
+                                    f"SPX {expiration} {greek_name} by expiration {timestamp_str}", "Expiration")
+        html_path = OUTPUT_DIR_FULL / f"{base_no_ext}_{greek_name}_heatmap.html"
+        chart_shell.write_figure(fig, html_path)
         print(f"Produced: {html_path}")
 
+        series = heatmap.SurfaceSeries.open(model, greek_name, today)
+        if series is None or series.size == 0:
+            continue
+        timestamps, strikes, values = series.strike_time(today, bucket, strike_range)
+        fig = create_heatmap_figure(values, timestamps, strikes, spot_price,
+                                    f"SPX {expiration} {greek_name} intraday {timestamp_str}", "Time")
+        html_path = OUTPUT_DIR_FULL / f"{base_no_ext}_{greek_name}_surface.html"
+        chart_shell.write_figure(fig, html_path)
+        print(f"Produced: {html_path}")
+
+# -----------------------------------------------------------------------------
+# Process Single CSV with Dynamic Strike Range
+# -----------------------------------------------------------------------------
+def process_single_csv(csv_path: Path):
+    """
+    Reads one {bucket}_{model}_results.csv bucket table, then produces DEX/GEX/VEX/CEX (and any
+    higher-order exposure) horizontal bar charts. With kClean enabled, the clean charts come
+    from the same rows through the table's "clean" mask (strikes quoted on both sides).
+    Only strike prices within the user-defined strike range around the spot price are included.
+    """
+    df = pd.read_csv(csv_path)
+    if df.empty:
+        print(f"Skipping empty file: {csv_path.name}")
+        return
+
+    if not csv_path.name.endswith("_results.csv"):
+        print(f"Skipping file (no recognized suffix): {csv_path.name}")
+        return
+    base_no_ext = csv_path.stem
+
+    spot_price = df["spotPrice"].iloc[0]
+    min_strike = spot_price - STRIKE_RANGE
+    max_strike = spot_price + STRIKE_RANGE
+
+    df = df[(df["strikePrice"] >= min_strike) & (df["strikePrice"] <= max_strike)]
+    if df.empty:
+        print(f"Skipping {csv_path.name}, no strikes in range ±{STRIKE_RANGE}")
+        return
+
+    print(f"Processing {csv_path.name} with strike range ±{STRIKE_RANGE}...")
+
+    mod_time = os.path.getmtime(csv_path)
+    timestamp_str = datetime.fromtimestamp(mod_time).strftime("%m.%d.%Y %H:%M:%S")
+
+    # Extract expiration from the file name (assumes first token is expiration)
+    expiration_from_file = csv_path.stem.split("_")[0]
+
+    cum_gam_value = df["cum_gam"].iloc[0] if "cum_gam" in df.columns else None
+    cum_vec_value = df["cum_vec"].iloc[0] if "cum_vec" in df.columns else None
+
+    # Bucket charts are reductions over the exposure cube (grouped from the rows when there is none)
+    strike_totals = cube_strike_totals(csv_path, min_strike, max_strike)
+    render_charts(df, strike_totals, OUTPUT_DIR_FULL, base_no_ext, expiration_from_file, timestamp_str,
+                  cum_gam_value, cum_vec_value, min_strike, max_strike)
+    render_heatmaps(csv_path, base_no_ext, expiration_from_file, timestamp_str, spot_price, min_strike, max_strike)
+
+    if process_clean_data != "Yes" or "clean" not in df.columns:
+        return
+    clean_df = df[df["clean"].astype(bool)]
+    if clean_df.empty:
+        print(f"Skipping clean charts for {csv_path.name}, no strikes quoted on both sides in range")
+        return
+    clean_totals = None
+    if strike_totals is not None:
+        clean_totals = strike_totals[strike_totals["strikePrice"].isin(clean_df["strikePrice"])]
+    render_charts(clean_df, clean_totals, OUTPUT_DIR_CLEAN, clean.clean_stem(base_no_ext), expiration_from_file,
+                  timestamp_str, clean_df["clean_cum_gam"].iloc[0], clean_df["clean_cum_vec"].iloc[0],
+                  min_strike, max_strike)
+
 # -----------------------------------------------------------------------------
 # Main: Dynamic File Filtering and Parallel Processing
 # -----------------------------------------------------------------------------
 def run_all_visualizations():
-    # Gather all CSV files from the three input subdirectories
+    # Gather the bucket tables from the three input subdirectories (clean charts come from their mask)
     csv_files = []
     for subfolder in INPUT_SUBDIRS:
         folder = INPUT_BASE_DIR / subfolder
         if folder.exists():
-            folder_files = list(folder.glob("*.csv"))
+            folder_files = list(folder.glob("*_results.csv"))
             print(f"Found {len(folder_files)} CSV files in {folder}")
             csv_files.extend(folder_files)
         else:
@@ -316,13 +419,8 @@ def run_all_visualizations():
         return
 
     # --- Dynamic Filtering Based on JSON Configurations ---
-    # kClean filtering: if kClean != "Yes", skip files with "clean" in the filename
-    if process_clean_data != "Yes":
-        original_count = len(csv_files)
-        csv_files = [f for f in csv_files if "clean" not in f.stem.lower()]
-        print(f"{len(csv_files)} CSV files remain after skipping files with 'clean' in the name (from {original_count}).")
-    else:
-        print("kClean is set to 'Yes'; processing all CSV files, including those with 'clean' in the name.")
+    # kClean: charts for the clean mask of each table are added in process_single_csv
+    print(f"kClean is set to '{process_clean_data}'; clean charts {'included' if process_clean_data == 'Yes' else 'skipped'}.")
 
     # IV method filtering: if selected_iv_method != "All", filter files by identifier
     if selected_iv_method != "All":
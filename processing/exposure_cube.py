@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+
+from processing import expiration_buckets
+
+# ---------------------------- Exposure Cube ---------------------------- #
+# Exposures summed per strike x expiration x greek x side, built once per cycle by abso_expo
+# and saved next to the master tables. Ranking, greek totals / ratios, the gamma flip and the
+# charts are reductions over it (sum over expirations in a bucket, then over sides and/or
+# strikes) instead of re-reading and re-grouping the per-contract CSVs.
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CUBE_DIR = PROJECT_ROOT / "outputs" / "step_two" / "cube"
+SIDES = ["CALL", "PUT"]
+
+
+def cube_path(model):
+    """Path of one model's saved cube."""
+    return CUBE_DIR / f"{model}_cube.npz"
+
+
+class ExposureCube:
+    """
+    values[strike, expiration, greek, side] holds the summed exposure and
+    counts[strike, expiration, side] the number of contracts in each cell, so reductions
+    only report strikes that actually trade in the selected expirations. Expirations are
+    date ordinals, so a cube saved late in the day still reads correctly after midnight.
+    """
+
+    def __init__(self, strikes, expirations, greeks, values, counts):
+        self.strikes = np.asarray(strikes, dtype=np.float64)
+        self.expirations = np.asarray(expirations, dtype=np.int64)
+        self.greeks = list(greeks)
+        self.values = values
+        self.counts = counts
+
+    @classmethod
+    def empty(cls, greeks):
+        """Cube with no strikes or expirations yet."""
+        return cls([], [], greeks, np.zeros((0, 0, len(greeks), len(SIDES))),
+                   np.zeros((0, 0, len(SIDES)), dtype=np.int32))
+
+    @classmethod
+    def from_frame(cls, df, greeks, today=None):
+        """Build a cube from contract rows (strikePrice, expirationDays, putCall and the greek columns)."""
+        cube = cls.empty(greeks)
+        cube.update(df, today)
+        return cube
+
+    # ---------------------------- Updates ---------------------------- #
+
+    def _grow(self, strikes, expirations):
+        """Extend the strike / expiration axes with values not seen yet (existing cells keep their data)."""
+        new_strikes = np.union1d(self.strikes, strikes)
+        new_expirations = np.union1d(self.expirations, expirations)
+        if len(new_strikes) == len(self.strikes) and len(new_expirations) == len(self.expirations):
+            return
+        values = np.zeros((len(new_strikes), len(new_expirations), len(self.greeks), len(SIDES)))
+        counts = np.zeros((len(new_strikes), len(new_expirations), len(SIDES)), dtype=np.int32)
+        s = np.searchsorted(new_strikes, self.strikes)
+        e = np.searchsorted(new_expirations, self.expirations)
+        values[np.ix_(s, e)] = self.values
+        counts[np.ix_(s, e)] = self.counts
+        self.strikes, self.expirations, self.values, self.counts = new_strikes, new_expirations, values, counts
+
+    def update(self, df, today=None):
+        """
+        Replace the cells (strike, expiration, side) of the contracts in df with their summed
+        exposures; every other cell is left untouched. Used for the full build and for
+        refreshing only the contracts that changed. Returns the number of cells that changed.
+        """
+        today = today or datetime.now().date()
+        strikes = df["strikePrice"].to_numpy(dtype=np.float64)
+        expirations = today.toordinal() + df["expirationDays"].to_numpy(dtype=np.int64)
+        side = (df["putCall"].astype(str).str.upper() == "PUT").to_numpy().astype(np.int64)
+        self._grow(strikes, expirations)
+
+        s = np.searchsorted(self.strikes, strikes)
+        e = np.searchsorted(self.expirations, expirations)
+        cells = (s * len(self.expirations) + e) * len(SIDES) + side
+        unique_cells, inverse = np.unique(cells, return_inverse=True)
+        cell_s, rest = np.divmod(unique_cells, len(self.expirations) * len(SIDES))
+        cell_e, cell_side = np.divmod(rest, len(SIDES))
+
+        sums = np.column_stack([
+            np.bincount(inverse, weights=np.nan_to_num(df[greek].to_numpy(dtype=np.float64)),
+                        minlength=len(unique_cells))
+            for greek in self.greeks
+        ]) if self.greeks else np.zeros((len(unique_cells), 0))
+        counts = np.bincount(inverse, minlength=len(unique_cells)).astype(np.int32)
+
+        # Advanced indices around the greek slice: the cell axis comes first -> (cells, greeks)
+        changed = (np.any(self.values[cell_s, cell_e, :, cell_side] != sums, axis=1)
+                   | (self.counts[cell_s, cell_e, cell_side] != counts))
+        self.values[cell_s, cell_e, :, cell_side] = sums
+        self.counts[cell_s, cell_e, cell_side] = counts
+        return int(changed.sum())
+
+    # ---------------------------- Reductions ---------------------------- #
+
+    def expiration_mask(self, today=None, bucket=None):
+        """Expirations from today on, restricted to an expiration bucket when given."""
+        today = today or datetime.now().date()
+        days = self.expirations - today.toordinal()
+        if bucket is None:
+            return days >= 0
+        return expiration_buckets.bucket_mask(days, bucket, today)
+
+    def _reduce(self, greeks, today, bucket):
+        """Values (strike, greek, side) and counts (strike, side) summed over the selected expirations."""
+        greeks = self.greeks if greeks is None else list(greeks)
+        g = [self.greeks.index(greek) for greek in greeks]
+        mask = self.expiration_mask(today, bucket)
+        values = self.values[:, mask][:, :, g].sum(axis=1)
+        counts = self.counts[:, mask].sum(axis=1)
+        return greeks, values, counts
+
+    def strike_side_totals(self, greeks=None, today=None, bucket=None):
+        """DataFrame of strikePrice, putCall and one column per greek for the traded (strike, side) cells."""
+        greeks, values, counts = self._reduce(greeks, today, bucket)
+        s, side = np.nonzero(counts)
+        totals = pd.DataFrame(values[s, :, side], columns=greeks)
+        totals.insert(0, "putCall", np.array(SIDES)[side])
+        totals.insert(0, "strikePrice", self.strikes[s])
+        return totals
+
+    def strike_totals(self, greeks=None, today=None, bucket=None):
+        """DataFrame of strikePrice and one column per greek (calls + puts) for the traded strikes."""
+        greeks, values, counts = self._reduce(greeks, today, bucket)
+        s = np.flatnonzero(counts.sum(axis=1))
+        totals = pd.DataFrame(values[s].sum(axis=2), columns=greeks)
+        totals.insert(0, "strikePrice", self.strikes[s])
+        return totals
+
+    def matched_strikes(self, today=None, bucket=None):
+        """Strikes with contracts on both sides (CALL and PUT) in the selected expirations (kClean)."""
+        counts = self.counts[:, self.expiration_mask(today, bucket)].sum(axis=1)
+        return self.strikes[(counts > 0).all(axis=1)]
+
+    def side_totals(self, greeks=None, today=None, bucket=None):
+        """DataFrame indexed by side (CALL / PUT) with the total of each greek."""
+        greeks, values, _ = self._reduce(greeks, today, bucket)
+        return pd.DataFrame(values.sum(axis=0).T, index=SIDES, columns=greeks)
+
+    # ---------------------------- Persistence ---------------------------- #
+
+    def save(self, path):
+        """Save the cube as a compressed .npz."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, strikes=self.strikes, expirations=self.expirations,
+                            greeks=np.array(self.greeks), values=self.values, counts=self.counts)
+
+    @classmethod
+    def load(cls, path):
+        """Load a cube saved with save(), or None if there is none."""
+        if not Path(path).exists():
+            return None
+        with np.load(path) as data:
+            return cls(data["strikes"], data["expirations"], [str(g) for g in data["greeks"]],
+                       data["values"], data["counts"])
@@ -0,0 +1,94 @@
+import pandas as pd
+
+from processing import history_store
+
+# ---------------------------- Gamma Flip Series ---------------------------- #
+# Intraday series of the gamma flip (cumulative-GEX crossing, cum / vec), the spot-sweep
+# zero-gamma level, spot and the flips in futures terms (Theo), one row per cycle per
+# (index, model, bucket, variant). Recorded by the exposure stage as it computes the flips
+# and kept in the day's history store, so readers query it instead of scanning step_three.
+
+# A flip further than this from spot (index points) is flagged invalid
+VALID_RANGE = 350
+
+VALUE_COLUMNS = ["spot", "flip_cum", "flip_vec", "zero_gamma", "theo_cum", "theo_vec", "valid_cum", "valid_vec"]
+
+
+def _theo(level, futures_multiplier):
+    """A level in futures terms (rounded to 0.01), or None."""
+    if level is None or futures_multiplier is None:
+        return None
+    return round(level + level * futures_multiplier, 2)
+
+
+def _valid(level, spot):
+    """Whether a level is within VALID_RANGE of spot."""
+    return level is not None and spot is not None and abs(level - spot) <= VALID_RANGE
+
+
+def record(index, model, bucket, variant, timestamp, flip, zero_gamma, spot, futures_multiplier, day=None,
+           root=history_store.HISTORY_DIR):
+    """Append one cycle's flips (cum, vec) and zero-gamma level for a bucket table to the series."""
+    cum, vec = flip
+    row = pd.DataFrame([{
+        "index_symbol": index,
+        "model": model,
+        "bucket": bucket,
+        "variant": variant,
+        "timestamp": timestamp,
+        "spot": spot,
+        "flip_cum": cum,
+        "flip_vec": vec,
+        "zero_gamma": zero_gamma,
+        "theo_cum": _theo(cum, futures_multiplier),
+        "theo_vec": _theo(vec, futures_multiplier),
+        "valid_cum": int(_valid(cum, spot)),
+        "valid_vec": int(_valid(vec, spot)),
+    }])
+    conn = history_store.connect(day, root)
+    try:
+        return history_store.insert_rows(conn, "gamma_flips", row)
+    finally:
+        conn.close()
+
+# ---------------------------- Queries ---------------------------- #
+
+def series(day=None, index="SPX", model=None, bucket=None, variant="results", start=None, end=None,
+           valid_only=False, root=history_store.HISTORY_DIR):
+    """
+    Recorded flips of one day in time order, optionally for one model / bucket / variant and a
+    timestamp range. valid_only blanks the flips (and their Theo values) flagged invalid.
+    """
+    columns = history_store.PARTITION_COLUMNS + ["timestamp"] + VALUE_COLUMNS
+    if not history_store.store_path(day, root).exists():
+        return pd.DataFrame(columns=columns)
+    conn = history_store.connect(day, root)
+    try:
+        filters = dict(zip(history_store.PARTITION_COLUMNS, (index, model, bucket, variant)))
+        df = history_store.select_rows(conn, "gamma_flips", columns, filters, start, end)
+    finally:
+        conn.close()
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    if valid_only:
+        for side in ("cum", "vec"):
+            invalid = df[f"valid_{side}"] == 0
+            df.loc[invalid, [f"flip_{side}", f"theo_{side}"]] = None
+    return df
+
+
+def latest(day=None, index="SPX", model=None, bucket=None, variant="results", valid_only=False,
+           root=history_store.HISTORY_DIR):
+    """The most recent row of each (model, bucket, variant) series."""
+    df = series(day, index, model, bucket, variant, valid_only=valid_only, root=root)
+    return df.groupby(history_store.PARTITION_COLUMNS, sort=True).tail(1).reset_index(drop=True)
+
+
+def resample(df, rule="5min"):
+    """Last recorded values of each series per interval (pandas offset alias, e.g. "1min", "15min")."""
+    if df.empty:
+        return df
+    return (df.set_index("timestamp")
+            .groupby(history_store.PARTITION_COLUMNS, sort=True)[VALUE_COLUMNS]
+            .resample(rule).last()
+            .dropna(how="all")
+            .reset_index())
@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+
+# ---------------------------- Gamma Profile ---------------------------- #
+# Total dealer gamma (GEX convention: gamma * OI * S^2 * 100, puts negated, in millions)
+# re-evaluated at a grid of hypothetical spot levels around the current spot, with every
+# contract keeping its strike, time to expiry, IV and rate. The zero-gamma level is where
+# the profile changes sign, interpolated between grid points. Unlike the cumulative-GEX
+# gamma flip it does not snap to listed strikes.
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+PROFILE_DIR = PROJECT_ROOT / "outputs" / "step_three" / "gamma_profile"
+
+# Spot grid: +/- SWEEP_PCT around spot in STEP_POINTS steps
+SWEEP_PCT = 0.05
+STEP_POINTS = 1.0
+# Contracts x grid points evaluated per chunk (bounds the temporary arrays to ~8 MB each)
+CHUNK_CELLS = 1_000_000
+
+INV_SQRT_2PI = 1.0 / np.sqrt(2.0 * np.pi)
+
+
+def profile_path(stem):
+    """Path of the published profile for one bucket table."""
+    return PROFILE_DIR / f"{stem}_gamma_profile.csv"
+
+
+def spot_grid(spot, sweep_pct=SWEEP_PCT, step=STEP_POINTS):
+    """Hypothetical spot levels from spot * (1 - sweep_pct) to spot * (1 + sweep_pct)."""
+    low = np.floor(spot * (1 - sweep_pct) / step) * step
+    high = np.ceil(spot * (1 + sweep_pct) / step) * step
+    return np.arange(low, high + step / 2, step)
+
+
+def contract_arrays(df):
+    """
+    Per-contract inputs of the sweep from contract rows (strikePrice, T, impliedVolatility,
+    SOFR, openInterest, putCall). Rows without a usable IV, T or open interest are dropped.
+    """
+    def column(name):
+        return df[name].to_numpy(dtype=np.float64)
+
+    K, T, sigma, r, oi = (column(name) for name in ("strikePrice", "T", "impliedVolatility", "SOFR", "openInterest"))
+    sign = np.where((df["putCall"] == "PUT").to_numpy(), -1.0, 1.0)
+    valid = np.isfinite(K + T + sigma + r + oi) & (T > 0) & (sigma > 0) & (oi != 0)
+    sig_sqrt_t = sigma[valid] * np.sqrt(T[valid])
+    return {
+        "log_k": np.log(K[valid]),
+        "drift": (r[valid] + 0.5 * sigma[valid] ** 2) * T[valid],
+        "sig_sqrt_t": sig_sqrt_t,
+        # gamma * S^2 = pdf(d1) * S / sig_sqrt_t, so each contract contributes weight * pdf(d1) * S
+        "weight": sign[valid] * oi[valid] / sig_sqrt_t,
+    }
+
+
+def gamma_profile(contracts, grid, chunk_cells=CHUNK_CELLS):
+    """
+    Total GEX (millions) at every spot in grid: the contracts x grid d1 matrix is broadcast
+    one chunk of contracts at a time and reduced with a matrix-vector product.
+    """
+    log_s = np.log(grid)
+    total = np.zeros(len(grid))
+    rows = max(1, chunk_cells // max(len(grid), 1))
+    for start in range(0, len(contracts["weight"]), rows):
+        chunk = slice(start, start + rows)
+        d1 = (log_s[None, :] - contracts["log_k"][chunk, None] + contracts["drift"][chunk, None]) \
+            / contracts["sig_sqrt_t"][chunk, None]
+        pdf = np.exp(-0.5 * d1 * d1)
+        total += contracts["weight"][chunk] @ pdf
+    return total * INV_SQRT_2PI * grid * 100 / 1_000_000
+
+
+def zero_gamma(grid, profile, spot):
+    """
+    Spot level where the profile crosses zero, linearly interpolated between the two grid
+    points around the crossing; the crossing nearest spot when there are several, else None.
+    """
+    crossings = np.flatnonzero(np.sign(profile[:-1]) * np.sign(profile[1:]) < 0)
+    if crossings.size == 0:
+        return None
+    i = crossings[np.argmin(np.abs(grid[crossings] - spot))]
+    fraction = profile[i] / (profile[i] - profile[i + 1])
+    return float(grid[i] + fraction * (grid[i + 1] - grid[i]))
+
+
+def sweep(df, spot, sweep_pct=SWEEP_PCT, step=STEP_POINTS):
+    """Profile DataFrame (spot, GEX) over the grid around spot, and the zero-gamma level."""
+    grid = spot_grid(spot, sweep_pct, step)
+    profile = gamma_profile(contract_arrays(df), grid)
+    return pd.DataFrame({"spot": grid, "GEX": profile}), zero_gamma(grid, profile, spot)
+
+
+def publish(profile, level, spot, stem):
+    """Write a profile for charting, with the zero-gamma level and the spot it was swept around."""
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    output = profile.round({"GEX": 6})
+    output.insert(0, "timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    output["current_spot"] = spot
+    output["zero_gamma"] = level
+    output.to_csv(profile_path(stem), index=False)
+    return profile_path(stem)
@@ -0,0 +1,265 @@
+import json
+import numpy as np
+import pandas as pd
+from datetime import date, datetime
+from pathlib import Path
+
+from processing import expiration_buckets, exposure_cube
+
+# ---------------------------- Heatmap Engine ---------------------------- #
+# Dense strike x expiration matrices for the heatmap charts. Exposures come straight from
+# the exposure cube: a bucket is a contiguous slice of its expiration axis and a strike range
+# one of its strike axis, so a matrix is the two side slices added into a preallocated
+# buffer. Buffers live as long as their engine, i.e. across the buckets, models and greeks
+# a stage process draws; every pipeline stage is a new process, so they are not kept from
+# one cycle to the next. Volume / open interest are pivoted from contract rows onto the same
+# kind of grid. The surface series keeps one matrix per cycle in a memory-mapped ring, so the
+# intraday evolution of the GEX surface is read from one file instead of recomputed from the
+# per-cycle tables, and a cycle only writes its own matrix.
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SURFACE_DIR = PROJECT_ROOT / "outputs" / "step_two" / "heatmap"
+STRIKE_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "strikerange_config.json"
+
+# Exposures recorded per cycle in the surface series
+SURFACE_GREEKS = ["GEX"]
+# Cycles kept per series (a full session at one cycle per minute)
+SURFACE_CAPACITY = 420
+
+
+def load_strike_range():
+    """Strike range around spot (strikerange_config.json), 700 when missing."""
+    try:
+        with open(STRIKE_CONFIG_PATH, "r") as f:
+            return int(json.load(f).get("value", 700))
+    except (FileNotFoundError, json.JSONDecodeError, ValueError):
+        return 700
+
+
+def surface_paths(model, greek, day):
+    """(.npy frames, .npz axes) of one model's surface series for an exposure on a day."""
+    stem = SURFACE_DIR / f"{model}_{greek}_{day:%Y%m%d}"
+    return stem.with_suffix(".npy"), stem.with_suffix(".npz")
+
+
+class Heatmap:
+    """values[strike, expiration] on the strikes / expirations (date ordinals) axes."""
+
+    def __init__(self, strikes, expirations, values):
+        self.strikes = strikes
+        self.expirations = expirations
+        self.values = values
+
+    def expiration_dates(self):
+        """Expiration axis as dates."""
+        return [date.fromordinal(int(ordinal)) for ordinal in self.expirations]
+
+    def strike_profile(self):
+        """Values summed over the expirations (the per-strike bar chart)."""
+        return self.values.sum(axis=1)
+
+    def frame(self):
+        """DataFrame indexed by strike with one column per expiration date."""
+        return pd.DataFrame(self.values, index=pd.Index(self.strikes, name="strikePrice"),
+                            columns=self.expiration_dates())
+
+
+def _strike_slice(strikes, strike_range):
+    """Slice of a sorted strike axis inside (min, max), all of it without a range."""
+    if strike_range is None:
+        return slice(0, len(strikes))
+    start, stop = np.searchsorted(strikes, strike_range[0], "left"), np.searchsorted(strikes, strike_range[1], "right")
+    return slice(int(start), int(stop))
+
+
+class HeatmapEngine:
+    """
+    Builds heatmaps into buffers kept between calls, one per layer name and regrown only when
+    a grid larger than any before is asked for, so the matrices after the first do not allocate.
+    A returned matrix is a view of its buffer: the next call for the same layer overwrites it.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+
+    def _buffer(self, name, rows, cols):
+        """Reused (rows, cols) view of a layer's buffer."""
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape[0] < rows or buffer.shape[1] < cols:
+            old = buffer.shape if buffer is not None else (0, 0)
+            buffer = np.zeros((max(rows, old[0]), max(cols, old[1])))
+            self._buffers[name] = buffer
+        return buffer[:rows, :cols]
+
+    def exposure(self, cube, greek, today=None, bucket=None, strike_range=None, side=None):
+        """Heatmap of one exposure over a bucket's expirations: calls + puts, or one side (CALL / PUT)."""
+        expirations = np.flatnonzero(cube.expiration_mask(today, bucket))
+        e = slice(int(expirations[0]), int(expirations[-1]) + 1) if len(expirations) else slice(0, 0)
+        s = _strike_slice(cube.strikes, strike_range)
+        cells = cube.values[s, e, cube.greeks.index(greek)]
+        out = self._buffer(greek if side is None else f"{greek}_{side}", cells.shape[0], cells.shape[1])
+        if side is None:
+            np.add(cells[..., 0], cells[..., 1], out=out)
+        else:
+            np.copyto(out, cells[..., exposure_cube.SIDES.index(side)])
+        return Heatmap(cube.strikes[s], cube.expirations[e], out)
+
+    def exposures(self, cube, greeks=None, today=None, bucket=None, strike_range=None):
+        """Heatmap of each exposure (all of the cube's by default), keyed by greek."""
+        return {greek: self.exposure(cube, greek, today, bucket, strike_range) for greek in (greeks or cube.greeks)}
+
+    def pivot(self, df, columns, today=None, bucket=None, strike_range=None, strike="strikePrice",
+              days="expirationDays"):
+        """
+        Heatmaps of frame columns (e.g. call vol / put oi) summed per (strike, expiration),
+        keyed by column and sharing their axes. Rows are filtered to the bucket / strike range.
+        """
+        today = today or datetime.now().date()
+        day_offsets = df[days].to_numpy(dtype=np.int64)
+        strike_values = df[strike].to_numpy(dtype=np.float64)
+        keep = day_offsets >= 0 if bucket is None else expiration_buckets.bucket_mask(day_offsets, bucket, today)
+        if strike_range is not None:
+            keep &= (strike_values >= strike_range[0]) & (strike_values <= strike_range[1])
+        strikes, s = np.unique(strike_values[keep], return_inverse=True)
+        offsets, e = np.unique(day_offsets[keep], return_inverse=True)
+        maps = {}
+        for column in columns:
+            out = self._buffer(column, len(strikes), len(offsets))
+            out.fill(0)
+            np.add.at(out, (s, e), np.nan_to_num(df[column].to_numpy(dtype=np.float64)[keep]))
+            maps[column] = Heatmap(strikes, today.toordinal() + offsets, out)
+        return maps
+
+# ---------------------------- Surface Series ---------------------------- #
+
+class SurfaceSeries:
+    """
+    The last `capacity` cycles of one exposure's strike x expiration matrix on a shared grid:
+    frames[slot] holds the cycle of timestamps[slot], the oldest slot at `head`. The frames are
+    memory-mapped to a .npy (the axes, timestamps and ring position in a small .npz next to
+    it), so a cycle writes its own slot only. The axes grow when a cycle brings strikes or
+    expirations not seen yet (earlier frames read 0 there; the frames file is rewritten then).
+    """
+
+    def __init__(self, capacity=SURFACE_CAPACITY, strikes=(), expirations=(), frames=None, timestamps=None,
+                 head=0, size=0, path=None):
+        self.capacity = capacity
+        self.strikes = np.asarray(strikes, dtype=np.float64)
+        self.expirations = np.asarray(expirations, dtype=np.int64)
+        self.path = path
+        self.frames = frames if frames is not None else self._allocate((capacity, 0, 0), path)
+        self.timestamps = timestamps if timestamps is not None else np.full(capacity, "", dtype="U19")
+        self.head = head
+        self.size = size
+
+    @staticmethod
+    def _allocate(shape, path):
+        """Zeroed frames, memory-mapped to their file when there is one."""
+        if path is None:
+            return np.zeros(shape, dtype=np.float32)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        return np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape)
+
+    def _grow(self, strikes, expirations):
+        """Extend the axes with values not seen yet (existing cells keep their data)."""
+        new_strikes = np.union1d(self.strikes, strikes)
+        new_expirations = np.union1d(self.expirations, expirations)
+        if len(new_strikes) == len(self.strikes) and len(new_expirations) == len(self.expirations):
+            return
+        s = np.searchsorted(new_strikes, self.strikes)
+        e = np.searchsorted(new_expirations, self.expirations)
+        frames = np.array(self.frames)
+        self.frames = None  # release the old mapping before the file is rewritten
+        self.frames = self._allocate((self.capacity, len(new_strikes), len(new_expirations)), self.path)
+        self.frames[:, s[:, None], e] = frames
+        self.strikes, self.expirations = new_strikes, new_expirations
+
+    def push(self, timestamp, heatmap):
+        """
+        Add one cycle's heatmap, replacing the oldest cycle once the series is full (a cycle
+        recorded again replaces its own frame).
+        """
+        self._grow(heatmap.strikes, heatmap.expirations)
+        slot = (self.head + self.size) % self.capacity
+        last = (self.head + self.size - 1) % self.capacity
+        if self.size and self.timestamps[last] == timestamp:
+            slot = last
+        elif self.size == self.capacity:
+            self.head = (self.head + 1) % self.capacity
+        else:
+            self.size += 1
+        frame = self.frames[slot]
+        frame.fill(0)
+        s = np.searchsorted(self.strikes, heatmap.strikes)
+        e = np.searchsorted(self.expirations, heatmap.expirations)
+        frame[s[:, None], e] = heatmap.values
+        self.timestamps[slot] = timestamp
+
+    def _slots(self):
+        """Slots in time order."""
+        return (self.head + np.arange(self.size)) % self.capacity
+
+    def surfaces(self):
+        """(timestamps, frames[time, strike, expiration]) in time order."""
+        slots = self._slots()
+        return pd.to_datetime(self.timestamps[slots]), self.frames[slots]
+
+    def strike_time(self, today=None, bucket=None, strike_range=None):
+        """
+        Heatmap of the exposure per strike over time (summed over a bucket's expirations):
+        (timestamps, strikes, values[strike, time]).
+        """
+        today = today or datetime.now().date()
+        days = self.expirations - today.toordinal()
+        mask = days >= 0 if bucket is None else expiration_buckets.bucket_mask(days, bucket, today)
+        s = _strike_slice(self.strikes, strike_range)
+        timestamps, frames = self.surfaces()
+        return timestamps, self.strikes[s], frames[:, s][:, :, mask].sum(axis=2).T
+
+    # ---------------------------- Persistence ---------------------------- #
+
+    def save(self, axes_path):
+        """Flush the frames and write the axes, timestamps and ring position next to them."""
+        if isinstance(self.frames, np.memmap):
+            self.frames.flush()
+        Path(axes_path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(axes_path, strikes=self.strikes, expirations=self.expirations, timestamps=self.timestamps,
+                 position=np.array([self.head, self.size]))
+
+    @classmethod
+    def open(cls, model, greek, day=None, mode="r"):
+        """
+        A model's surface series of a day memory-mapped from its files (mode "r" to read, "r+"
+        to update), or None if it was not created.
+        """
+        frames_path, axes_path = surface_paths(model, greek, day or datetime.now().date())
+        if not (frames_path.exists() and axes_path.exists()):
+            return None
+        with np.load(axes_path) as axes:
+            if "position" not in axes:
+                return None
+            frames = np.load(frames_path, mmap_mode=mode)
+            head, size = (int(value) for value in axes["position"])
+            return cls(frames.shape[0], axes["strikes"], axes["expirations"], frames, axes["timestamps"].copy(),
+                       head, size, frames_path)
+
+
+def record_surface(cube, model, timestamp, today=None, bucket=None, spot=None, greeks=SURFACE_GREEKS,
+                   engine=None):
+    """
+    Add a cycle's heatmap of each exposure in greeks (bucket expirations, strikes within the
+    configured range of spot) to the model's surface series of the day. Returns the series.
+    """
+    today = today or datetime.now().date()
+    engine = engine or HeatmapEngine()
+    strike_range = None
+    if spot is not None:
+        width = load_strike_range()
+        strike_range = (spot - width, spot + width)
+    series = {}
+    for greek in greeks:
+        frames_path, axes_path = surface_paths(model, greek, today)
+        series[greek] = SurfaceSeries.open(model, greek, today, "r+") or SurfaceSeries(path=frames_path)
+        series[greek].push(timestamp, engine.exposure(cube, greek, today, bucket, strike_range))
+        series[greek].save(axes_path)
+    return series
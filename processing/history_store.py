@@ -0,0 +1,624 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+
+from processing import expiration_buckets, market_context, schema
+
+# ---------------------------- History Store ---------------------------- #
+# Append-only intraday history in one SQLite file per day (outputs/historical/YYYYMMDD).
+# Within a day, rows are clustered by (index, model, bucket, variant, timestamp): the
+# primary key of a WITHOUT ROWID table. So appending a cycle only writes that cycle's rows,
+# and a time-range query for one table is an index range scan. WAL mode lets the GUI read
+# while the pipeline appends.
+#
+# Besides the ranked levels and gamma flips, every cycle's chain, per-contract model
+# outputs (IV, greeks, exposures), vol/oi pivot and Greek totals are stored as typed
+# snapshot tables, so the GUI queries the latest cycle instead of parsing stage CSVs.
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+HISTORY_DIR = PROJECT_ROOT / "outputs" / "historical"
+STORE_NAME = "history.sqlite"
+
+# Ranked-table columns (as written to step_three) -> store columns
+RANKING_COLUMNS = {
+    "timestamp": "timestamp",
+    "Rank": "rank",
+    "Greek": "greek",
+    "strikePrice": "strike",
+    "Theo ES": "theo_es",
+    "Value": "value",
+    "Gamma Flip (cum)": "gamma_flip_cum",
+    "Gamma Flip (vec)": "gamma_flip_vec",
+}
+PARTITION_COLUMNS = ["index_symbol", "model", "bucket", "variant"]
+# Greek totals (step_three/ratio layout) -> store columns
+GREEK_TOTAL_COLUMNS = {
+    "timestamp": "timestamp",
+    "Greek": "greek",
+    "Call": "call",
+    "Put": "put",
+    "Ratio": "ratio",
+}
+# vol/oi pivot (outputs/vol_oi layout) -> store columns
+VOL_OI_COLUMNS = {
+    "strike": "strike",
+    "call vol": "call_vol",
+    "call oi": "call_oi",
+    "put vol": "put_vol",
+    "put oi": "put_oi",
+    "spotPrice": "spot",
+    "call premium": "call_premium",
+    "put premium": "put_premium",
+    "call mark": "call_mark",
+    "put mark": "put_mark",
+}
+
+# Contract-level snapshots. The buckets are nested expiration ranges, so these are stored
+# once per cycle (not per bucket) and a bucket is an expirationDays range, served by an
+# index. Rows are keyed by the contract's option symbol, shared by the chain and contracts
+# tables: the chain can list two contracts with the same expiration, strike and side (SPX
+# and SPXW roots), which only the symbol tells apart.
+CONTRACT_KEY = ["symbol"]
+CONTRACT_SORT = "expirationDays, strikePrice, putCall, symbol"
+# The quotes of the chain the IV stage solved (model independent): only the raw inputs of a
+# recompute are kept per contract. mid is (bid + ask) / 2 again on read, and the columns every
+# contract of an expiration shares (T, spot, rates) are kept once per expiration in
+# chain_expirations (T is computed per row when the chain is fetched, so the rows of an
+# expiration differ by microseconds; the first row's is kept).
+CHAIN_COLUMNS = {"symbol": "object", **{col: schema.CHAIN[col] for col in [
+    "expirationDays", "strikePrice", "putCall", "last", "mark", "bid", "ask", "openInterest", "totalVolume"]}}
+EXPIRATION_COLUMNS = {col: schema.CHAIN[col] for col in ["expirationDays", "T", "spotPrice", "SOFR", "dividend_yield"]}
+# Per-bucket columns of the step_two tables, stored with the bucket reductions instead
+BUCKET_COLUMNS = ["cum_gam", "cum_vec", "clean", "clean_cum_gam", "clean_cum_vec"]
+# Each model's outputs per contract (master rows); the quote columns stay in chain. Recorded
+# for the expirations up to CONTRACT_BUCKET only, which bounds the store size (an EoM chain
+# for three models would add ~25 MB per cycle); any cycle can be recomputed from its chain.
+CONTRACT_BUCKET = "0DTE"
+CONTRACT_COLUMNS = {
+    "symbol": "object",
+    **{col: schema.CHAIN[col] for col in ["expirationDays", "strikePrice", "putCall"]},
+    **{col: dtype for col, dtype in schema.EXPOSURES.items()
+       if col not in schema.CHAIN and col not in BUCKET_COLUMNS and col != "model"},
+}
+# Unusual activity events (processing/oi_vol/activity_detector.py), one row per contract per cycle
+ACTIVITY_KEY = ["expirationDays", "strikePrice", "putCall"]
+ACTIVITY_COLUMNS = {
+    **{col: schema.CHAIN[col] for col in ACTIVITY_KEY},
+    "volume": "float64",
+    "rate": "float64",
+    "baseline": "float64",
+    "zscore": "float64",
+    "vol_oi": "float64",
+    "premium": "float64",
+    "mark": "float64",
+    "score": "float64",
+    "reasons": "object",
+}
+
+
+def sql_type(dtype):
+    """Store column type for a pipeline dtype (categoricals are stored as their labels)."""
+    if isinstance(dtype, pd.CategoricalDtype) or dtype == "category":
+        return "TEXT"
+    return {"f": "REAL", "i": "INTEGER", "u": "INTEGER", "b": "INTEGER"}.get(np.dtype(dtype).kind, "TEXT")
+
+
+def typed_table(table, partition, columns, key):
+    """CREATE TABLE statement for a snapshot table: partition + timestamp + key as the primary key."""
+    definitions = [f"{col} TEXT NOT NULL" for col in partition + ["timestamp"]]
+    definitions += [f"{col} {sql_type(dtype)}{' NOT NULL' if col in key else ''}" for col, dtype in columns.items()]
+    primary_key = ", ".join(partition + ["timestamp"] + key)
+    return (f"CREATE TABLE IF NOT EXISTS {table} (\n    " + ",\n    ".join(definitions)
+            + f",\n    PRIMARY KEY ({primary_key})\n) WITHOUT ROWID")
+
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS rankings (
+        index_symbol TEXT NOT NULL,
+        model TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        rank TEXT NOT NULL,
+        greek TEXT NOT NULL,
+        strike REAL,
+        theo_es REAL,
+        value REAL,
+        gamma_flip_cum REAL,
+        gamma_flip_vec REAL,
+        PRIMARY KEY (index_symbol, model, bucket, variant, timestamp, rank)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS gamma_flips (
+        index_symbol TEXT NOT NULL,
+        model TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        spot REAL,
+        flip_cum REAL,
+        flip_vec REAL,
+        zero_gamma REAL,
+        theo_cum REAL,
+        theo_vec REAL,
+        valid_cum INTEGER,
+        valid_vec INTEGER,
+        PRIMARY KEY (index_symbol, model, bucket, variant, timestamp)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS greek_totals (
+        index_symbol TEXT NOT NULL,
+        model TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        variant TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        greek TEXT NOT NULL,
+        call REAL,
+        put REAL,
+        ratio REAL,
+        PRIMARY KEY (index_symbol, model, bucket, variant, timestamp, greek)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS vol_oi (
+        index_symbol TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        expirationDays INTEGER NOT NULL,
+        strike REAL NOT NULL,
+        call_vol REAL,
+        call_oi REAL,
+        put_vol REAL,
+        put_oi REAL,
+        spot REAL,
+        call_premium REAL,
+        put_premium REAL,
+        call_mark REAL,
+        put_mark REAL,
+        PRIMARY KEY (index_symbol, timestamp, expirationDays, strike)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS market_context (
+        index_symbol TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        spot REAL,
+        etf_symbol TEXT,
+        etf_price REAL,
+        futures_symbol TEXT,
+        futures_price REAL,
+        etf_basis_pct REAL,
+        futures_basis_pct REAL,
+        sofr REAL,
+        dividend_yield REAL,
+        PRIMARY KEY (index_symbol, timestamp)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS recomputed (
+        index_symbol TEXT NOT NULL,
+        model TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        finished TEXT NOT NULL,
+        PRIMARY KEY (index_symbol, model, timestamp)
+    ) WITHOUT ROWID
+    """,
+    typed_table("chain", ["index_symbol"], CHAIN_COLUMNS, CONTRACT_KEY),
+    typed_table("chain_expirations", ["index_symbol"], EXPIRATION_COLUMNS, ["expirationDays"]),
+    "CREATE INDEX IF NOT EXISTS chain_expiration ON chain (index_symbol, timestamp, expirationDays)",
+    typed_table("contracts", ["index_symbol", "model"], CONTRACT_COLUMNS, CONTRACT_KEY),
+    "CREATE INDEX IF NOT EXISTS contracts_expiration ON contracts (index_symbol, model, timestamp, expirationDays)",
+    typed_table("activity", ["index_symbol"], ACTIVITY_COLUMNS, ACTIVITY_KEY),
+]
+
+
+def cycle_timestamp(context=None):
+    """
+    Timestamp shared by every row a cycle records: the quote time of the cycle's market
+    context when there is one (so every stage of the cycle uses the same key), else now
+    (the quote stage removes the previous context before fetching, so a cycle whose quotes
+    failed never writes over the rows of an earlier cycle).
+    """
+    if context is not None:
+        return datetime.fromisoformat(context.timestamp).strftime("%Y-%m-%d %H:%M:%S")
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def store_path(day=None, root=HISTORY_DIR):
+    """Path of the store for one day (a date, or today)."""
+    day = day or datetime.now().date()
+    return Path(root) / day.strftime("%Y%m%d") / STORE_NAME
+
+
+def connect(day=None, root=HISTORY_DIR):
+    """Open (creating if needed) the store for one day."""
+    path = store_path(day, root)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    for statement in SCHEMA:
+        conn.execute(statement)
+    return conn
+
+
+def insert_rows(conn, table, frame, replace=None):
+    """
+    Insert a frame whose columns are store columns. With replace (column -> value, e.g. the
+    partition and timestamp of one cycle), the rows matching it are deleted in the same
+    transaction first, so a cycle written again keeps none of the rows of its earlier run.
+    """
+    columns = list(frame.columns)
+    statement = (f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join('?' for _ in columns)})")
+    rows = frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None)
+    with conn:
+        if replace:
+            conn.execute(f"DELETE FROM {table} WHERE {' AND '.join(f'{col} = ?' for col in replace)}",
+                         list(replace.values()))
+        conn.executemany(statement, rows)
+    return len(frame)
+
+
+def select_rows(conn, table, columns, filters, start=None, end=None, order_by="timestamp", clauses=()):
+    """
+    Rows of a table matching equality filters (None values are ignored), an optional
+    [start, end] timestamp range and extra (sql, params) clauses, as a DataFrame.
+    """
+    where_clauses, params = [], []
+    for column, value in filters.items():
+        if value is not None:
+            where_clauses.append(f"{column} = ?")
+            params.append(value)
+    if start is not None:
+        where_clauses.append("timestamp >= ?")
+        params.append(str(start))
+    if end is not None:
+        where_clauses.append("timestamp <= ?")
+        params.append(str(end))
+    for clause, clause_params in clauses:
+        where_clauses.append(clause)
+        params.extend(clause_params)
+    where = f" WHERE {' AND '.join(where_clauses)}" if where_clauses else ""
+    query = f"SELECT {', '.join(columns)} FROM {table}{where} ORDER BY {order_by}"
+    return pd.read_sql_query(query, conn, params=params)
+
+
+def latest_timestamp(conn, table, filters):
+    """Most recent cycle timestamp of a table matching equality filters, or None."""
+    clauses = [(f"{column} = ?", value) for column, value in filters.items() if value is not None]
+    where = f" WHERE {' AND '.join(clause for clause, _ in clauses)}" if clauses else ""
+    row = conn.execute(f"SELECT MAX(timestamp) FROM {table}{where}", [value for _, value in clauses]).fetchone()
+    return row[0]
+
+
+def bucket_clause(bucket, day=None):
+    """(sql, params) restricting expirationDays to an expiration bucket of the store's day."""
+    limit = expiration_buckets.bucket_day_limits(day or datetime.now().date())[bucket]
+    return "expirationDays BETWEEN 0 AND ?", [limit]
+
+
+def latest_cycle(day=None, index="SPX", table="rankings", root=HISTORY_DIR):
+    """Timestamp of the last cycle recorded in a table of the day's store (None before the first)."""
+    if not store_path(day, root).exists():
+        return None
+    conn = connect(day, root)
+    try:
+        return latest_timestamp(conn, table, {"index_symbol": index})
+    finally:
+        conn.close()
+
+
+def _append(table, frame, partition, day, root, replace=False):
+    """
+    Insert a frame of store columns with the partition values (column -> value) in front.
+    With replace, the partition's earlier rows are deleted first (see insert_rows).
+    """
+    frame = frame.copy()
+    for column, value in reversed(list(partition.items())):
+        frame.insert(0, column, value)
+    conn = connect(day, root)
+    try:
+        return insert_rows(conn, table, frame, partition if replace else None)
+    finally:
+        conn.close()
+
+
+def contract_symbols(df):
+    """
+    Option symbol of each contract row. Frames without a symbol column (older chains) get
+    expirationDays|strike|side, which cannot tell an SPX contract from the SPXW one.
+    """
+    if "symbol" in df.columns:
+        return df["symbol"].astype(str)
+    side = df["putCall"].astype(str).str[0]
+    return df["expirationDays"].astype(str) + "|" + df["strikePrice"].map("{:g}".format) + "|" + side
+
+
+def _snapshot(table, columns, filters, day, root, cycle="latest", start=None, end=None, bucket=None,
+              order_by="timestamp"):
+    """
+    Rows of a snapshot table for one cycle (a timestamp, or "latest") or a [start, end] range,
+    optionally restricted to an expiration bucket. None when the day has no store.
+    """
+    if not store_path(day, root).exists():
+        return None
+    conn = connect(day, root)
+    try:
+        if cycle == "latest":
+            cycle = latest_timestamp(conn, table, filters)
+            if cycle is None:
+                return None
+        clauses = [bucket_clause(bucket, day)] if bucket is not None else []
+        filters = {**filters, "timestamp": cycle}
+        return select_rows(conn, table, columns, filters, start, end, order_by, clauses)
+    finally:
+        conn.close()
+
+# ---------------------------- Rankings ---------------------------- #
+
+def append_rankings(ranked, index, model, bucket, variant, day=None, root=HISTORY_DIR):
+    """Append one cycle's ranked table (step_three layout) to the day's history. Returns the row count."""
+    frame = ranked[[col for col in RANKING_COLUMNS if col in ranked.columns]].rename(columns=RANKING_COLUMNS)
+    frame["timestamp"] = frame["timestamp"].astype(str)
+    for column, value in zip(PARTITION_COLUMNS, (index, model, bucket, variant)):
+        frame.insert(0, column, value)
+    conn = connect(day, root)
+    try:
+        return insert_rows(conn, "rankings", frame)
+    finally:
+        conn.close()
+
+
+def rankings(day=None, index="SPX", model=None, bucket=None, variant=None, start=None, end=None, root=HISTORY_DIR):
+    """
+    Ranked levels recorded on one day, optionally for one model / bucket / variant and a
+    timestamp range, with the step_three column names (plus the partition columns).
+    """
+    if not store_path(day, root).exists():
+        return pd.DataFrame(columns=PARTITION_COLUMNS + list(RANKING_COLUMNS))
+    conn = connect(day, root)
+    try:
+        filters = dict(zip(PARTITION_COLUMNS, (index, model, bucket, variant)))
+        columns = PARTITION_COLUMNS + list(RANKING_COLUMNS.values())
+        df = select_rows(conn, "rankings", columns, filters, start, end,
+                         order_by="timestamp, strike, greek, rank")
+    finally:
+        conn.close()
+    return df.rename(columns={store: table for table, store in RANKING_COLUMNS.items()})
+
+def latest_rankings(day=None, index="SPX", model="hybrid_one", bucket="0DTE", variant="results", root=HISTORY_DIR):
+    """The ranked levels of the last recorded cycle of one table, with the step_three column names (or None)."""
+    filters = dict(zip(PARTITION_COLUMNS, (index, model, bucket, variant)))
+    df = _snapshot("rankings", list(RANKING_COLUMNS.values()), filters, day, root, order_by="strike, greek, rank")
+    return None if df is None else df.rename(columns={store: table for table, store in RANKING_COLUMNS.items()})
+
+# ---------------------------- Cycle Snapshots ---------------------------- #
+
+def append_chain(chain, index, timestamp, day=None, root=HISTORY_DIR):
+    """
+    Record the chain the IV stage solved this cycle (schema "chain" frame), replacing the
+    cycle's earlier rows. Returns the row count.
+    """
+    partition = {"index_symbol": index, "timestamp": timestamp}
+    shared = [col for col in EXPIRATION_COLUMNS if col in chain.columns]
+    expirations = chain[shared].groupby("expirationDays", sort=True).first().reset_index()
+    _append("chain_expirations", expirations, partition, day, root, replace=True)
+    frame = chain.assign(symbol=contract_symbols(chain))
+    frame = frame[[col for col in CHAIN_COLUMNS if col in frame.columns]]
+    return _append("chain", frame, partition, day, root, replace=True)
+
+
+def append_contracts(df, index, model, timestamp, day=None, root=HISTORY_DIR):
+    """
+    Record one model's IVs, greeks and exposures per contract (exposures frame), replacing the
+    cycle's earlier rows. Returns the row count.
+    """
+    frame = df.assign(symbol=contract_symbols(df))
+    frame = frame[[col for col in CONTRACT_COLUMNS if col in frame.columns]]
+    partition = {"index_symbol": index, "model": model, "timestamp": timestamp}
+    return _append("contracts", frame, partition, day, root, replace=True)
+
+
+def append_greek_totals(totals, index, model, bucket, variant, day=None, root=HISTORY_DIR):
+    """Record a bucket's Greek totals (step_three/ratio layout, with timestamp). Returns the row count."""
+    frame = totals[list(GREEK_TOTAL_COLUMNS)].rename(columns=GREEK_TOTAL_COLUMNS)
+    frame["timestamp"] = frame["timestamp"].astype(str)
+    partition = dict(zip(PARTITION_COLUMNS, (index, model, bucket, variant)))
+    return _append("greek_totals", frame, partition, day, root)
+
+
+def append_vol_oi(vol_oi, index, timestamp, day=None, root=HISTORY_DIR):
+    """Record the vol/oi pivot and traded premium per (expirationDays, strike) (outputs/vol_oi layout). Returns the row count."""
+    frame = vol_oi[["expirationDays"] + list(VOL_OI_COLUMNS)].rename(columns=VOL_OI_COLUMNS)
+    return _append("vol_oi", frame, {"index_symbol": index, "timestamp": timestamp}, day, root, replace=True)
+
+
+def append_context(context, index, timestamp, day=None, root=HISTORY_DIR):
+    """Record the cycle's market context (processing/market_context.py)."""
+    fields = {name: value for name, value in vars(context).items() if name not in ("index", "timestamp")}
+    return _append("market_context", pd.DataFrame([fields]), {"index_symbol": index, "timestamp": timestamp},
+                   day, root)
+
+
+def context(day=None, index="SPX", cycle="latest", root=HISTORY_DIR):
+    """The market context recorded for a cycle (default the latest), or None."""
+    df = _snapshot("market_context", ["*"], {"index_symbol": index}, day, root, cycle)
+    if df is None or df.empty:
+        return None
+    row = df.iloc[0]
+    fields = {name: row[name] for name in df.columns if name not in ("index_symbol", "timestamp")}
+    return market_context.MarketContext(index=index, timestamp=datetime.fromisoformat(row["timestamp"]).isoformat(),
+                                        **fields)
+
+
+def _typed(df, columns):
+    """Cast snapshot columns back to their pipeline dtypes."""
+    return df.astype({col: dtype for col, dtype in columns.items() if col in df.columns})
+
+
+def chain(day=None, index="SPX", cycle="latest", bucket=None, root=HISTORY_DIR):
+    """
+    The chain recorded for one cycle (default the latest), optionally one bucket, with every
+    schema "chain" column (mid and the per-expiration columns restored); None if absent.
+    """
+    columns = ["timestamp"] + list(CHAIN_COLUMNS)
+    df = _snapshot("chain", columns, {"index_symbol": index}, day, root, cycle, bucket=bucket,
+                   order_by=CONTRACT_SORT)
+    if df is None:
+        return None
+    cycle = df["timestamp"].iloc[0] if not df.empty else cycle
+    expirations = _snapshot("chain_expirations", list(EXPIRATION_COLUMNS), {"index_symbol": index}, day, root,
+                            cycle, order_by="expirationDays")
+    if expirations is not None:
+        df = df.merge(expirations, on="expirationDays", how="left")
+    df["mid"] = (df["bid"] + df["ask"]) / 2
+    df = df[["timestamp", "symbol"] + [col for col in schema.CHAIN if col in df.columns]]
+    return _typed(df, {"symbol": "object", **schema.CHAIN})
+
+
+def chain_cycles(day=None, index="SPX", start=None, end=None, root=HISTORY_DIR):
+    """Timestamps of the chain snapshots recorded on a day, in order."""
+    if not store_path(day, root).exists():
+        return []
+    conn = connect(day, root)
+    try:
+        df = select_rows(conn, "chain", ["DISTINCT timestamp"], {"index_symbol": index}, start, end)
+    finally:
+        conn.close()
+    return df["timestamp"].tolist()
+
+
+def contracts(day=None, index="SPX", model="hybrid_one", cycle="latest", bucket=None, root=HISTORY_DIR):
+    """
+    One model's per-contract IVs, greeks and exposures for a cycle (expirations up to
+    CONTRACT_BUCKET), optionally one bucket; None if absent.
+    """
+    columns = ["timestamp"] + list(CONTRACT_COLUMNS)
+    df = _snapshot("contracts", columns, {"index_symbol": index, "model": model}, day, root, cycle,
+                   bucket=bucket, order_by=CONTRACT_SORT)
+    return None if df is None else _typed(df, CONTRACT_COLUMNS)
+
+
+def greek_totals(day=None, index="SPX", model="hybrid_one", bucket="0DTE", variant="results", cycle="latest",
+                 start=None, end=None, root=HISTORY_DIR):
+    """
+    A bucket's Greek totals for a cycle (default the latest; None for every cycle in
+    [start, end]), with the step_three/ratio column names. None if absent.
+    """
+    filters = dict(zip(PARTITION_COLUMNS, (index, model, bucket, variant)))
+    df = _snapshot("greek_totals", list(GREEK_TOTAL_COLUMNS.values()), filters, day, root, cycle, start, end)
+    if df is None:
+        return None
+    df = df.rename(columns={store: col for col, store in GREEK_TOTAL_COLUMNS.items()})
+    # Greeks in the pipeline's exposure order (DEX, GEX, VEX, CEX, then the higher-order ones)
+    order = {greek: position for position, greek in enumerate(schema.EXPOSURE_COLUMNS)}
+    return df.sort_values(["timestamp", "Greek"], key=lambda col: col.map(order) if col.name == "Greek" else col,
+                          kind="stable", ignore_index=True)
+
+
+def vol_oi(day=None, index="SPX", bucket="0DTE", cycle="latest", by_expiration=False, root=HISTORY_DIR):
+    """
+    vol/oi and traded premium of a bucket for a cycle, summed per strike (or per expiration and
+    strike; marks are averaged) with the vol/oi ratios, in the outputs/vol_oi column names.
+    None if absent.
+    """
+    columns = ["timestamp", "expirationDays"] + list(VOL_OI_COLUMNS.values())
+    df = _snapshot("vol_oi", columns, {"index_symbol": index}, day, root, cycle, bucket=bucket,
+                   order_by="expirationDays, strike")
+    if df is None:
+        return None
+    df = df.rename(columns={store: col for col, store in VOL_OI_COLUMNS.items()})
+    if not by_expiration:
+        sums = ["call vol", "call oi", "put vol", "put oi", "call premium", "put premium"]
+        df = df.groupby("strike", as_index=False).agg({"timestamp": "first", "spotPrice": "first",
+                                                       **{col: "sum" for col in sums},
+                                                       "call mark": "mean", "put mark": "mean"})
+    df["call_vol/oi"] = df["call vol"] / df["call oi"].where(df["call oi"] != 0)
+    df["put_vol/oi"] = df["put vol"] / df["put oi"].where(df["put oi"] != 0)
+    return df
+
+
+def premium_blocks(day=None, index="SPX", bucket="0DTE", cycle="latest", n=50, root=HISTORY_DIR):
+    """
+    The n contracts (strike, expiration, side) of a bucket with the most premium traded on the
+    day up to a cycle, with their day volume, open interest and mark. None if absent.
+    """
+    df = vol_oi(day, index, bucket, cycle, by_expiration=True, root=root)
+    if df is None:
+        return None
+    sides = []
+    for side, label in (("call", "CALL"), ("put", "PUT")):
+        rows = df[["timestamp", "expirationDays", "strike", f"{side} vol", f"{side} oi", f"{side} mark",
+                   f"{side} premium"]]
+        rows = rows.set_axis(["timestamp", "expirationDays", "strike", "volume", "oi", "mark", "premium"], axis=1)
+        sides.append(rows.assign(putCall=label))
+    blocks = pd.concat(sides, ignore_index=True)
+    blocks = blocks[blocks["premium"] > 0].nlargest(n, "premium").reset_index(drop=True)
+    return blocks[["timestamp", "expirationDays", "strike", "putCall", "volume", "oi", "mark", "premium"]]
+
+
+def append_activity(events, index, day=None, root=HISTORY_DIR):
+    """Record a cycle's unusual activity events (activity_detector layout). Returns the row count."""
+    frame = events[["timestamp"] + list(ACTIVITY_COLUMNS)]
+    return _append("activity", frame, {"index_symbol": index}, day, root)
+
+
+def activity(day=None, index="SPX", bucket=None, start=None, end=None, min_score=None, root=HISTORY_DIR):
+    """
+    The unusual activity events recorded on a day (every cycle in [start, end]), optionally one
+    bucket and a minimum score, latest cycle first and highest score first within it. None if absent.
+    """
+    columns = ["timestamp"] + list(ACTIVITY_COLUMNS)
+    df = _snapshot("activity", columns, {"index_symbol": index}, day, root, None, start, end, bucket,
+                   order_by="timestamp DESC, score DESC")
+    if df is None:
+        return None
+    if min_score is not None:
+        df = df[df["score"] >= min_score].reset_index(drop=True)
+    return _typed(df, {col: dtype for col, dtype in ACTIVITY_COLUMNS.items() if col in ACTIVITY_KEY})
+
+# ---------------------------- Recompute Bookkeeping ---------------------------- #
+# Tables a model's per-bucket cycle outputs live in (cleared before a recompute rewrites them)
+BUCKET_TABLES = ["greek_totals", "rankings", "gamma_flips"]
+
+
+def clear_cycle(index, model, timestamp, buckets, day=None, root=HISTORY_DIR):
+    """
+    Delete one model's outputs of one cycle (contracts, and the tables of the given buckets),
+    so a recompute leaves no rows of the old run behind.
+    """
+    conn = connect(day, root)
+    try:
+        with conn:
+            key = (index, model, timestamp)
+            conn.execute("DELETE FROM contracts WHERE index_symbol = ? AND model = ? AND timestamp = ?", key)
+            placeholders = ", ".join("?" for _ in buckets)
+            for table in BUCKET_TABLES:
+                conn.execute(f"DELETE FROM {table} WHERE index_symbol = ? AND model = ? AND timestamp = ? "
+                             f"AND bucket IN ({placeholders})", (*key, *buckets))
+    finally:
+        conn.close()
+
+
+def mark_recomputed(index, models, timestamp, day=None, root=HISTORY_DIR):
+    """Record that a cycle was recomputed for the models (what a resumed backfill skips)."""
+    finished = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    frame = pd.DataFrame({"model": list(models), "timestamp": timestamp, "finished": finished})
+    return _append("recomputed", frame, {"index_symbol": index}, day, root)
+
+
+def recomputed_cycles(day=None, index="SPX", model=None, root=HISTORY_DIR):
+    """Timestamps already recomputed for a model on a day."""
+    if not store_path(day, root).exists():
+        return set()
+    conn = connect(day, root)
+    try:
+        df = select_rows(conn, "recomputed", ["timestamp"], {"index_symbol": index, "model": model})
+    finally:
+        conn.close()
+    return set(df["timestamp"])
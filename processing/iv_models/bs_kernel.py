@@ -0,0 +1,252 @@
+import numpy as np
+from scipy.stats import norm
+
+# ---------------------------- Vectorized Black-Scholes Kernel ---------------------------- #
+# Array versions of the per-row functions of the brent_bs, grok and hybrid_one models (still
+# used by the ndx_* scripts: ndx_brent_bs.py, ndx_grok.py and ndx_hybrid_one.py).
+# Every function takes NumPy arrays of equal length (S, K, T, r, sigma, is_call) so a
+# whole chain can be priced/solved in one call instead of one Python call per row.
+
+# Higher-order sensitivities share the same d1/d2/pdf intermediates as the first-order greeks
+HIGHER_ORDER_GREEKS = ["vomma", "speed", "zomma", "color", "veta"]
+GREEK_COLUMNS = ["delta", "gamma", "vega", "theta", "rho", "vanna", "charm"] + HIGHER_ORDER_GREEKS
+
+
+def shared_terms(S, K, T, r):
+    """
+    Terms that depend only on the contract and not on sigma. They are computed once per
+    chain and reused by every model and every solver iteration.
+    """
+    S = np.asarray(S, dtype=float)
+    K = np.asarray(K, dtype=float)
+    T = np.asarray(T, dtype=float)
+    r = np.asarray(r, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_sk = np.log(S / K)
+        sqrt_t = np.sqrt(T)
+        discount = np.exp(-r * T)
+    return {
+        "S": S,
+        "K": K,
+        "T": T,
+        "r": r,
+        "log_sk": log_sk,
+        "sqrt_t": sqrt_t,
+        "discount": discount,
+    }
+
+
+def intrinsic_value(terms, is_call):
+    """Intrinsic value of each contract (max(S-K, 0) for calls, max(K-S, 0) for puts)."""
+    return np.where(is_call, np.maximum(terms["S"] - terms["K"], 0.0),
+                    np.maximum(terms["K"] - terms["S"], 0.0))
+
+
+def _subset(terms, idx):
+    """Restrict the shared terms to the rows in idx (used inside solver loops)."""
+    if idx is None:
+        return terms
+    return {key: value[idx] for key, value in terms.items()}
+
+
+def d1_d2(terms, sigma):
+    """Calculate d1 and d2 for every row."""
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        sig_sqrt_t = sigma * terms["sqrt_t"]
+        d1 = (terms["log_sk"] + (terms["r"] + 0.5 * sigma ** 2) * terms["T"]) / sig_sqrt_t
+        d2 = d1 - sig_sqrt_t
+    return d1, d2
+
+
+def bs_price(terms, sigma, is_call):
+    """Black-Scholes price for every row."""
+    d1, d2 = d1_d2(terms, sigma)
+    S, K, disc = terms["S"], terms["K"], terms["discount"]
+    call = S * norm.cdf(d1) - K * disc * norm.cdf(d2)
+    put = K * disc * norm.cdf(-d2) - S * norm.cdf(-d1)
+    return np.where(is_call, call, put)
+
+
+def bs_vega(terms, sigma):
+    """Black-Scholes vega (per 1.00 of volatility) for every row."""
+    d1, _ = d1_d2(terms, sigma)
+    return terms["S"] * norm.pdf(d1) * terms["sqrt_t"]
+
+
+# ---------------------------- Implied Volatility Solvers ---------------------------- #
+
+def solve_iv_bracketed(price, terms, is_call, lower, upper, xtol=1e-5, max_iter=100):
+    """
+    Safeguarded Newton/bisection root find of BS(sigma) = price inside [lower, upper].
+
+    Mirrors scipy's brentq semantics used by the scalar models: rows whose bracket does
+    not contain a sign change fail. The BS price is monotonic in sigma so the root found
+    is the same one brentq returns.
+
+    Returns (sigma, iterations, converged); sigma is NaN where the solve failed.
+    """
+    price = np.asarray(price, dtype=float)
+    n = price.shape[0]
+    lo = np.broadcast_to(np.asarray(lower, dtype=float), (n,)).copy()
+    hi = np.broadcast_to(np.asarray(upper, dtype=float), (n,)).copy()
+
+    f_lo = bs_price(terms, lo, is_call) - price
+    f_hi = bs_price(terms, hi, is_call) - price
+    bracketed = np.isfinite(f_lo) & np.isfinite(f_hi) & (f_lo * f_hi <= 0)
+
+    sigma = np.where(bracketed, 0.5 * (lo + hi), np.nan)
+    sigma = np.where(bracketed & (f_lo == 0), lo, sigma)
+    sigma = np.where(bracketed & (f_hi == 0), hi, sigma)
+    iterations = np.zeros(n, dtype=np.int32)
+    converged = bracketed & ((f_lo == 0) | (f_hi == 0))
+    active = bracketed & ~converged
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        sub = _subset(terms, idx)
+        s = sigma[idx]
+        f = bs_price(sub, s, is_call[idx]) - price[idx]
+        v = bs_vega(sub, s)
+
+        # Shrink the bracket (price is increasing in sigma)
+        above = f > 0
+        hi[idx] = np.where(above, s, hi[idx])
+        lo[idx] = np.where(above, lo[idx], s)
+
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            newton = s - f / v
+        use_newton = np.isfinite(newton) & (newton > lo[idx]) & (newton < hi[idx])
+        s_new = np.where(use_newton, newton, 0.5 * (lo[idx] + hi[idx]))
+
+        sigma[idx] = s_new
+        iterations[idx] += 1
+        done = (np.abs(s_new - s) < xtol) | ((hi[idx] - lo[idx]) < xtol) | (f == 0)
+        converged[idx[done]] = True
+        active[idx[done]] = False
+
+    return sigma, iterations, converged
+
+
+def solve_iv_newton(price, terms, is_call, initial=0.5, tol=1e-6, max_iter=100):
+    """
+    Plain Newton iteration (scipy.optimize.newton semantics with an analytic fprime).
+
+    Rows fail (NaN) on a zero derivative, a non-finite or non-positive iterate, or when
+    max_iter is reached without the step dropping below tol.
+
+    Returns (sigma, iterations, converged).
+    """
+    price = np.asarray(price, dtype=float)
+    n = price.shape[0]
+    sigma = np.full(n, float(initial))
+    iterations = np.zeros(n, dtype=np.int32)
+    converged = np.zeros(n, dtype=bool)
+    active = np.isfinite(price)
+
+    for _ in range(max_iter):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+        sub = _subset(terms, idx)
+        s = sigma[idx]
+        f = bs_price(sub, s, is_call[idx]) - price[idx]
+        v = bs_vega(sub, s)
+        iterations[idx] += 1
+
+        exact = f == 0
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            s_new = np.where(exact, s, s - f / v)
+        failed = ~exact & (~np.isfinite(s_new) | (v == 0) | (s_new <= 0))
+        done = ~failed & (exact | (np.abs(s_new - s) < tol))
+
+        sigma[idx] = s_new
+        converged[idx[done]] = True
+        active[idx[done | failed]] = False
+
+    sigma[~converged] = np.nan
+    return sigma, iterations, converged
+
+
+def closed_form_iv(price, terms, is_call):
+    """Vectorized version of ndx_hybrid_one.closed_form_iv (Brenner-Subrahmanyam style estimate)."""
+    price = np.asarray(price, dtype=float)
+    intrinsic = intrinsic_value(terms, is_call)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        estimate = (price / terms["S"]) * np.sqrt(2 * np.pi / terms["T"])
+        moneyness = np.where(is_call, terms["log_sk"], -terms["log_sk"])
+        adjustment = (moneyness / estimate) + (terms["r"] * terms["sqrt_t"] / estimate)
+        iv = np.maximum(estimate * (1 + adjustment), 0.0)
+    return np.where(price <= intrinsic, 0.0, iv)
+
+
+# ---------------------------- Greeks ---------------------------- #
+
+def calculate_greeks(terms, sigma, is_call, convention="standard"):
+    """
+    Calculate delta, gamma, vega, theta, rho, vanna and charm, plus vomma, speed, zomma,
+    color and veta, from one set of d1/d2/pdf/cdf intermediates.
+
+    convention selects the vanna/charm formulas used by the original scalar models:
+      - "brent_bs": vanna = d2 * S * pdf(d1) / sigma, charm divided by sigma*sqrt(T),
+        plus the near-expiry (T < 1e-6) gamma/delta override.
+      - "standard" (grok, hybrid_one): vanna = d1 * gamma, charm without the sigma*sqrt(T) term.
+
+    The higher-order greeks are the same for both conventions (no dividend yield, per year /
+    per 1.00 of volatility like vega): vomma = dVega/dsigma, speed = dGamma/dS,
+    zomma = dGamma/dsigma, color = dGamma/dt and veta = dVega/dt.
+
+    Rows with sigma <= 0 or T <= 0 return NaN.
+    """
+    S, K, T, r = terms["S"], terms["K"], terms["T"], terms["r"]
+    sqrt_t, disc = terms["sqrt_t"], terms["discount"]
+    valid = (sigma > 0) & (T > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d1, d2 = d1_d2(terms, sigma)
+        pdf_d1 = norm.pdf(d1)
+        cdf_d1 = norm.cdf(d1)
+        cdf_d2 = norm.cdf(d2)
+        cdf_md2 = norm.cdf(-d2)
+        sig_sqrt_t = sigma * sqrt_t
+
+        delta = np.where(is_call, cdf_d1, cdf_d1 - 1)
+        gamma = pdf_d1 / (S * sig_sqrt_t)
+        vega = S * pdf_d1 * sqrt_t
+        decay = (-S * pdf_d1 * sigma) / (2 * sqrt_t)
+        theta = np.where(is_call, decay - r * K * disc * cdf_d2, decay + r * K * disc * cdf_md2)
+        rho = np.where(is_call, K * T * disc * cdf_d2, -K * T * disc * cdf_md2)
+
+        if convention == "brent_bs":
+            near_expiry = T < 1e-6
+            gamma = np.where(near_expiry, 1e-5, gamma)
+            delta = np.where(near_expiry, np.where(S > K, 1.0, np.where(is_call, 0.0, -1.0)), delta)
+            vanna = d2 * S * pdf_d1 / sigma
+            charm = -pdf_d1 * (2 * r * T - d2 * sig_sqrt_t) / (2 * T * sig_sqrt_t)
+        else:
+            vanna = d1 * gamma
+            charm = -pdf_d1 * ((2 * r * T - d2 * sig_sqrt_t) / (2 * T))
+
+        vomma = vega * d1 * d2 / sigma
+        speed = -(gamma / S) * (d1 / sig_sqrt_t + 1)
+        zomma = gamma * (d1 * d2 - 1) / sigma
+        # color and veta as time passes (sign opposite to d/dT)
+        color = (pdf_d1 / (2 * S * T * sig_sqrt_t)) * (1 + d1 * (2 * r * T - d2 * sig_sqrt_t) / sig_sqrt_t)
+        veta = S * pdf_d1 * sqrt_t * (r * d1 / sig_sqrt_t - (1 + d1 * d2) / (2 * T))
+
+    greeks = {
+        "delta": delta,
+        "gamma": gamma,
+        "vega": vega,
+        "theta": theta,
+        "rho": rho,
+        "vanna": vanna,
+        "charm": charm,
+        "vomma": vomma,
+        "speed": speed,
+        "zomma": zomma,
+        "color": color,
+        "veta": veta,
+    }
+    return {name: np.where(valid, values, np.nan) for name, values in greeks.items()}
@@ -0,0 +1,268 @@
+import time
+import numpy as np
+import pandas as pd
+
+from processing.iv_models import bs_kernel, smile_fit
+
+# ---------------------------- IV Stage Computation ---------------------------- #
+# Array-only part of the IV stage: chain columns -> per-model IV, greeks, IV source and
+# skip reason codes. No config, logging or file I/O here so the same functions can run
+# in the stage process and in the shared-memory worker processes (iv_parallel.py).
+
+# Model registry: identifier -> GUI label, price columns, solver and output filter settings
+MODELS = {
+    "brent_bs": {
+        "label": "Brent Black Scholes",
+        "price_columns": ["last"],
+        "greek_convention": "brent_bs",
+        "require_open_interest": False,
+    },
+    "grok": {
+        "label": "Grok",
+        "price_columns": ["mid", "mark", "last"],
+        "greek_convention": "standard",
+        "require_open_interest": False,
+    },
+    "hybrid_one": {
+        "label": "Hybrid_one",
+        "price_columns": ["mid", "mark", "last"],
+        "greek_convention": "standard",
+        "require_open_interest": True,
+    },
+}
+
+# Codes stored per row (-1 = not applicable); labels are what ends up in the CSVs
+SOURCE_LABELS = ["solved", "smile_fit", "estimate"]
+SKIP_REASONS = [
+    "Skipped due to missing or invalid inputs.",
+    "Skipped due to failed IV calculation.",
+    "Skipped due to invalid Greeks.",
+]
+
+# Numeric columns the computation needs from the chain (in this order)
+INPUT_COLUMNS = ["S", "K", "T", "r", "is_call", "has_type", "last", "mark", "mid", "bid", "volume", "expiry_code"]
+
+# ---------------------------- Chain Arrays ---------------------------- #
+
+def chain_columns(chain):
+    """Flat float64 columns (INPUT_COLUMNS) extracted from the chain DataFrame."""
+    n = len(chain)
+
+    def column(name):
+        return chain[name].to_numpy(dtype=float) if name in chain.columns else np.full(n, np.nan)
+
+    put_call = chain["putCall"].astype(str).str.upper()
+    return {
+        "S": column("spotPrice"),
+        "K": column("strikePrice"),
+        "T": column("T"),
+        "r": column("SOFR"),
+        "is_call": (put_call == "CALL").to_numpy(dtype=float),
+        "has_type": put_call.isin(["CALL", "PUT"]).to_numpy(dtype=float),
+        "last": column("last"),
+        "mark": column("mark"),
+        "mid": column("mid"),
+        "bid": column("bid"),
+        "volume": column("totalVolume"),
+        "expiry_code": pd.factorize(chain["expirationDays"])[0].astype(float),
+    }
+
+def arrays_from_columns(columns):
+    """NumPy arrays and sigma-independent terms shared by all models."""
+    terms = bs_kernel.shared_terms(columns["S"], columns["K"], columns["T"], columns["r"])
+    is_call = columns["is_call"] > 0
+    otm = np.where(is_call, terms["K"] > terms["S"], terms["K"] < terms["S"])
+    # No bid means any price on the contract is either one-sided or left over from an earlier trade:
+    # OTM wings and untraded contracts in that state are priced from the smile rather than solved.
+    no_bid = columns["bid"] <= 0
+    return {
+        "terms": terms,
+        "is_call": is_call,
+        "has_type": columns["has_type"] > 0,
+        "prices": {col: columns[col] for col in ["last", "mark", "mid"]},
+        "expiry_codes": columns["expiry_code"].astype(np.int64),
+        # Log-moneyness against the forward, k = log(K / F)
+        "log_moneyness": -terms["log_sk"] - terms["r"] * terms["T"],
+        "otm": otm,
+        "fit_priced": no_bid & (otm | (columns["volume"] == 0)),
+    }
+
+def chain_arrays(chain):
+    """Extract the NumPy arrays and sigma-independent terms shared by all models."""
+    return arrays_from_columns(chain_columns(chain))
+
+def market_price(arrays, price_columns):
+    """First positive, finite price among price_columns (mirrors `mid or mark or last`)."""
+    n = arrays["is_call"].shape[0]
+    price = np.full(n, np.nan)
+    for col in price_columns:
+        values = arrays["prices"].get(col)
+        if values is None:
+            continue
+        fill = np.isnan(price) & np.isfinite(values) & (values > 0)
+        price[fill] = values[fill]
+    return price
+
+# ---------------------------- Model Solvers ---------------------------- #
+
+def contract_inputs(arrays, positive_rate):
+    """Rows whose contract inputs (S, K, T, r, CALL/PUT) are usable, independent of price."""
+    terms = arrays["terms"]
+    rate_ok = terms["r"] > 0 if positive_rate else np.isfinite(terms["r"])
+    return (terms["S"] > 0) & (terms["K"] > 0) & (terms["T"] > 0) & rate_ok & arrays["has_type"]
+
+def _solver_output(contract_valid, price, solve_mask):
+    """Common bookkeeping for the model solvers: validity masks, empty outputs and rows to solve."""
+    n = price.shape[0]
+    valid = contract_valid & np.isfinite(price) & (price > 0)
+    rows = valid if solve_mask is None else valid & solve_mask
+    solved = {
+        "contract_valid": contract_valid,
+        "valid": valid,
+        "iv": np.full(n, np.nan),
+        "iterations": np.zeros(n, dtype=np.int32),
+        "converged": np.zeros(n, dtype=bool),
+    }
+    return solved, np.flatnonzero(rows)
+
+def solve_brent_bs(arrays, price, solve_mask=None):
+    """Brent bracket [1e-6, 10] with xtol=1e-5 (ndx_brent_bs.calculate_implied_volatility)."""
+    solved, idx = _solver_output(contract_inputs(arrays, positive_rate=False), price, solve_mask)
+    if idx.size:
+        sub = bs_kernel._subset(arrays["terms"], idx)
+        solved["iv"][idx], solved["iterations"][idx], solved["converged"][idx] = bs_kernel.solve_iv_bracketed(
+            price[idx], sub, arrays["is_call"][idx], 1e-6, 10.0, xtol=1e-5
+        )
+    return solved
+
+def solve_grok(arrays, price, solve_mask=None):
+    """Newton from 0.5 with tol=1e-6 / 100 iterations, results above 10 rejected (ndx_grok.implied_volatility)."""
+    solved, idx = _solver_output(contract_inputs(arrays, positive_rate=True), price, solve_mask)
+    if idx.size:
+        sub = bs_kernel._subset(arrays["terms"], idx)
+        solved["iv"][idx], solved["iterations"][idx], solved["converged"][idx] = bs_kernel.solve_iv_newton(
+            price[idx], sub, arrays["is_call"][idx], initial=0.5, tol=1e-6, max_iter=100
+        )
+    iv, converged = solved["iv"], solved["converged"]
+    capped = converged & ((iv > 10) | (iv <= 0))
+    iv[capped] = np.nan
+    converged &= ~capped
+    solved["capped"] = capped
+    return solved
+
+def solve_hybrid_one(arrays, price, solve_mask=None):
+    """
+    Closed-form estimate refined by Brent inside [0.5x, 1.5x] of the estimate (ndx_hybrid_one.refine_iv).
+    Rows whose refinement fails keep the closed-form estimate, as before (converged stays False).
+    """
+    solved, idx = _solver_output(contract_inputs(arrays, positive_rate=True), price, solve_mask)
+    if idx.size:
+        sub = bs_kernel._subset(arrays["terms"], idx)
+        is_call = arrays["is_call"][idx]
+        initial_iv = bs_kernel.closed_form_iv(price[idx], sub, is_call)
+        lower = np.maximum(1e-6, initial_iv * 0.5)
+        upper = np.minimum(5.0, np.maximum(1.0, initial_iv * 1.5))
+        refined, solved["iterations"][idx], solved["converged"][idx] = bs_kernel.solve_iv_bracketed(
+            price[idx], sub, is_call, lower, upper, xtol=1e-8
+        )
+        solved["iv"][idx] = np.where(solved["converged"][idx], refined, initial_iv)
+    return solved
+
+MODEL_SOLVERS = {
+    "brent_bs": solve_brent_bs,
+    "grok": solve_grok,
+    "hybrid_one": solve_hybrid_one,
+}
+
+# ---------------------------- Per-Model Computation ---------------------------- #
+
+def apply_smile_fit(arrays, solved, fit_priced):
+    """
+    Fill IVs from the per-expiration smile fitted to the cleanly solved contracts.
+
+    Targets are contracts with usable inputs that were either kept out of the solve
+    (fit_priced: zero-bid wings / stale quotes) or did not converge; smile_fit decides
+    which of them its fit may cover. Returns
+    (iv, filled, methods) with the filled IV array, the mask of filled rows and the fit
+    method used per expiration code.
+    """
+    anchors = solved["valid"] & solved["converged"] & ~fit_priced
+    targets = solved["contract_valid"] & (fit_priced | (solved["valid"] & ~solved["converged"]))
+    fitted, methods = smile_fit.fill_from_smile(
+        arrays["expiry_codes"], arrays["log_moneyness"], arrays["terms"]["T"], solved["iv"],
+        anchors, targets, otm=arrays["otm"]
+    )
+    filled = targets & np.isfinite(fitted)
+    iv = np.where(filled, fitted, solved["iv"])
+    return iv, filled, methods
+
+def compute_model(arrays, model, smile_fit_enabled=True):
+    """
+    Solve IVs and greeks for one model over the given arrays.
+
+    Returns a dict of equal-length arrays: "price", "iv", "source" (index into
+    SOURCE_LABELS, -1 where no result), "reason" (index into SKIP_REASONS, -1 for result
+    rows), "iterations", "converged", "capped", "attempted", "zero_bid_filled" and one
+    array per greek (NaN outside result rows), plus "fit_counts" (smile fit method ->
+    number of expirations) and "elapsed" seconds.
+    """
+    spec = MODELS[model]
+    start = time.perf_counter()
+    n = arrays["is_call"].shape[0]
+    fit_priced = arrays["fit_priced"] if smile_fit_enabled else np.zeros(n, dtype=bool)
+    price = market_price(arrays, spec["price_columns"])
+    solver = MODEL_SOLVERS[model]
+    solved = solver(arrays, price, solve_mask=~fit_priced)
+
+    source = np.where(solved["converged"], 0, 2).astype(np.int8)
+    filled = np.zeros(n, dtype=bool)
+    iv = solved["iv"]
+    fit_counts = {}
+    attempted = solved["valid"]
+    if smile_fit_enabled:
+        iv, filled, methods = apply_smile_fit(arrays, solved, fit_priced)
+        source[filled] = 1
+        # Wings the smile could not cover (fit rejected for their expiration, or too far outside
+        # the solved moneyness range) are solved as usual
+        unfitted = fit_priced & ~filled & solved["valid"]
+        if unfitted.any():
+            retry = solver(arrays, price, solve_mask=unfitted)
+            for key in ("iv", "iterations", "converged", "capped"):
+                if key in retry:
+                    solved[key] = np.where(unfitted, retry[key], solved[key])
+            iv = np.where(unfitted, solved["iv"], iv)
+            source[unfitted] = np.where(solved["converged"][unfitted], 0, 2)
+        attempted = solved["valid"] & (~fit_priced | unfitted)
+        fit_counts = pd.Series([m or "none" for m in methods.values()], dtype=object).value_counts().to_dict()
+
+    usable = solved["valid"] | filled
+    has_iv = usable & np.isfinite(iv)
+    idx = np.flatnonzero(has_iv)
+    sub = bs_kernel._subset(arrays["terms"], idx)
+    greeks = bs_kernel.calculate_greeks(sub, iv[idx], arrays["is_call"][idx], spec["greek_convention"])
+    ok_greeks = np.isfinite(greeks["gamma"])
+
+    reason = np.full(n, -1, dtype=np.int8)
+    reason[~usable] = 0
+    reason[usable & ~has_iv] = 1
+    reason[idx[~ok_greeks]] = 2
+    source[reason >= 0] = -1
+
+    computed = {
+        "price": price,
+        "iv": np.where(reason < 0, iv, np.nan),
+        "source": source,
+        "reason": reason,
+        "iterations": solved["iterations"],
+        "converged": solved["converged"],
+        "capped": solved.get("capped", np.zeros(n, dtype=bool)),
+        "attempted": attempted,
+        "zero_bid_filled": filled & fit_priced,
+    }
+    for name in bs_kernel.GREEK_COLUMNS:
+        values = np.full(n, np.nan)
+        values[idx[ok_greeks]] = greeks[name][ok_greeks]
+        computed[name] = values
+    computed["fit_counts"] = {str(k): int(v) for k, v in fit_counts.items()}
+    computed["elapsed"] = time.perf_counter() - start
+    return computed
@@ -0,0 +1,123 @@
+import numpy as np
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from processing.iv_models import bs_kernel, iv_compute
+
+# ---------------------------- Sharded IV Computation ---------------------------- #
+# The chain columns are copied once into a shared-memory block, sorted by expiration and
+# strike. Worker processes attach to it, solve a contiguous row range (whole expirations
+# when the smile fit is on, since the fit is per expiration; plain strike blocks otherwise)
+# and write every model's output into a second shared-memory block at the same rows.
+# Nothing but block names, row ranges and small per-shard summaries is pickled, and the
+# merge is by row position, so the result does not depend on which shard finishes first.
+
+OUTPUT_FIELDS = ["price", "iv", "source", "reason", "iterations", "converged", "capped", "attempted",
+                 "zero_bid_filled"] + bs_kernel.GREEK_COLUMNS
+FIELD_TYPES = {
+    "source": np.int8,
+    "reason": np.int8,
+    "iterations": np.int32,
+    "converged": bool,
+    "capped": bool,
+    "attempted": bool,
+    "zero_bid_filled": bool,
+}
+# Shards per worker, so uneven expirations still balance across the pool
+SHARDS_PER_WORKER = 4
+# Below this many contracts the pool start-up costs more than it saves
+MIN_PARALLEL_ROWS = 5000
+
+
+def plan_shards(expiry_codes, workers, whole_expirations=True):
+    """
+    Split sorted rows into contiguous (start, end) ranges of roughly n / (workers * SHARDS_PER_WORKER)
+    rows. With whole_expirations the ranges only break at expiration boundaries.
+    Returned largest first so the pool schedules the long shards early.
+    """
+    n = expiry_codes.shape[0]
+    target = max(1, int(np.ceil(n / (workers * SHARDS_PER_WORKER))))
+    if whole_expirations:
+        cuts = np.flatnonzero(np.diff(expiry_codes)) + 1
+    else:
+        cuts = np.arange(target, n, target)
+    boundaries = np.concatenate(([0], cuts, [n]))
+
+    shards = []
+    start = 0
+    for end in boundaries[1:]:
+        if end - start >= target or end == n:
+            shards.append((int(start), int(end)))
+            start = end
+    return sorted(shards, key=lambda s: s[0] - s[1])
+
+
+def _solve_shard(input_name, output_name, n, models, start, end, smile_fit_enabled):
+    """Worker: solve rows [start, end) of the shared input for every model."""
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    try:
+        inputs = np.ndarray((len(iv_compute.INPUT_COLUMNS), n), dtype=np.float64, buffer=input_shm.buf)
+        outputs = np.ndarray((len(models), len(OUTPUT_FIELDS), n), dtype=np.float64, buffer=output_shm.buf)
+        columns = {name: inputs[i, start:end] for i, name in enumerate(iv_compute.INPUT_COLUMNS)}
+        arrays = iv_compute.arrays_from_columns(columns)
+
+        summaries = {}
+        for m, model in enumerate(models):
+            computed = iv_compute.compute_model(arrays, model, smile_fit_enabled)
+            for f, field in enumerate(OUTPUT_FIELDS):
+                outputs[m, f, start:end] = computed[field]
+            summaries[model] = {"fit_counts": computed["fit_counts"], "elapsed": computed["elapsed"]}
+        del inputs, outputs, columns, arrays
+        return summaries
+    finally:
+        input_shm.close()
+        output_shm.close()
+
+
+def compute_models_parallel(columns, models, smile_fit_enabled=True, workers=2):
+    """
+    Sharded equivalent of iv_compute.compute_model for each model.
+
+    columns: iv_compute.chain_columns(chain). Returns {model: computed} with the same
+    arrays (in the original row order) that compute_model returns for the whole chain.
+    """
+    n = columns["S"].shape[0]
+    order = np.lexsort((columns["K"], columns["expiry_code"]))
+    input_shm = shared_memory.SharedMemory(create=True, size=max(1, len(iv_compute.INPUT_COLUMNS) * n * 8))
+    output_shm = shared_memory.SharedMemory(create=True, size=max(1, len(models) * len(OUTPUT_FIELDS) * n * 8))
+    try:
+        inputs = np.ndarray((len(iv_compute.INPUT_COLUMNS), n), dtype=np.float64, buffer=input_shm.buf)
+        for i, name in enumerate(iv_compute.INPUT_COLUMNS):
+            inputs[i] = columns[name][order]
+        outputs = np.ndarray((len(models), len(OUTPUT_FIELDS), n), dtype=np.float64, buffer=output_shm.buf)
+        outputs[:] = np.nan
+
+        shards = plan_shards(inputs[iv_compute.INPUT_COLUMNS.index("expiry_code")], workers,
+                             whole_expirations=smile_fit_enabled)
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)) or 1) as pool:
+            futures = [pool.submit(_solve_shard, input_shm.name, output_shm.name, n, list(models),
+                                   start, end, smile_fit_enabled) for start, end in shards]
+            summaries = [future.result() for future in futures]
+
+        computed_models = {}
+        for m, model in enumerate(models):
+            computed = {}
+            for f, field in enumerate(OUTPUT_FIELDS):
+                values = np.empty(n)
+                values[order] = outputs[m, f]
+                computed[field] = values.astype(FIELD_TYPES[field]) if field in FIELD_TYPES else values
+            fit_counts = Counter()
+            for summary in summaries:
+                fit_counts.update(summary[model]["fit_counts"])
+            computed["fit_counts"] = dict(fit_counts)
+            computed["elapsed"] = sum(summary[model]["elapsed"] for summary in summaries)
+            computed_models[model] = computed
+        del inputs, outputs
+        return computed_models
+    finally:
+        input_shm.close()
+        input_shm.unlink()
+        output_shm.close()
+        output_shm.unlink()
@@ -0,0 +1,360 @@
+import pandas as pd
+import numpy as np
+import json  # For configuration loading
+import os
+import threading
+from loguru import logger
+from datetime import datetime
+from pathlib import Path
+
+from processing import expiration_buckets, history_store, market_context, schema
+from processing.iv_models import bs_kernel, iv_compute, iv_parallel
+from processing.oi_vol import vol_oi_initial
+
+# ---------------------------- Configuration ---------------------------- #
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+
+# Configure logger
+LOG_DIR = PROJECT_ROOT / "logs" / "iv_initial"
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+logger.add(
+    LOG_DIR / "iv_stage.log",
+    rotation="1 MB",
+    level="DEBUG",
+    backtrace=True,
+    diagnose=True
+)
+
+INPUT_FILE = PROJECT_ROOT / "outputs" / "step_one" / "SPX_Option_Chain.xlsx"
+# Index of this stage's chain (the NDX pipeline has its own ndx_* scripts)
+INDEX = "SPX"
+# Per-model output directories (same layout the individual model scripts used)
+STEP_TWO_DIR = PROJECT_ROOT / "outputs" / "step_two"
+SKIPPED_DIR = STEP_TWO_DIR / "Skipped_Rows"
+# One summary record per model per cycle (one JSON lines file per day); optional sampled
+# per-contract detail for debugging
+STATS_DIR = STEP_TWO_DIR / "iv_stats"
+
+# Model registry (identifier -> GUI label, price columns, greek convention, output filters)
+MODELS = iv_compute.MODELS
+# Worker processes for the shared-memory sharded solve (iv_parallel.py); 1 solves in-process
+IV_WORKERS = max(1, min(os.cpu_count() or 1, 8))
+
+# Mapping from IV method (GUI label) to model identifier
+iv_method_mapping = {spec["label"]: model for model, spec in MODELS.items()}
+
+# ---------------------------- Load IV Method Configuration ---------------------------- #
+IV_METHOD_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "iv_method_config.json"
+try:
+    with open(IV_METHOD_CONFIG_PATH, "r") as f:
+        iv_method_config = json.load(f)
+    # Expected values: "All", "Hybrid_one", "Brent Black Scholes", or "Grok"
+    selected_iv_method = iv_method_config.get("value", "All")
+    logger.info(f"Selected IV method: {selected_iv_method}")
+except Exception as e:
+    logger.warning(f"Could not load IV method config; defaulting to 'All'. Error: {e}")
+    selected_iv_method = "All"
+
+# ---------------------------- Smile Fit Configuration ---------------------------- #
+# "Yes": failed/non-converged contracts and zero-bid wings get their IV from the fitted smile
+# where the smile_fit guards accept it (the rest are solved as usual)
+SMILE_FIT_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "smile_fit_config.json"
+try:
+    with open(SMILE_FIT_CONFIG_PATH, "r") as f:
+        smile_fit_enabled = json.load(f).get("value", "Yes") == "Yes"
+except Exception as e:
+    logger.warning(f"Could not load smile fit config; defaulting to 'Yes'. Error: {e}")
+    smile_fit_enabled = True
+logger.info(f"Smile fit fallback enabled: {smile_fit_enabled}")
+
+# ---------------------------- Chain History Configuration ---------------------------- #
+# Minutes between the chains recorded in the history store (the inputs of a backfill), 0
+# disables recording. An EoM chain takes ~5.6 MB of store a cycle, so recording every
+# one-minute cycle would add ~2 GB a day; clear_hist removes the stores of older days.
+CHAIN_HISTORY_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "chain_history_config.json"
+try:
+    with open(CHAIN_HISTORY_CONFIG_PATH, "r") as f:
+        CHAIN_RECORD_MINUTES = max(int(json.load(f).get("value", 5)), 0)
+except Exception as e:
+    logger.warning(f"Could not load chain history config; recording every 5 minutes. Error: {e}")
+    CHAIN_RECORD_MINUTES = 5
+
+# ---------------------------- IV Detail Configuration ---------------------------- #
+# Fraction of contracts written to {model}_iv_detail.csv each cycle, 0 disables
+IV_DETAIL_CONFIG_PATH = PROJECT_ROOT / "configs" / "settings" / "iv_detail_config.json"
+try:
+    with open(IV_DETAIL_CONFIG_PATH, "r") as f:
+        IV_DETAIL_SAMPLE_RATE = min(max(float(json.load(f).get("value", 0.0)), 0.0), 1.0)
+except Exception as e:
+    logger.warning(f"Could not load IV detail config; detail sampling disabled. Error: {e}")
+    IV_DETAIL_SAMPLE_RATE = 0.0
+
+# ---------------------------- Chain Loading ---------------------------- #
+
+NUMERIC_COLUMNS = ["spotPrice", "strikePrice", "T", "SOFR", "last", "mark", "mid", "bid", "ask",
+                   "openInterest", "totalVolume"]
+
+def load_chain(file_path):
+    """Read the option chain once and normalize the column types every model relies on."""
+    df = pd.read_excel(file_path)
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    df = schema.enforce(df, "chain")
+    logger.info(f"Loaded {len(df)} chain rows from {file_path}")
+    return df
+
+def chain_due(cycle_ts):
+    """
+    Whether this cycle's chain is recorded: the first cycle of each CHAIN_RECORD_MINUTES slot
+    of the day (aligned to the clock, so late cycles do not drift), or a re-run of a recorded one.
+    """
+    if CHAIN_RECORD_MINUTES <= 0:
+        return False
+    last = history_store.latest_cycle(index=INDEX, table="chain")
+    if last is None or last == cycle_ts:
+        return True
+
+    def slot(timestamp):
+        moment = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S")
+        return (moment.hour * 60 + moment.minute) // CHAIN_RECORD_MINUTES
+
+    return slot(cycle_ts) != slot(last)
+
+def record_chain(chain, context=None):
+    """
+    Record the market context, and the chain every CHAIN_RECORD_MINUTES, in the day's history
+    store under the cycle's timestamp (the inputs of a recompute, see processing/backfill.py).
+    The IV stage runs it on a thread alongside the solve.
+    """
+    try:
+        context = context or market_context.load()
+        cycle_ts = history_store.cycle_timestamp(context)
+        if context is not None:
+            history_store.append_context(context, INDEX, cycle_ts)
+        if not chain_due(cycle_ts):
+            logger.info(f"Chain of cycle {cycle_ts} not recorded (one every {CHAIN_RECORD_MINUTES} minutes).")
+            return
+        rows = history_store.append_chain(chain, INDEX, cycle_ts)
+        logger.info(f"Recorded {rows} chain rows for cycle {cycle_ts} in {history_store.store_path()}")
+    except Exception as e:
+        logger.error(f"Could not record the chain in the history store: {e}")
+
+# ---------------------------- Stage Processing ---------------------------- #
+
+def solve_statistics(model, computed):
+    """
+    Aggregate counters for one model over one cycle (replaces the per-row warnings the
+    scalar models logged): skips by reason, iteration histogram of the attempted solves,
+    non-converged and capped counts, and how many IVs came from each source.
+    """
+    attempted = computed["attempted"]
+    iterations = computed["iterations"][attempted]
+    histogram = np.bincount(iterations) if iterations.size else np.zeros(0, dtype=int)
+    reason_counts = np.bincount(computed["reason"][computed["reason"] >= 0], minlength=len(iv_compute.SKIP_REASONS))
+    source_counts = np.bincount(computed["source"][computed["source"] >= 0], minlength=len(iv_compute.SOURCE_LABELS))
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "model": model,
+        "rows": int(attempted.shape[0]),
+        "attempted": int(attempted.sum()),
+        "results": int(source_counts.sum()),
+        "skipped": int(reason_counts.sum()),
+        "skip_reasons": {label: int(c) for label, c in zip(iv_compute.SKIP_REASONS, reason_counts) if c},
+        "non_converged": int((attempted & ~computed["converged"]).sum()),
+        "capped": int(computed["capped"].sum()),
+        "iv_sources": {label: int(c) for label, c in zip(iv_compute.SOURCE_LABELS, source_counts) if c},
+        "smile_fit": int(source_counts[iv_compute.SOURCE_LABELS.index("smile_fit")]),
+        "smile_fit_zero_bid": int(computed["zero_bid_filled"].sum()),
+        "smile_fit_methods": computed["fit_counts"],
+        "iteration_histogram": {int(i): int(c) for i, c in enumerate(histogram) if c},
+        "elapsed_seconds": round(computed["elapsed"], 4),
+    }
+
+def sample_detail(chain, model, computed):
+    """Write a random sample of per-contract solver detail for debugging (IV_DETAIL_SAMPLE_RATE > 0)."""
+    rng = np.random.default_rng()
+    pick = np.flatnonzero(rng.random(len(chain)) < IV_DETAIL_SAMPLE_RATE)
+    detail = chain.iloc[pick][["expirationDays", "strikePrice", "putCall", "spotPrice", "T"]].copy()
+    detail["model"] = model
+    detail["price"] = computed["price"][pick]
+    detail["impliedVolatility"] = computed["iv"][pick]
+    detail["iterations"] = computed["iterations"][pick]
+    detail["converged"] = computed["converged"][pick]
+    detail["iv_source"] = code_labels(computed["source"][pick], iv_compute.SOURCE_LABELS)
+    detail["skip_reason"] = code_labels(computed["reason"][pick], iv_compute.SKIP_REASONS)
+    save_to_csv(detail, STATS_DIR / f"{model}_iv_detail.csv")
+
+def code_labels(codes, labels):
+    """Map integer codes (-1 = none) to their labels."""
+    return np.array([None] + list(labels), dtype=object)[codes.astype(np.int64) + 1]
+
+def stats_path(day=None):
+    """Statistics file of one day (a date, or today)."""
+    day = day or datetime.now().date()
+    return STATS_DIR / f"{day:%Y%m%d}.jsonl"
+
+def write_statistics(stats):
+    """Append one JSON line per model to the day's cycle statistics file."""
+    try:
+        path = stats_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as f:
+            for record in stats:
+                f.write(json.dumps(record) + "\n")
+        logger.info(f"Solve statistics appended to {path}")
+    except Exception as e:
+        logger.error(f"Failed to write solve statistics: {e}")
+
+def model_frames(chain, model, computed):
+    """Turn one model's computed arrays into its result rows and skipped rows."""
+    result_rows = np.flatnonzero(computed["source"] >= 0)
+    result = chain.iloc[result_rows].copy()
+    result["model"] = model
+    result["impliedVolatility"] = computed["iv"][result_rows]
+    result["iv_source"] = code_labels(computed["source"][result_rows], iv_compute.SOURCE_LABELS)
+    for name in bs_kernel.GREEK_COLUMNS:
+        result[name] = computed[name][result_rows]
+
+    skipped_rows = np.flatnonzero(computed["reason"] >= 0)
+    skipped = chain.iloc[skipped_rows].copy()
+    skipped["model"] = model
+    skipped["skip_reason"] = code_labels(computed["reason"][skipped_rows], iv_compute.SKIP_REASONS)
+    return result, skipped
+
+def run_models(chain, models, workers=1):
+    """
+    Run every requested model over one copy of the chain.
+
+    With workers > 1 (and a chain of at least iv_parallel.MIN_PARALLEL_ROWS contracts) the
+    chain is sharded across a process pool with the input/output arrays in shared memory
+    (iv_parallel.py); results are identical to the in-process run.
+
+    Returns (results, skipped, stats):
+      - results: one row per (contract, model) with a "model" column, "impliedVolatility",
+        "iv_source" ("solved", "smile_fit" or "estimate") and the greek columns.
+      - skipped: rows that produced no usable IV/greeks, with "model" and "skip_reason".
+      - stats: one summary dict per model (see solve_statistics).
+    """
+    if workers > 1 and len(chain) >= iv_parallel.MIN_PARALLEL_ROWS:
+        computed_models = iv_parallel.compute_models_parallel(
+            iv_compute.chain_columns(chain), models, smile_fit_enabled, workers
+        )
+    else:
+        arrays = iv_compute.chain_arrays(chain)
+        computed_models = {model: iv_compute.compute_model(arrays, model, smile_fit_enabled) for model in models}
+
+    result_frames = []
+    skipped_frames = []
+    stats = []
+    for model in models:
+        computed = computed_models[model]
+        result, skipped = model_frames(chain, model, computed)
+        result_frames.append(result)
+        if not skipped.empty:
+            skipped_frames.append(skipped)
+
+        model_stats = solve_statistics(model, computed)
+        stats.append(model_stats)
+        logger.info(f"{model}: {model_stats['results']} rows solved, {model_stats['skipped']} skipped in "
+                    f"{model_stats['elapsed_seconds']:.3f}s (non-converged {model_stats['non_converged']}, "
+                    f"capped {model_stats['capped']}, smile fit {model_stats['smile_fit']}).")
+        if IV_DETAIL_SAMPLE_RATE > 0:
+            sample_detail(chain, model, computed)
+
+    results = pd.concat(result_frames, ignore_index=True) if result_frames else pd.DataFrame()
+    skipped = pd.concat(skipped_frames, ignore_index=True) if skipped_frames else pd.DataFrame()
+    return results, skipped, stats
+
+def select_model(results, model):
+    """Return the rows of the combined results table that belong to one model."""
+    return results[results["model"] == model]
+
+def save_to_csv(df, filename):
+    """Saves the DataFrame to a CSV file (expirationDays written back as expirationDate)."""
+    try:
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        schema.write_table(df, filename)
+        logger.info(f"Results saved to {filename}")
+    except Exception as e:
+        logger.error(f"Failed to save to CSV: {e}")
+
+def master_frame(results, model):
+    """One model's master rows (every expiration, one row per contract with usable greeks), or None."""
+    df_results = select_model(results, model)
+    keep = df_results["gamma"] != 0
+    if MODELS[model]["require_open_interest"]:
+        keep &= df_results["openInterest"] != 0
+    df_results = df_results[keep]
+    if df_results.empty:
+        return None
+    return schema.enforce(df_results, "results")
+
+def write_master_output(results, model):
+    """
+    Write one model's results as its master table (every expiration, one row per contract).
+    The 0DTE / 1DTE / EoW / EoM bucket files are materialized from it by abso_expo.
+    """
+    df_results = master_frame(results, model)
+    if df_results is None:
+        logger.warning(f"No valid results for {model}; no CSV created.")
+        return
+    save_to_csv(df_results, expiration_buckets.master_path(model))
+
+def selected_models():
+    """Model identifiers to run for the current IV method selection."""
+    if selected_iv_method == "All":
+        return list(MODELS)
+    model = iv_method_mapping.get(selected_iv_method)
+    if model is None:
+        logger.warning(f"No model mapping found for IV method '{selected_iv_method}'. Running all models.")
+        return list(MODELS)
+    return [model]
+
+# ---------------------------- Main Processing ---------------------------- #
+
+def iv_stage_processing():
+    """
+    Single IV stage replacing the separate brent_bs / grok / hybrid_one processes:
+      1) Read SPX_Option_Chain.xlsx once, record it in the history store (on a thread, off the
+         solve's path) and build the vol/oi tables from it (processing/oi_vol/vol_oi_initial.py)
+         without reading the workbook again.
+      2) Run the selected models over shared input arrays.
+      3) Write one master results table per model, skipped rows and one statistics record per model.
+    """
+    try:
+        logger.info("Starting IV stage processing.")
+        chain = load_chain(INPUT_FILE)
+        context = market_context.load()
+        # The chain is only read from here on, so it is recorded while the stage works on it
+        recorder = threading.Thread(target=record_chain, args=(chain, context), name="record_chain")
+        recorder.start()
+        vol_oi_initial.process_vol_oi_data(chain, context)
+        models = selected_models()
+
+        results, skipped, stats = run_models(chain, models, workers=IV_WORKERS)
+        write_statistics(stats)
+        if results.empty:
+            logger.warning("No valid results to save after processing.")
+        else:
+            for model in models:
+                write_master_output(results, model)
+
+        for model in models:
+            model_skipped = skipped[skipped["model"] == model] if not skipped.empty else skipped
+            if not model_skipped.empty:
+                save_to_csv(model_skipped, SKIPPED_DIR / f"{model}_skipped.csv")
+            else:
+                logger.info(f"No skipped rows to save for {model}.")
+
+        recorder.join()
+
+        logger.info("IV stage processing completed successfully.")
+    except Exception as e:
+        logger.error(f"IV stage processing failed: {e}")
+
+# ---------------------------- Main Execution ---------------------------- #
+
+if __name__ == "__main__":
+    iv_stage_processing()
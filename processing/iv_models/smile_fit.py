@@ -0,0 +1,139 @@
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+
+# ---------------------------- Smile Fit ---------------------------- #
+# Per-expiration volatility smile fitted to the contracts that solved cleanly.
+# The fit is done in total variance w = iv^2 * T against log-moneyness k = log(K / F):
+#   - SVI (raw parameterization, quasi-explicit grid fit) when an admissible fit exists.
+#   - A monotone (PCHIP) spline through the points otherwise, flat beyond the last strike.
+# The fitted smile is used to fill contracts the solver could not (or should not) solve.
+# An expiration's fit is only used with enough anchors and a small residual, and only fills
+# contracts near the solved moneyness range; everything else is solved as usual.
+
+MIN_FIT_POINTS = 8
+# Largest RMS gap (in IV) between the fit and its anchors before the fit is rejected
+MAX_FIT_RMS_IV = 0.005
+# Fill at most this fraction of the anchors' moneyness span beyond either end
+EXTRAPOLATION_MARGIN = 0.25
+# (m, sigma) grid of the SVI fit: m across the anchored moneyness range, sigma as a fraction of it.
+# Narrower kinks can match the anchors but extrapolate badly past the last solved strike.
+SVI_GRID = (21, 15)
+SVI_SIGMA_RANGE = (0.1, 2.0)
+# Solved IVs outside this range are not trusted as fit anchors
+ANCHOR_IV_RANGE = (0.01, 5.0)
+
+
+def svi_total_variance(params, k):
+    """Raw SVI total variance w(k) = a + b * (rho * (k - m) + sqrt((k - m)^2 + sigma^2))."""
+    a, b, rho, m, sigma = params
+    return a + b * (rho * (k - m) + np.sqrt((k - m) ** 2 + sigma ** 2))
+
+
+def fit_svi(k, w):
+    """
+    Quasi-explicit SVI fit. For fixed (m, sigma) the total variance is linear in
+    (a, b * rho, b), so every point of an (m, sigma) grid is one 3x3 least-squares solve;
+    the admissible grid point with the smallest squared error wins. Returns the parameter
+    array, or None if no grid point is admissible.
+    """
+    lo, hi = float(k.min()), float(k.max())
+    m, sigma = np.meshgrid(np.linspace(lo, hi, SVI_GRID[0]), (hi - lo) * np.geomspace(*SVI_SIGMA_RANGE, SVI_GRID[1]))
+    m, sigma = m.ravel(), sigma.ravel()
+    d = k[None, :] - m[:, None]
+    root = np.sqrt(d ** 2 + sigma[:, None] ** 2)
+
+    # Normal equations for the columns (1, d, root), one system per grid point
+    n = np.full(m.shape, float(k.size))
+    sum_d, sum_root = d.sum(axis=1), root.sum(axis=1)
+    sum_dd, sum_droot, sum_rootroot = (d * d).sum(axis=1), (d * root).sum(axis=1), (root * root).sum(axis=1)
+    lhs = np.stack([n, sum_d, sum_root, sum_d, sum_dd, sum_droot, sum_root, sum_droot, sum_rootroot],
+                   axis=-1).reshape(-1, 3, 3)
+    rhs = np.stack([np.full(m.shape, w.sum()), d @ w, root @ w], axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        try:
+            a, b_rho, b = np.linalg.solve(lhs, rhs[..., None])[..., 0].T
+        except np.linalg.LinAlgError:
+            return None
+        rho = b_rho / b
+        sse = np.sum((a[:, None] + b_rho[:, None] * d + b[:, None] * root - w) ** 2, axis=1)
+        # No-arbitrage floor: minimum total variance must stay non-negative
+        admissible = (b > 0) & (np.abs(rho) < 1) & (a + b * sigma * np.sqrt(1 - rho ** 2) >= 0) & np.isfinite(sse)
+    if not admissible.any():
+        return None
+    best = np.flatnonzero(admissible)[np.argmin(sse[admissible])]
+    return np.array([a[best], b[best], rho[best], m[best], sigma[best]])
+
+
+def fit_expiration(k, w):
+    """
+    Fit one expiration's smile. Returns (method, evaluate) where evaluate(k) gives total
+    variance, or (None, None) if there are fewer than MIN_FIT_POINTS distinct strikes.
+    """
+    order = np.argsort(k)
+    k, w = k[order], w[order]
+    # Average calls and puts quoted at the same strike
+    k_unique, inverse = np.unique(k, return_inverse=True)
+    w_unique = np.bincount(inverse, weights=w) / np.bincount(inverse)
+
+    if k_unique.size < MIN_FIT_POINTS:
+        return None, None
+
+    params = fit_svi(k_unique, w_unique)
+    if params is not None:
+        return "svi", lambda x: svi_total_variance(params, x)
+
+    spline = PchipInterpolator(k_unique, w_unique, extrapolate=False)
+    lo, hi = k_unique[0], k_unique[-1]
+    return "spline", lambda x: spline(np.clip(x, lo, hi))
+
+
+def fill_from_smile(expiry_codes, k, T, iv, anchors, targets, otm=None):
+    """
+    Fit a smile per expiration from the anchor rows and evaluate it on the target rows.
+
+    expiry_codes: integer expiration code per row (e.g. from pd.factorize).
+    k, T, iv: log-moneyness, time to expiry (years) and solved IV per row.
+    anchors: rows whose solved IV may be used in the fit.
+    targets: rows that need an IV from the fit.
+    otm: optional mask; when an expiration has enough OTM anchors only those are used.
+
+    Targets further than EXTRAPOLATION_MARGIN of the anchors' span outside the anchored
+    moneyness range are not filled, and an expiration whose fit misses its anchors by more
+    than MAX_FIT_RMS_IV is not filled at all.
+
+    Returns (fitted_iv, methods): fitted_iv is NaN outside targets or where no fit is used;
+    methods maps expiry code -> "svi" / "spline" / "rejected" / None.
+    """
+    fitted = np.full(iv.shape[0], np.nan)
+    methods = {}
+    lo, hi = ANCHOR_IV_RANGE
+    usable = anchors & np.isfinite(iv) & (iv > lo) & (iv < hi) & (T > 0)
+
+    for code in np.unique(expiry_codes[targets]):
+        in_expiry = expiry_codes == code
+        rows = usable & in_expiry
+        if otm is not None and np.count_nonzero(rows & otm) >= MIN_FIT_POINTS:
+            rows &= otm
+        methods[int(code)] = None
+        if not rows.any():
+            continue
+        lo, hi = k[rows].min(), k[rows].max()
+        margin = EXTRAPOLATION_MARGIN * (hi - lo)
+        fill = targets & in_expiry & (k >= lo - margin) & (k <= hi + margin)
+        if not fill.any():
+            continue
+
+        method, evaluate = fit_expiration(k[rows], iv[rows] ** 2 * T[rows])
+        if evaluate is None:
+            continue
+        with np.errstate(invalid="ignore"):
+            anchor_fit = np.sqrt(np.maximum(evaluate(k[rows]), 0) / T[rows])
+        if not np.sqrt(np.mean((anchor_fit - iv[rows]) ** 2)) <= MAX_FIT_RMS_IV:
+            methods[int(code)] = "rejected"
+            continue
+        methods[int(code)] = method
+        w = evaluate(k[fill])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            fitted[fill] = np.where(w > 0, np.sqrt(w / T[fill]), np.nan)
+
+    return fitted, methods
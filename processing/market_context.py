@@ -0,0 +1,83 @@
+import json
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from pathlib import Path
+from loguru import logger
+
+# ---------------------------- Market Context ---------------------------- #
+# Scalars every stage of a cycle needs (spot, ETF / futures prices and basis, rates),
+# written once by the quote stage (data_retrieval/spot_prices.py) and read by the
+# consumers instead of each re-reading spot_price_differences.xlsx or the option chain.
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+CONTEXT_FILE = PROJECT_ROOT / "outputs" / "step_one" / "market_context.json"
+
+# The quote stage removes the context before fetching, so a cycle whose quotes fail has none
+# and its stages never key their rows by an earlier cycle's timestamp. A context from another
+# day (the last one of a previous session) is ignored as well.
+
+
+@dataclass(frozen=True)
+class MarketContext:
+    index: str
+    spot: float
+    etf_symbol: str
+    etf_price: float
+    futures_symbol: str
+    futures_price: float
+    # (ETF - index) / index * 100 and (futures - index) / index * 100
+    etf_basis_pct: float
+    futures_basis_pct: float
+    sofr: float
+    dividend_yield: float
+    timestamp: str
+
+    @property
+    def futures_multiplier(self):
+        """Futures basis as a fraction (the old "SPX-ES % Diff" / 100)."""
+        return self.futures_basis_pct / 100.0
+
+    def save(self, path=CONTEXT_FILE):
+        """Write the context as JSON (replaced atomically so readers never see a partial file)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+        tmp.replace(path)
+
+
+def build(index, spot, etf_symbol, etf_price, futures_symbol, futures_price, sofr, dividend_yield):
+    """Context for one quote snapshot, with the basis percentages derived from the prices."""
+    return MarketContext(
+        index=index,
+        spot=float(spot),
+        etf_symbol=etf_symbol,
+        etf_price=float(etf_price),
+        futures_symbol=futures_symbol,
+        futures_price=float(futures_price),
+        etf_basis_pct=(etf_price - spot) / spot * 100,
+        futures_basis_pct=(futures_price - spot) / spot * 100,
+        sofr=float(sofr),
+        dividend_yield=float(dividend_yield),
+        timestamp=datetime.now().isoformat(timespec="seconds"),
+    )
+
+
+def load(path=CONTEXT_FILE):
+    """The context written by the quote stage this cycle, or None if there is none or it is from another day."""
+    try:
+        with open(path, "r") as f:
+            context = MarketContext(**json.load(f))
+        written = datetime.fromisoformat(context.timestamp)
+    except (OSError, ValueError, TypeError):
+        return None
+    if written.date() != datetime.now().date():
+        logger.warning(f"Ignoring market context from a previous session ({context.timestamp}).")
+        return None
+    return context
+
+
+def invalidate(path=CONTEXT_FILE):
+    """Remove the context (the quote stage does before fetching, so a failed cycle leaves none)."""
+    Path(path).unlink(missing_ok=True)
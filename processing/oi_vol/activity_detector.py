@@ -0,0 +1,266 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+
+from processing.oi_vol import vol_oi_ring
+
+# ---------------------------- Unusual Activity Detector ---------------------------- #
+# Running per-contract baselines of the volume rate (contracts traded per minute between two
+# cycles), strike x expiration x side. Rates are divided by a time-of-day factor learned across
+# sessions, so the open and the close are not flagged just for being busy; each contract keeps
+# an EWMA of its normalized rate and the Welford mean / variance of it. A cycle updates the
+# whole grid in a few vectorized passes, so its cost does not grow with the session, and emits
+# scored events for contracts whose volume bursts, whose day vol/OI crosses the threshold or
+# whose premium traded over the interval is large. The state is kept per index and day in an
+# .npz, the time-of-day profile in one .npz per index.
+
+ACTIVITY_DIR = vol_oi_ring.PROJECT_ROOT / "outputs" / "vol_oi" / "activity"
+SIDES = vol_oi_ring.SIDES
+PUT_CALL = vol_oi_ring.PUT_CALL
+
+# Baselines
+EWMA_ALPHA = 0.2
+# Floor of the rate standard deviation (contracts / minute), so a quiet contract's first trades are not infinite z
+STD_FLOOR = 1.0
+# Intervals a contract needs before its bursts are scored
+MIN_OBSERVATIONS = 5
+
+# Event thresholds
+BURST_Z = 4.0
+MIN_BURST_VOLUME = 100
+VOL_OI_THRESHOLD = 1.0
+PREMIUM_THRESHOLD = 250_000
+CONTRACT_MULTIPLIER = vol_oi_ring.CONTRACT_MULTIPLIER
+
+# Time-of-day profile: market-wide volume rate per slot of the day, learned at PROFILE_ALPHA per
+# session (a slot is updated by every cycle inside it, in proportion to the minutes it covers)
+PROFILE_SLOT_MINUTES = 30
+PROFILE_ALPHA = 0.2
+FACTOR_LIMITS = (0.25, 4.0)
+
+EVENT_COLUMNS = ["timestamp", "expirationDays", "strikePrice", "putCall", "volume", "rate", "baseline", "zscore",
+                 "vol_oi", "premium", "mark", "score", "reasons"]
+
+
+def state_path(day, index="SPX", root=ACTIVITY_DIR):
+    """Path of the detector state of one index and day."""
+    return Path(root) / f"{index}_{day:%Y%m%d}.npz"
+
+
+def profile_path(index="SPX", root=ACTIVITY_DIR):
+    """Path of an index's time-of-day profile."""
+    return Path(root) / f"{index}_profile.npz"
+
+# ---------------------------- Time-of-Day Profile ---------------------------- #
+
+class TimeOfDayProfile:
+    """rates[slot] is the learned market-wide volume rate of that slot of the day (0 until learned)."""
+
+    def __init__(self, rates=None):
+        self.rates = rates if rates is not None else np.zeros(24 * 60 // PROFILE_SLOT_MINUTES)
+
+    def factor(self, minute):
+        """The slot's rate relative to the average learned slot (1 while the slot is not learned)."""
+        rate = self.rates[minute // PROFILE_SLOT_MINUTES]
+        learned = self.rates[self.rates > 0]
+        if rate <= 0 or not len(learned):
+            return 1.0
+        return float(np.clip(rate / learned.mean(), *FACTOR_LIMITS))
+
+    def update(self, minute, rate, elapsed):
+        """Fold the market-wide rate of an interval of `elapsed` minutes into its slot."""
+        slot = minute // PROFILE_SLOT_MINUTES
+        if self.rates[slot] <= 0:
+            self.rates[slot] = rate
+        else:
+            weight = min(1.0, PROFILE_ALPHA * elapsed / PROFILE_SLOT_MINUTES)
+            self.rates[slot] += weight * (rate - self.rates[slot])
+
+    def save(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, rates=self.rates)
+
+    @classmethod
+    def load(cls, path):
+        """The saved profile, or an unlearned one."""
+        if not Path(path).exists():
+            return cls()
+        with np.load(path) as data:
+            return cls(data["rates"])
+
+# ---------------------------- Detector ---------------------------- #
+
+class ActivityDetector:
+    """
+    Per-contract state on the strike x expiration x side grid (expirations are date ordinals):
+    the cumulative volume at the last cycle (NaN before a contract is seen), the EWMA of its
+    normalized volume rate, the Welford count / mean / M2 of that rate, and whether its day
+    vol/OI already crossed the threshold. timestamp is the last cycle's.
+    """
+
+    def __init__(self, strikes=(), expirations=(), state=None, timestamp=""):
+        self.strikes = np.asarray(strikes, dtype=np.float64)
+        self.expirations = np.asarray(expirations, dtype=np.int64)
+        self.state = state if state is not None else self._blank((len(self.strikes), len(self.expirations), len(SIDES)))
+        self.timestamp = timestamp
+
+    @staticmethod
+    def _blank(shape):
+        return {
+            "volume": np.full(shape, np.nan),
+            "ewma": np.zeros(shape),
+            "count": np.zeros(shape, dtype=np.int32),
+            "mean": np.zeros(shape),
+            "m2": np.zeros(shape),
+            "crossed": np.zeros(shape, dtype=bool),
+        }
+
+    def _grow(self, strikes, expirations):
+        """Extend the strike / expiration axes with values not seen yet (existing contracts keep their state)."""
+        new_strikes = np.union1d(self.strikes, strikes)
+        new_expirations = np.union1d(self.expirations, expirations)
+        if len(new_strikes) == len(self.strikes) and len(new_expirations) == len(self.expirations):
+            return
+        s = np.searchsorted(new_strikes, self.strikes)
+        e = np.searchsorted(new_expirations, self.expirations)
+        state = self._blank((len(new_strikes), len(new_expirations), len(SIDES)))
+        for name, values in self.state.items():
+            state[name][s[:, None], e] = values
+        self.strikes, self.expirations, self.state = new_strikes, new_expirations, state
+
+    def _grid(self, table, columns, s, e, fill):
+        """Table columns (one per side) scattered onto the grid."""
+        grid = np.full((len(self.strikes), len(self.expirations), len(SIDES)), fill, dtype=np.float64)
+        grid[s, e] = table[columns].to_numpy(dtype=np.float64)
+        return grid
+
+    def update(self, table, timestamp, today=None, profile=None):
+        """
+        Score a cycle's contract table (strikePrice, expirationDays, call / put vol, oi and mark)
+        against the baselines, then fold it into them. Returns the cycle's events (EVENT_COLUMNS,
+        highest score first); the first cycle of the day and a re-run of the last one only
+        record the volumes.
+        """
+        today = today or datetime.now().date()
+        profile = profile or TimeOfDayProfile()
+        strikes = table["strikePrice"].to_numpy(dtype=np.float64)
+        expirations = today.toordinal() + table["expirationDays"].to_numpy(dtype=np.int64)
+        self._grow(strikes, expirations)
+        s = np.searchsorted(self.strikes, strikes)
+        e = np.searchsorted(self.expirations, expirations)
+        volume = self._grid(table, [f"{side} vol" for side in SIDES], s, e, np.nan)
+        oi = self._grid(table, [f"{side} oi" for side in SIDES], s, e, 0.0)
+        mark = self._grid(table, [f"{side} mark" for side in SIDES], s, e, 0.0)
+        present = ~np.isnan(volume)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vol_oi = np.where(oi > 0, volume / oi, np.nan)
+        crossing = present & (vol_oi >= VOL_OI_THRESHOLD)
+
+        state = self.state
+        now = datetime.strptime(timestamp, vol_oi_ring.TIMESTAMP_FORMAT)
+        elapsed = (now - datetime.strptime(self.timestamp, vol_oi_ring.TIMESTAMP_FORMAT)).total_seconds() / 60 \
+            if self.timestamp else 0.0
+        if elapsed <= 0:
+            # Contracts already past the vol/OI threshold when first seen are not crossings
+            state["volume"] = np.where(present, volume, state["volume"])
+            state["crossed"] |= crossing
+            self.timestamp = timestamp
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+
+        seen = present & ~np.isnan(state["volume"])
+        traded = np.where(seen, np.maximum(volume - np.nan_to_num(state["volume"]), 0), 0)
+        minute = vol_oi_ring.minute_of_day(timestamp)
+        factor = profile.factor(minute)
+        rate = traded / elapsed / factor
+
+        # Score against the baselines before this interval is folded in
+        count = state["count"]
+        variance = np.divide(state["m2"], count - 1, out=np.zeros_like(state["m2"]), where=count > 1)
+        zscore = (rate - state["ewma"]) / np.maximum(np.sqrt(variance), STD_FLOOR)
+        premium = traded * mark * CONTRACT_MULTIPLIER
+        triggers = {
+            "burst": seen & (count >= MIN_OBSERVATIONS) & (zscore >= BURST_Z) & (traded >= MIN_BURST_VOLUME),
+            "vol/oi": seen & crossing & ~state["crossed"],
+            "premium": seen & (premium >= PREMIUM_THRESHOLD),
+        }
+        ratios = {
+            "burst": zscore / BURST_Z,
+            "vol/oi": vol_oi / VOL_OI_THRESHOLD,
+            "premium": premium / PREMIUM_THRESHOLD,
+        }
+        events = self._events(timestamp, today, triggers, ratios, traded, rate * factor, state["ewma"] * factor,
+                              zscore, vol_oi, premium, mark)
+
+        # EWMA and Welford updates of the contracts traded this interval
+        first = seen & (count == 0)
+        state["ewma"] = np.where(first, rate, np.where(seen, state["ewma"] + EWMA_ALPHA * (rate - state["ewma"]),
+                                                         state["ewma"]))
+        state["count"] = count + seen
+        delta = np.where(seen, rate - state["mean"], 0)
+        state["mean"] += np.divide(delta, state["count"], out=np.zeros_like(delta), where=seen)
+        state["m2"] += np.where(seen, delta * (rate - state["mean"]), 0)
+        state["volume"] = np.where(present, volume, state["volume"])
+        state["crossed"] |= crossing
+        profile.update(minute, traded.sum() / elapsed, elapsed)
+        self.timestamp = timestamp
+        return events
+
+    def _events(self, timestamp, today, triggers, ratios, traded, rate, baseline, zscore, vol_oi, premium, mark):
+        """Rows of the triggered contracts: score = sum of each triggered signal over its threshold."""
+        fired = np.zeros(traded.shape, dtype=bool)
+        score = np.zeros(traded.shape)
+        for name, mask in triggers.items():
+            fired |= mask
+            score += np.where(mask, ratios[name], 0)
+        s, e, side = np.nonzero(fired)
+        if not len(s):
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+        reasons = [",".join(name for name, mask in triggers.items() if mask[cell]) for cell in zip(s, e, side)]
+        cells = (s, e, side)
+        events = pd.DataFrame({
+            "timestamp": timestamp,
+            "expirationDays": self.expirations[e] - today.toordinal(),
+            "strikePrice": self.strikes[s],
+            "putCall": np.array(PUT_CALL)[side],
+            "volume": traded[cells],
+            "rate": rate[cells],
+            "baseline": baseline[cells],
+            "zscore": zscore[cells],
+            "vol_oi": vol_oi[cells],
+            "premium": premium[cells],
+            "mark": mark[cells],
+            "score": score[cells],
+            "reasons": reasons,
+        })
+        return events.sort_values("score", ascending=False, ignore_index=True)
+
+    # ---------------------------- Persistence ---------------------------- #
+
+    def save(self, path):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, strikes=self.strikes, expirations=self.expirations, timestamp=np.array(self.timestamp),
+                 **self.state)
+
+    @classmethod
+    def load(cls, path):
+        """A saved detector, or an empty one."""
+        if not Path(path).exists():
+            return cls()
+        with np.load(path) as data:
+            state = {name: data[name] for name in cls._blank((0, 0, 0))}
+            return cls(data["strikes"], data["expirations"], state, str(data["timestamp"]))
+
+
+def detect(table, timestamp, today=None, index="SPX", root=ACTIVITY_DIR):
+    """
+    Run a cycle's contract table through the day's detector (created on the first cycle) and
+    the index's time-of-day profile, saving both. Returns the cycle's events.
+    """
+    today = today or datetime.now().date()
+    detector = ActivityDetector.load(state_path(today, index, root))
+    profile = TimeOfDayProfile.load(profile_path(index, root))
+    events = detector.update(table, timestamp, today, profile)
+    detector.save(state_path(today, index, root))
+    profile.save(profile_path(index, root))
+    return events
@@ -6,6 +6,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 import datetime
 
+from processing import chart_shell, heatmap, schema
+
 # ----------------------------
 # Define project paths
 # ----------------------------
@@ -14,6 +16,10 @@ INPUT_DIR = PROJECT_ROOT / "outputs" / "vol_oi"
 OUTPUT_DIR = PROJECT_ROOT / "visualization" / "vol_oi" / "tryouts"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Strike x expiration layers (calls - puts) drawn as heatmaps, and the buffers they are built in
+HEATMAP_LAYERS = {"volume": ("call vol", "put vol"), "oi": ("call oi", "put oi")}
+engine = heatmap.HeatmapEngine()
+
 # ----------------------------
 # Define file patterns to process
 # ----------------------------
@@ -177,7 +183,30 @@ else:
         output_file1 = OUTPUT_DIR / f"{csv_file.stem}_visualization1.html"
         output_file4 = OUTPUT_DIR / f"{csv_file.stem}_visualization4.html"
         
-        fig1.write_html(str(output_file1))
-        fig4.write_html(str(output_file4))
+        chart_shell.write_figure(fig1, output_file1)
+        chart_shell.write_figure(fig4, output_file4)
         
         print(f"Saved:\n  {output_file1}\n  {output_file4}")
+
+        # =========================
+        # 7) STRIKE x EXPIRATION HEATMAPS (calls - puts), pivoted from the wide rows
+        # =========================
+        df_raw["expirationDays"] = schema.expiration_days(df_raw["expirationDate"], system_today)
+        grids = engine.pivot(df_raw, [col for cols in HEATMAP_LAYERS.values() for col in cols],
+                             system_today, strike="strike")
+        for layer, (call_col, put_col) in HEATMAP_LAYERS.items():
+            calls, puts = grids[call_col], grids[put_col]
+            fig = go.Figure(go.Heatmap(
+                z=calls.values - puts.values,
+                x=[str(d) for d in calls.expiration_dates()],
+                y=calls.strikes,
+                colorscale="RdBu",
+                zmid=0,
+                hovertemplate="%{y} %{x}: %{z}<extra></extra>"
+            ))
+            fig.add_hline(y=spot_price, line_dash="dash", line_color="grey")
+            fig.update_layout(template="plotly_dark", title=f"Call - Put {layer} by strike and expiration",
+                              xaxis_title="Expiration", yaxis_title="Strike")
+            output_heatmap = OUTPUT_DIR / f"{csv_file.stem}_{layer}_heatmap.html"
+            chart_shell.write_figure(fig, output_heatmap)
+            print(f"Saved:\n  {output_heatmap}")
@@ -1,11 +1,13 @@
 import pandas as pd
-from datetime import datetime, timedelta, date
+from datetime import datetime
 import json
-import calendar
 from pathlib import Path
 from filelock import FileLock
 from loguru import logger
 
+from processing import expiration_buckets, history_store, market_context, schema
+from processing.oi_vol import activity_detector, vol_oi_ring
+
 # ---------------------------- Configuration ---------------------------- #
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
@@ -17,6 +19,11 @@ OUTPUT_FILE_0DTE = PROJECT_ROOT / "outputs" / "vol_oi" / "0DTE_vol_oi.csv"
 OUTPUT_FILE_1DTE = PROJECT_ROOT / "outputs" / "vol_oi" / "1DTE_vol_oi.csv"
 OUTPUT_FILE_EoW  = PROJECT_ROOT / "outputs" / "vol_oi" / "EoW_vol_oi.csv" 
 OUTPUT_FILE_EoM  = PROJECT_ROOT / "outputs" / "vol_oi" / "EoM_vol_oi.csv"
+OUTPUT_FILES = {"0DTE": OUTPUT_FILE_0DTE, "1DTE": OUTPUT_FILE_1DTE, "EoW": OUTPUT_FILE_EoW, "EoM": OUTPUT_FILE_EoM}
+# Index of this stage's chain (the NDX pipeline has its own ndx_* scripts)
+INDEX = "SPX"
+# Day's traded premium per side (cumulative volume deltas x mark x 100, kept by the snapshot ring)
+PREMIUM_COLUMNS = ["call premium", "put premium"]
 
 # Configure logger
 LOG_DIR = PROJECT_ROOT / "logs" / "vol_oi"
@@ -32,9 +39,9 @@ logger.add(
 # ---------------------------- Utility Functions ---------------------------- #
 
 def load_data(file_path):
-    """Load the input Excel file."""
+    """Load the input Excel file (chain schema); the IV stage passes its in-memory chain instead."""
     try:
-        data = pd.read_excel(file_path)
+        data = schema.enforce(pd.read_excel(file_path), "chain")
         logger.info(f"Successfully loaded data from {file_path}")
         return data
     except Exception as e:
@@ -54,74 +61,63 @@ def load_expiration_config(config_file):
         logger.error(f"Error loading expiration config from {config_file}: {e}")
         raise
 
-def extract_spot_price(file_path):
-    """Extract the spot price from cell O2."""
+def extract_spot_price(data, context=None):
+    """Spot price from this cycle's market context, else from the already loaded chain's spotPrice column."""
+    if context is not None:
+        logger.info(f"Spot price from market context ({context.timestamp}): {context.spot}")
+        return context.spot
     try:
-        spot_price = pd.read_excel(file_path, header=None).iloc[1, 14]
-        logger.info(f"Spot price extracted: {spot_price}")
+        spot_price = data["spotPrice"].dropna().iloc[0]
+        logger.warning(f"No market context found; spot price taken from the chain: {spot_price}")
         return spot_price
     except Exception as e:
-        logger.error(f"Error extracting spot price from {file_path}: {e}")
+        logger.error(f"Error extracting spot price from the chain: {e}")
         raise
 
-def filter_data_by_strike_range(data, spot_price, range_width=500):
-    """Filter data to include strikes within the specified range of the spot price."""
+def vol_oi_table(data, spot_price, range_width=500):
+    """
+    Volume, open interest and mark per (expiration, strike) with calls and puts side by side,
+    for the strikes within range_width of spot: one groupby over the chain, unstacked on
+    putCall. Every bucket is an expiration range of this table. The day's traded premium
+    columns start at 0 and are filled from the snapshot ring (attach_premium).
+    """
     try:
-        strike_min = spot_price - range_width
-        strike_max = spot_price + range_width
-        filtered_data = data[(data['strikePrice'] >= strike_min) & (data['strikePrice'] <= strike_max)]
-        logger.info(f"Filtered data to {len(filtered_data)} rows within ±{range_width} range.")
-        return filtered_data
+        rows = data[data["strikePrice"].between(spot_price - range_width, spot_price + range_width)
+                    & (data["expirationDays"] >= 0)]
+        table = (rows.groupby(["expirationDays", "strikePrice", "putCall"], observed=True)
+                 .agg({"totalVolume": "sum", "openInterest": "sum", "mark": "mean"})
+                 .unstack("putCall", fill_value=0)
+                 .reindex(columns=pd.MultiIndex.from_product([["totalVolume", "openInterest", "mark"], ["CALL", "PUT"]]),
+                          fill_value=0))
+        table.columns = ["call vol", "put vol", "call oi", "put oi", "call mark", "put mark"]
+        counts = ["call vol", "call oi", "put vol", "put oi"]
+        table = table[counts + ["call mark", "put mark"]].reset_index()
+        table[counts] = table[counts].round().astype("int64")
+        table[PREMIUM_COLUMNS] = 0.0
+        logger.info(f"Pivoted {len(rows)} contracts within ±{range_width} into {len(table)} strike/expiration rows.")
+        return table
     except Exception as e:
-        logger.error(f"Error filtering data by strike range: {e}")
+        logger.error(f"Error computing vol/oi table: {e}")
         raise
 
-def compute_vol_oi_columns(data):
-    """Compute volume and open interest columns for calls and puts."""
-    try:
-        data['call vol'] = data.apply(lambda row: row['totalVolume'] if row['putCall'] == 'CALL' else 0, axis=1)
-        data['call oi'] = data.apply(lambda row: row['openInterest'] if row['putCall'] == 'CALL' else 0, axis=1)
-        data['put vol'] = data.apply(lambda row: row['totalVolume'] if row['putCall'] == 'PUT' else 0, axis=1)
-        data['put oi'] = data.apply(lambda row: row['openInterest'] if row['putCall'] == 'PUT' else 0, axis=1)
-        logger.info("Computed volume and open interest columns.")
-        return data
-    except Exception as e:
-        logger.error(f"Error computing vol/oi columns: {e}")
-        raise
-
-def filter_by_date_range(data, start_date, end_date):
-    """Filter data by expiration date range (inclusive)."""
-    try:
-        # Convert expirationDate to a date (if not already)
-        data['expirationDate'] = pd.to_datetime(data['expirationDate']).dt.date
-        filtered = data[(data['expirationDate'] >= start_date) & (data['expirationDate'] <= end_date)]
-        logger.info(f"Filtered data to {len(filtered)} rows between {start_date} and {end_date}.")
-        return filtered
-    except Exception as e:
-        logger.error(f"Error filtering data by date range: {e}")
-        raise
-
-def process_bucket_data(data, timestamp, spot_price):
-    """Group and aggregate data for a given expiration bucket."""
-    try:
-        grouped_data = data.groupby(['strikePrice', 'expirationDate']).agg({
-            'call vol': 'sum',
-            'call oi': 'sum',
-            'put vol': 'sum',
-            'put oi': 'sum'
-        }).reset_index()
-
-        grouped_data['timestamp'] = timestamp
-        grouped_data['spotPrice'] = spot_price
-        grouped_data.rename(columns={'strikePrice': 'strike'}, inplace=True)
-
-        # Sort data by expirationDate and strike
-        grouped_data = grouped_data.sort_values(by=['expirationDate', 'strike'])
-        logger.info("Processed and sorted bucket data successfully.")
-        return grouped_data
-    except Exception as e:
-        logger.error(f"Error processing bucket data: {e}")
-        raise
+def bucket_table(table, bucket, today, timestamp, spot_price):
+    """A bucket's rows of the vol/oi table in the CSV layout (expirationDays kept for the store)."""
+    rows = expiration_buckets.bucket_view(table, bucket, today)
+    return pd.DataFrame({
+        "strike": rows["strikePrice"],
+        "expirationDate": schema.expiration_dates(rows["expirationDays"], today),
+        "call vol": rows["call vol"],
+        "call oi": rows["call oi"],
+        "put vol": rows["put vol"],
+        "put oi": rows["put oi"],
+        "timestamp": timestamp,
+        "spotPrice": spot_price,
+        "call premium": rows["call premium"],
+        "put premium": rows["put premium"],
+        "call mark": rows["call mark"],
+        "put mark": rows["put mark"],
+        "expirationDays": rows["expirationDays"],
+    }).reset_index(drop=True)
 
 def ensure_output_directories(*output_files):
     """Ensure the output directories exist."""
@@ -144,63 +140,96 @@ def save_data_to_csv(data, file_path):
         logger.error(f"Error saving data to {file_path}: {e}")
         raise
 
+def record_vol_oi(data, cycle_ts):
+    """
+    Record a bucket's vol/oi rows (the widest processed; the narrower buckets are expiration
+    ranges of it) in the day's history store under the cycle's timestamp.
+    """
+    try:
+        rows = history_store.append_vol_oi(data, INDEX, cycle_ts)
+        logger.info(f"Recorded {rows} vol/oi rows for cycle {cycle_ts} in {history_store.store_path()}")
+    except Exception as e:
+        logger.error(f"Could not record vol/oi in the history store: {e}")
+
+def record_activity(data, cycle_ts, today):
+    """
+    Run the cycle's contracts through the unusual activity detector and record its events in
+    the day's history store (shown on the NG page).
+    """
+    try:
+        events = activity_detector.detect(data, cycle_ts, today, INDEX)
+        logger.info(f"Activity detector: {len(events)} event(s) for cycle {cycle_ts}.")
+        if not events.empty:
+            history_store.append_activity(events, INDEX)
+            top = events.iloc[0]
+            logger.info(f"Top event: {top['putCall']} {top['strikePrice']} exp+{top['expirationDays']} "
+                        f"({top['reasons']}, score {top['score']:.2f}).")
+    except Exception as e:
+        logger.error(f"Could not run the activity detector: {e}")
+
+def record_ring(data, cycle_ts, today):
+    """
+    Add the cycle's vol/oi rows to the day's per-minute snapshot ring (read by vol_oi_tracker),
+    which prices the volume traded since the previous cycle. Returns the ring (None on failure).
+    """
+    try:
+        ring = vol_oi_ring.record(data, cycle_ts, today, INDEX)
+        logger.info(f"Vol/oi ring minute {ring.last_minute} recorded ({len(ring.strikes)} strikes x "
+                    f"{len(ring.expirations)} expirations, minutes {ring.first_minute}..{ring.last_minute}).")
+        return ring
+    except Exception as e:
+        logger.error(f"Could not record vol/oi in the snapshot ring: {e}")
+        return None
+
+def attach_premium(table, ring, today):
+    """Fill the table's premium columns with the day's traded premium from the ring."""
+    if ring is None:
+        logger.warning("No snapshot ring this cycle; premium columns left at 0.")
+        return table
+    table[PREMIUM_COLUMNS] = ring.latest(table, today, "premium")
+    logger.info(f"Traded premium today: calls {table['call premium'].sum():,.0f}, "
+                f"puts {table['put premium'].sum():,.0f}.")
+    return table
+
 # ---------------------------- Main Processing ---------------------------- #
 
-def process_vol_oi_data():
-    """Main function to process vol/oi data for various expiration buckets."""
+def process_vol_oi_data(data=None, context=None):
+    """
+    Vol/oi tables of the configured expiration buckets from the chain. The IV stage passes the
+    chain it already loaded and the cycle's market context; run on its own, the stage reads them.
+    """
     try:
         logger.info("Starting vol/oi data processing...")
 
         # Load expiration config
         expiration_config = load_expiration_config(CONFIG_FILE)
-        if expiration_config == "All":
-            buckets_to_process = ["0DTE", "1DTE", "EoW", "EoM"]
-        else:
-            buckets_to_process = [expiration_config]
-
-        # Load input data and extract the spot price
-        data = load_data(INPUT_FILE)
-        spot_price = extract_spot_price(INPUT_FILE)
+        buckets_to_process = expiration_buckets.selected_buckets(expiration_config)
 
-        # Filter data by strike range
-        data = filter_data_by_strike_range(data, spot_price, range_width=500)
+        if data is None:
+            data = load_data(INPUT_FILE)
+        if context is None:
+            context = market_context.load()
+        spot_price = extract_spot_price(data, context)
 
-        # Compute vol/oi columns once for the entire dataset
-        data = compute_vol_oi_columns(data)
+        # One pivot for the strike range; the buckets are expiration ranges of it
+        table = vol_oi_table(data, spot_price, range_width=500)
+        ensure_output_directories(*OUTPUT_FILES.values())
 
-        # Ensure output directories exist
-        ensure_output_directories(OUTPUT_FILE_0DTE, OUTPUT_FILE_1DTE, OUTPUT_FILE_EoW, OUTPUT_FILE_EoM)
-
-        # Define date boundaries
         today_date = datetime.today().date()
-        tomorrow_date = today_date + timedelta(days=1)
-        end_of_week = today_date + timedelta(days=(6 - today_date.weekday()))
-        last_day = calendar.monthrange(today_date.year, today_date.month)[1]
-        end_of_month = date(today_date.year, today_date.month, last_day)
-
-        # Get current timestamp for metadata
         current_timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-        # Process each bucket according to the expiration config
-        if "0DTE" in buckets_to_process:
-            bucket_data = filter_by_date_range(data, today_date, today_date)
-            processed_data = process_bucket_data(bucket_data, current_timestamp, spot_price)
-            save_data_to_csv(processed_data, OUTPUT_FILE_0DTE)
-
-        if "1DTE" in buckets_to_process:
-            bucket_data = filter_by_date_range(data, today_date, tomorrow_date)
-            processed_data = process_bucket_data(bucket_data, current_timestamp, spot_price)
-            save_data_to_csv(processed_data, OUTPUT_FILE_1DTE)
-
-        if "EoW" in buckets_to_process:
-            bucket_data = filter_by_date_range(data, today_date, end_of_week)
-            processed_data = process_bucket_data(bucket_data, current_timestamp, spot_price)
-            save_data_to_csv(processed_data, OUTPUT_FILE_EoW)
-
-        if "EoM" in buckets_to_process:
-            bucket_data = filter_by_date_range(data, today_date, end_of_month)
-            processed_data = process_bucket_data(bucket_data, current_timestamp, spot_price)
-            save_data_to_csv(processed_data, OUTPUT_FILE_EoM)
+        cycle_ts = history_store.cycle_timestamp(context)
+
+        # The ring prices this cycle's volume first, so every table carries the premium
+        widest = expiration_buckets.widest_bucket(buckets_to_process, today_date)
+        widest_rows = expiration_buckets.bucket_view(table, widest, today_date)
+        ring = record_ring(widest_rows, cycle_ts, today_date)
+        table = attach_premium(table, ring, today_date)
+        record_activity(widest_rows, cycle_ts, today_date)
+
+        for bucket in buckets_to_process:
+            processed_data = bucket_table(table, bucket, today_date, current_timestamp, spot_price)
+            save_data_to_csv(processed_data.drop(columns="expirationDays"), OUTPUT_FILES[bucket])
+        record_vol_oi(bucket_table(table, widest, today_date, current_timestamp, spot_price), cycle_ts)
 
         logger.info("Files saved successfully for buckets: " + ", ".join(buckets_to_process))
     except Exception as e:
@@ -0,0 +1,286 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pathlib import Path
+
+from processing import expiration_buckets
+
+# ---------------------------- Vol/OI Snapshot Ring ---------------------------- #
+# Per-minute volume snapshots of the session, strike x expiration x side, in a ring of
+# `capacity` minutes memory-mapped to one .npy file per index and day (axes, open interest
+# and the filled minute range in a small .npz next to it). The chain's totalVolume is the
+# day's cumulative volume, so each slot already holds a prefix sum: minutes a cycle skipped
+# carry the previous value forward, and the volume traded over any window of w minutes is
+# volume[now] - volume[now - w], whatever the window length.
+#
+# The traded premium is kept the same way in a second ring: each snapshot adds the volume
+# traded since the previous one times the contract's mark x 100, so the premium of any window
+# is a difference of two slots too. The volume a contract traded before its first snapshot
+# of the day is priced at that snapshot's mark.
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+RING_DIR = PROJECT_ROOT / "outputs" / "vol_oi" / "ring"
+SIDES = ["call", "put"]
+PUT_CALL = ["CALL", "PUT"]
+# Minutes kept (a full session plus the pre-market)
+CAPACITY = 512
+CONTRACT_MULTIPLIER = 100
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def ring_paths(day, index="SPX", root=RING_DIR):
+    """(.npy volume ring, .npy premium ring, .npz axes) of one index and day."""
+    stem = Path(root) / f"{index}_{day:%Y%m%d}"
+    return stem.with_suffix(".npy"), stem.with_name(f"{stem.name}_premium.npy"), stem.with_suffix(".npz")
+
+
+def minute_of_day(timestamp):
+    """Minutes since midnight of a "YYYY-MM-DD HH:MM:SS" timestamp."""
+    moment = datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+    return moment.hour * 60 + moment.minute
+
+
+class VolOiRing:
+    """
+    volume[minute % capacity, strike, expiration, side] is the cumulative volume at that minute,
+    premium[...] the cumulative traded premium and open_interest[strike, expiration, side] the
+    latest open interest. Expirations are date ordinals. first_minute / last_minute bound the
+    filled minutes (-1 when empty).
+    """
+
+    def __init__(self, strikes, expirations, volume, premium, open_interest, first_minute=-1, last_minute=-1,
+                 timestamp="", path=None, premium_path=None):
+        self.strikes = np.asarray(strikes, dtype=np.float64)
+        self.expirations = np.asarray(expirations, dtype=np.int64)
+        self.volume = volume
+        self.premium = premium
+        self.open_interest = open_interest
+        self.first_minute = first_minute
+        self.last_minute = last_minute
+        self.timestamp = timestamp
+        self.path = path
+        self.premium_path = premium_path
+
+    @property
+    def capacity(self):
+        return self.volume.shape[0]
+
+    @classmethod
+    def empty(cls, capacity=CAPACITY, path=None, premium_path=None):
+        """Ring with no strikes or expirations yet (memory-mapped to the paths when given)."""
+        ring = cls([], [], None, None, np.zeros((0, 0, len(SIDES)), dtype=np.float32), path=path,
+                   premium_path=premium_path)
+        ring.volume = ring._allocate((capacity, 0, 0, len(SIDES)), ring.path, np.float32)
+        ring.premium = ring._allocate((capacity, 0, 0, len(SIDES)), ring.premium_path, np.float64)
+        return ring
+
+    @staticmethod
+    def _allocate(shape, path, dtype):
+        """Zeroed ring array, memory-mapped to its file when there is one."""
+        if path is None:
+            return np.zeros(shape, dtype=dtype)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+
+    def _grow(self, strikes, expirations):
+        """Extend the strike / expiration axes with values not seen yet (existing cells keep their data)."""
+        new_strikes = np.union1d(self.strikes, strikes)
+        new_expirations = np.union1d(self.expirations, expirations)
+        if len(new_strikes) == len(self.strikes) and len(new_expirations) == len(self.expirations):
+            return
+        s = np.searchsorted(new_strikes, self.strikes)
+        e = np.searchsorted(new_expirations, self.expirations)
+        shape = (self.capacity, len(new_strikes), len(new_expirations), len(SIDES))
+        volume, premium = np.array(self.volume), np.array(self.premium)
+        self.volume = self.premium = None  # release the old mappings before the files are rewritten
+        self.volume = self._allocate(shape, self.path, np.float32)
+        self.volume[:, s[:, None], e] = volume
+        self.premium = self._allocate(shape, self.premium_path, np.float64)
+        self.premium[:, s[:, None], e] = premium
+        open_interest = np.zeros((len(new_strikes), len(new_expirations), len(SIDES)), dtype=np.float32)
+        open_interest[s[:, None], e] = self.open_interest
+        self.strikes, self.expirations, self.open_interest = new_strikes, new_expirations, open_interest
+
+    # ---------------------------- Updates ---------------------------- #
+
+    def push(self, table, timestamp, today=None):
+        """
+        Record a cycle's vol/oi table (strikePrice, expirationDays, call / put vol, oi and mark)
+        at the minute of its timestamp, with the premium traded since the previous snapshot.
+        Minutes since the previous snapshot carry it forward; a later snapshot in the same
+        minute replaces it.
+        """
+        today = today or datetime.now().date()
+        strikes = table["strikePrice"].to_numpy(dtype=np.float64)
+        expirations = today.toordinal() + table["expirationDays"].to_numpy(dtype=np.int64)
+        self._grow(strikes, expirations)
+        s = np.searchsorted(self.strikes, strikes)
+        e = np.searchsorted(self.expirations, expirations)
+        volume = table[[f"{side} vol" for side in SIDES]].to_numpy(dtype=np.float32)
+        oi = table[[f"{side} oi" for side in SIDES]].to_numpy(dtype=np.float32)
+        mark = table[[f"{side} mark" for side in SIDES]].to_numpy(dtype=np.float64)
+
+        minute = minute_of_day(timestamp)
+        if self.last_minute < 0 or minute < self.last_minute:
+            self.first_minute = minute
+            self.volume[minute % self.capacity] = 0
+            self.premium[minute % self.capacity] = 0
+            previous_volume = previous_premium = 0.0
+        else:
+            last = self.last_minute % self.capacity
+            previous_volume = self.volume[last][s, e].astype(np.float64)
+            previous_premium = self.premium[last][s, e]
+            if minute > self.last_minute:
+                for ring in (self.volume, self.premium):
+                    previous = ring[last].copy()
+                    for skipped in range(max(self.last_minute + 1, minute - self.capacity + 1), minute + 1):
+                        ring[skipped % self.capacity] = previous
+                self.first_minute = max(self.first_minute, minute - self.capacity + 1)
+        traded = np.maximum(volume - previous_volume, 0)
+        self.volume[minute % self.capacity][s, e] = volume
+        self.premium[minute % self.capacity][s, e] = previous_premium + traded * np.nan_to_num(mark) * CONTRACT_MULTIPLIER
+        self.open_interest[s, e] = oi
+        self.last_minute = minute
+        self.timestamp = timestamp
+
+    # ---------------------------- Windows ---------------------------- #
+
+    def _mask(self, today, bucket):
+        """Expirations of a bucket (every unexpired one without a bucket)."""
+        days = self.expirations - today.toordinal()
+        return days >= 0 if bucket is None else expiration_buckets.bucket_mask(days, bucket, today)
+
+    def _latest(self, ring, mask):
+        """A ring's last slot on a bucket's expirations (float64)."""
+        if self.last_minute < 0:
+            return np.zeros((len(self.strikes), int(mask.sum()), len(SIDES)))
+        return ring[self.last_minute % self.capacity][:, mask].astype(np.float64)
+
+    def window(self, minutes, today=None, bucket=None, field="volume"):
+        """
+        Volume (or premium, field="premium") traded over the last `minutes` minutes per
+        (strike, expiration, side) of a bucket's expirations: (expirations, delta[strike,
+        expiration, side]). A window reaching past the first snapshot starts at it.
+        """
+        today = today or datetime.now().date()
+        mask = self._mask(today, bucket)
+        ring = self.premium if field == "premium" else self.volume
+        if self.last_minute < 0:
+            return self.expirations[mask], np.zeros((len(self.strikes), int(mask.sum()), len(SIDES)))
+        start = max(self.first_minute, self.last_minute - minutes)
+        before = ring[start % self.capacity][:, mask]
+        return self.expirations[mask], self._latest(ring, mask) - before
+
+    def window_table(self, minutes, today=None, bucket=None):
+        """
+        Per-strike table of a bucket (the tracker layout): day volume and open interest per side,
+        the volume traded over the window (call_vol_chng / put_vol_chng), day volume / OI, then
+        the day premium and the premium traded over the window (call_prem_chng / put_prem_chng).
+        """
+        today = today or datetime.now().date()
+        mask = self._mask(today, bucket)
+        volume = self._latest(self.volume, mask).sum(axis=1)
+        premium = self._latest(self.premium, mask).sum(axis=1)
+        oi = self.open_interest[:, mask].sum(axis=1)
+        delta = self.window(minutes, today, bucket)[1].sum(axis=1)
+        premium_delta = self.window(minutes, today, bucket, "premium")[1].sum(axis=1)
+        traded = (volume > 0).any(axis=1) | (oi > 0).any(axis=1)
+        table = pd.DataFrame({"strike": self.strikes})
+        for i, side in enumerate(SIDES):
+            table[f"{side} vol"] = volume[:, i]
+            table[f"{side} oi"] = oi[:, i]
+        table["timestamp"] = self.timestamp
+        for i, side in enumerate(SIDES):
+            table[f"{side}_vol_chng"] = delta[:, i]
+        for i, side in enumerate(SIDES):
+            table[f"{side}_vol/oi"] = np.divide(volume[:, i], oi[:, i], out=np.full(len(oi), np.nan),
+                                                where=oi[:, i] > 0)
+        for i, side in enumerate(SIDES):
+            table[f"{side} premium"] = premium[:, i]
+        for i, side in enumerate(SIDES):
+            table[f"{side}_prem_chng"] = premium_delta[:, i]
+        return table[traded].reset_index(drop=True)
+
+    def top(self, minutes, n=5, today=None, bucket=None):
+        """
+        The n strikes with the most call and the most put volume traded over the window, then
+        the n highest call and put day volume / OI (window_table rows, duplicates dropped).
+        """
+        table = self.window_table(minutes, today, bucket)
+        columns = [f"{side}_vol_chng" for side in SIDES] + [f"{side}_vol/oi" for side in SIDES]
+        return pd.concat([table.nlargest(n, column) for column in columns]).drop_duplicates()
+
+    def premium_blocks(self, minutes=None, n=50, today=None, bucket=None):
+        """
+        The n contracts (strike, expiration, side) of a bucket with the most premium traded over
+        the window (the day so far without one), with their volume over it.
+        """
+        today = today or datetime.now().date()
+        if minutes is None:
+            mask = self._mask(today, bucket)
+            expirations = self.expirations[mask]
+            premium, volume = self._latest(self.premium, mask), self._latest(self.volume, mask)
+        else:
+            expirations, premium = self.window(minutes, today, bucket, "premium")
+            volume = self.window(minutes, today, bucket)[1]
+        s, e, side = np.unravel_index(np.argsort(premium, axis=None)[::-1][:n], premium.shape)
+        blocks = pd.DataFrame({
+            "strike": self.strikes[s],
+            "expirationDays": expirations[e] - today.toordinal(),
+            "putCall": np.array(PUT_CALL)[side],
+            "volume": volume[s, e, side],
+            "premium": premium[s, e, side],
+            "timestamp": self.timestamp,
+        })
+        return blocks[blocks["premium"] > 0].reset_index(drop=True)
+
+    def latest(self, table, today=None, field="premium"):
+        """A field's last-slot values (call, put) at the (strikePrice, expirationDays) rows of a table (0 off the grid)."""
+        today = today or datetime.now().date()
+        values = np.zeros((len(table), len(SIDES)))
+        if self.last_minute < 0 or not len(self.strikes) or not len(self.expirations):
+            return values
+        strikes = table["strikePrice"].to_numpy(dtype=np.float64)
+        expirations = today.toordinal() + table["expirationDays"].to_numpy(dtype=np.int64)
+        s = np.minimum(np.searchsorted(self.strikes, strikes), len(self.strikes) - 1)
+        e = np.minimum(np.searchsorted(self.expirations, expirations), len(self.expirations) - 1)
+        found = (self.strikes[s] == strikes) & (self.expirations[e] == expirations)
+        ring = self.premium if field == "premium" else self.volume
+        values[found] = ring[self.last_minute % self.capacity][s[found], e[found]]
+        return values
+
+    # ---------------------------- Persistence ---------------------------- #
+
+    def save(self, axes_path):
+        """Flush the volume / premium rings and write the axes / open interest / filled range next to them."""
+        for ring in (self.volume, self.premium):
+            if isinstance(ring, np.memmap):
+                ring.flush()
+        np.savez(axes_path, strikes=self.strikes, expirations=self.expirations, open_interest=self.open_interest,
+                 minutes=np.array([self.first_minute, self.last_minute]), timestamp=np.array(self.timestamp))
+
+    @classmethod
+    def open(cls, day=None, index="SPX", mode="r", root=RING_DIR):
+        """
+        A day's ring memory-mapped from its files (mode "r" to read, "r+" to update), or None
+        if it was not created. Use empty(path=...) to start one.
+        """
+        day = day or datetime.now().date()
+        volume_path, premium_path, axes_path = ring_paths(day, index, root)
+        if not all(path.exists() for path in (volume_path, premium_path, axes_path)):
+            return None
+        with np.load(axes_path) as axes:
+            first_minute, last_minute = (int(m) for m in axes["minutes"])
+            return cls(axes["strikes"], axes["expirations"], np.load(volume_path, mmap_mode=mode),
+                       np.load(premium_path, mmap_mode=mode), axes["open_interest"], first_minute, last_minute,
+                       str(axes["timestamp"]), volume_path, premium_path)
+
+
+def record(table, timestamp, today=None, index="SPX", root=RING_DIR):
+    """Push a cycle's vol/oi table into the day's ring (created on the first cycle). Returns the ring."""
+    today = today or datetime.now().date()
+    volume_path, premium_path, axes_path = ring_paths(today, index, root)
+    ring = VolOiRing.open(today, index, "r+", root) or VolOiRing.empty(path=volume_path, premium_path=premium_path)
+    ring.push(table, timestamp, today)
+    ring.save(axes_path)
+    return ring
@@ -4,6 +4,8 @@ from pathlib import Path
 from filelock import FileLock
 from loguru import logger
 
+from processing import chart_shell
+
 # ---------------------------- Configuration ---------------------------- #
 
 PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
@@ -109,7 +111,7 @@ def create_bar_chart(data, call_col, put_col, title, output_file, spot_price):
             )
         )
 
-        fig.write_html(output_file)
+        chart_shell.write_figure(fig, output_file)
         logger.info(f"Saved chart to {output_file}")
     except Exception as e:
         logger.error(f"Error creating chart {title}: {e}")
@@ -235,7 +237,7 @@ def create_bar_chart_split_vol_oi(data, title, output_file, spot_price):
             template="plotly_dark",  # Enforce dark mode
         )
 
-        fig.write_html(output_file)
+        chart_shell.write_figure(fig, output_file)
         logger.info(f"Saved chart to {output_file}")
     except Exception as e:
         logger.error(f"Error creating chart {title}: {e}")
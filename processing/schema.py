@@ -0,0 +1,137 @@
+import pandas as pd
+from datetime import datetime, timedelta
+from pathlib import Path
+from loguru import logger
+
+from processing.iv_models import bs_kernel, iv_compute
+
+# ---------------------------- Frame Schemas ---------------------------- #
+# Column types of the frames passed between pipeline stages. Solver inputs and prices stay
+# float64; IVs, greeks and contract counts are float32; repeated labels are categoricals and
+# the expiration is an int16 day offset from the cycle date ("expirationDays"). The CSVs
+# keep a text expirationDate for the GUI: write_table converts back, read_table parses once.
+# Columns a schema does not list are left as they are.
+
+# Carried by the raw chain but never used after it is read
+DROP_COLUMNS = ["description"]
+
+PUT_CALL = pd.CategoricalDtype(["CALL", "PUT"])
+MODEL = pd.CategoricalDtype(list(iv_compute.MODELS))
+IV_SOURCE = pd.CategoricalDtype(iv_compute.SOURCE_LABELS)
+BUCKET = pd.CategoricalDtype(["0DTE", "1DTE", "EoW", "EoM"])
+
+EXPOSURE_COLUMNS = ["DEX", "GEX", "VEX", "CEX", "VOMEX", "ZOMEX", "SPDEX", "COLEX", "VETEX"]
+
+CHAIN = {
+    "expirationDays": "int16",
+    "strikePrice": "float64",
+    "putCall": PUT_CALL,
+    "spotPrice": "float64",
+    "T": "float64",
+    "SOFR": "float64",
+    "dividend_yield": "float32",
+    "last": "float64",
+    "mark": "float64",
+    "mid": "float64",
+    "bid": "float64",
+    "ask": "float64",
+    "openInterest": "float32",
+    "totalVolume": "float32",
+}
+RESULTS = {
+    **CHAIN,
+    "model": MODEL,
+    "impliedVolatility": "float32",
+    "iv_source": IV_SOURCE,
+    **{greek: "float32" for greek in bs_kernel.GREEK_COLUMNS},
+}
+# Exposures are summed over thousands of contracts, so they keep float64
+EXPOSURES = {
+    **RESULTS,
+    **{col: "float64" for col in EXPOSURE_COLUMNS},
+    "cum_gam": "float64",
+    "cum_vec": "float64",
+    # kClean: strike quoted on both sides in the bucket, and the flip of those strikes only
+    "clean": "bool",
+    "clean_cum_gam": "float64",
+    "clean_cum_vec": "float64",
+}
+RANKING = {
+    "strikePrice": "float64",
+    "Theo ES": "float64",
+    "Rank": "category",
+    "Greek": "category",
+    "Value": "float64",
+    "bucket": BUCKET,
+}
+
+TABLES = {
+    "chain": CHAIN,
+    "results": RESULTS,
+    "exposures": EXPOSURES,
+    "ranking": RANKING,
+}
+
+
+def frame_memory_mb(df):
+    """Deep memory usage of a frame in MB."""
+    return df.memory_usage(deep=True).sum() / 1_048_576
+
+
+def expiration_days(expirations, today):
+    """Day offsets from today for an expiration column (parsed once per distinct value)."""
+    codes, uniques = pd.factorize(expirations)
+    offsets = (pd.to_datetime(uniques) - pd.Timestamp(today)).days.to_numpy()
+    return pd.Series(offsets[codes], index=expirations.index).astype("int16")
+
+
+def expiration_dates(days, today):
+    """Inverse of expiration_days: datetime.date per day offset."""
+    codes, uniques = pd.factorize(days)
+    dates = pd.Series([today + timedelta(days=int(d)) for d in uniques], dtype=object)
+    return pd.Series(dates.to_numpy()[codes], index=days.index)
+
+
+def enforce(df, table, today=None):
+    """
+    Bring a frame to the schema of one of TABLES: drop DROP_COLUMNS, turn expirationDate
+    into expirationDays and cast the listed columns. Logs the memory before and after.
+    """
+    schema = TABLES[table]
+    before = frame_memory_mb(df)
+    df = df.drop(columns=[col for col in DROP_COLUMNS if col in df.columns])
+    if "expirationDays" in schema and "expirationDate" in df.columns:
+        position = df.columns.get_loc("expirationDate")
+        days = expiration_days(df["expirationDate"], today or datetime.now().date())
+        df = df.drop(columns="expirationDate")
+        df.insert(position, "expirationDays", days)
+    casts = {col: dtype for col, dtype in schema.items() if col in df.columns and df[col].dtype != dtype}
+    if casts:
+        df = df.astype(casts)
+    logger.info(f"{table} frame: {before:.2f} MB -> {frame_memory_mb(df):.2f} MB ({len(df)} rows)")
+    return df
+
+
+def read_table(path, table, today=None):
+    """Read a stage CSV straight into the schema (no per-column to_numeric / to_datetime passes)."""
+    schema = TABLES[table]
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [col for col in header if col not in DROP_COLUMNS]
+    dtype = {col: dtype for col, dtype in schema.items() if col in usecols}
+    df = pd.read_csv(path, usecols=usecols, dtype=dtype)
+    return enforce(df, table, today)
+
+
+def write_table(df, path, today=None):
+    """
+    Write a schema frame as CSV, with expirationDays written back as expirationDate. The file
+    is replaced in one step, so readers never see a partially written table.
+    """
+    if "expirationDays" in df.columns:
+        position = df.columns.get_loc("expirationDays")
+        dates = expiration_dates(df["expirationDays"], today or datetime.now().date())
+        df = df.drop(columns="expirationDays")
+        df.insert(position, "expirationDate", dates)
+    tmp = Path(path).with_suffix(".tmp")
+    df.to_csv(tmp, index=False)
+    tmp.replace(path)
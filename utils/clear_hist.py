@@ -38,7 +38,7 @@ def get_folders_sorted_by_date(directory: Path):
 
 
 def delete_old_files(max_folders_to_keep: int):
-    """Deletes all CSV and XLSX files in folders older than the N most recent folders."""
+    """Deletes all CSV, XLSX and history store files in folders older than the N most recent folders."""
     for hist_path in HISTORICAL_PATHS:
         if not hist_path.exists():
             print(f"Skipping non-existent path: {hist_path}")
@@ -55,9 +55,10 @@ def delete_old_files(max_folders_to_keep: int):
 
         for folder, _ in folders_to_delete:
             files_to_delete = list(folder.glob("*.csv")) + list(folder.glob("*.xlsx"))  # 🔹 Targets both file types
+            files_to_delete += list(folder.glob("*.sqlite*"))  # history store (+ its -wal / -shm files)
 
             if not files_to_delete:
-                print(f"📂 No CSV/XLSX files to delete in: {folder}")
+                print(f"📂 No CSV/XLSX/history files to delete in: {folder}")
                 continue
 
             for file in files_to_delete:
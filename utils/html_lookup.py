@@ -3,6 +3,10 @@
 import json
 from pathlib import Path
 
+from PySide6.QtCore import QUrl
+
+from processing import chart_shell
+
 def load_json_file(filepath: Path) -> dict:
     """
     Loads a JSON file and returns its contents as a dictionary.
@@ -37,6 +41,34 @@ def get_html_path(config: dict, key: str) -> str:
     """
     return config.get(key, None)
 
+def push_chart_data(view) -> bool:
+    """
+    Draws the current payload of the chart shell a QWebEngineView shows (Plotly.react in the
+    page, no reload). Connect it to the view's loadFinished so a newly loaded shell is drawn.
+    Returns False when the page has no payload (a chart written as a full page).
+    """
+    html_path = view.url().toLocalFile()
+    script = chart_shell.update_script(html_path) if html_path else None
+    if script is None:
+        return False
+    view.page().runJavaScript(script)
+    return True
+
+def load_chart(view, html_path) -> str:
+    """
+    Shows a chart in a QWebEngineView. A shell already shown only gets its new payload pushed;
+    otherwise the page is loaded once (and drawn by push_chart_data on loadFinished). Charts
+    without a payload are reloaded. Returns "pushed", "loaded" or "reloaded".
+    """
+    url = QUrl.fromLocalFile(str(html_path))
+    if view.url() != url:
+        view.setUrl(url)
+        return "loaded"
+    if push_chart_data(view):
+        return "pushed"
+    view.reload()
+    return "reloaded"
+
 # Example usage:
 if __name__ == "__main__":
     greek_expo_config, vol_oi_config = load_html_configurations()
@@ -3,7 +3,6 @@ import time
 import sys
 import os
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from loguru import logger
 from pathlib import Path
 
@@ -23,31 +22,25 @@ logger.add(
 # ---------------------------- Config Paths ---------------------------- #
 CONFIG_DIR = PROJECT_ROOT / "configs" / "settings"
 INTERVAL_CONFIG = CONFIG_DIR / "interval_config.json"
-KCLEAN_CONFIG = CONFIG_DIR / "kClean_config.json"
 IV_METHOD_CONFIG = CONFIG_DIR / "iv_method_config.json"
 
 # ---------------------------- Script Paths ---------------------------- #
 sequential_scripts_before_iv = [
     "data_retrieval/spx_chain.py",
-    "data_retrieval/spot_prices.py",
+    "data_retrieval.spot_prices",  # quote stage: also writes the cycle's market context
 ]
 
-iv_model_scripts_all = {
-    "Brent Black Scholes": "processing/iv_models/brent_bs.py",
-    "Grok": "processing/iv_models/grok.py",
-    "Hybrid_one": "processing/iv_models/hybrid_one.py",
-}
-
-clean_script = "processing/exposure_calculations/clean.py"  # 🔹 This may be skipped
+# Single IV stage: loads the chain once and runs the selected model(s) (brent_bs, grok, hybrid_one)
+iv_stage_module = "processing.iv_models.iv_stage"
 
+# Entries without ".py" are package modules (they share processing/expiration_buckets.py and exposure_cube.py).
+# abso_expo is the exposure / analytics stage: bucket tables (with the kClean mask), Greek totals,
+# ranked levels and gamma profiles are each written once per cycle. Every stage also records its
+# cycle snapshot (chain, vol/oi, contracts, totals, ranks, gamma flips) in the day's history
+# store (processing/history_store.py), which the NG page queries.
 sequential_scripts_after_iv = [
-    "processing/exposure_calculations/abso_expo.py",
-    clean_script,
-    "processing/exposure_calculations/ranking.py",
-    "processing/exposure_calculations/ratio.py",
-    "processing/exposure_calculations/historical_rankings.py",
-    "processing/exposure_calculations/zeroDTE_plotly.py",
-    "utils/extract_gamma_flip.py"
+    "processing.exposure_calculations.abso_expo",
+    "processing.exposure_calculations.zeroDTE_plotly",
 ]
 
 
@@ -72,7 +65,6 @@ interval_seconds = {
     "60 minutes": 3600
 }.get(load_json_setting(INTERVAL_CONFIG, "60 minutes"), 60)  # Default to 60 seconds
 
-run_clean = load_json_setting(KCLEAN_CONFIG, "Yes") == "Yes"  # Convert to Boolean
 iv_method_selected = load_json_setting(IV_METHOD_CONFIG, "All")  # IV Model selection
 
 # ---------------------------- Helper Functions ---------------------------- #
@@ -87,59 +79,63 @@ def run_script(script_path):
     except Exception as e:
         logger.error(f"⚠️ Unexpected error while running {script_path}: {e}")
 
+def run_module(module_name):
+    """Run a package module (python -m) from the project root and wait for it to complete."""
+    logger.info(f"Running module {module_name}...")
+    try:
+        subprocess.run([sys.executable, "-m", module_name], check=True, cwd=PROJECT_ROOT)
+        logger.info(f"✅ Successfully executed {module_name}")
+    except subprocess.CalledProcessError as e:
+        logger.error(f"❌ Error running {module_name}: {e}")
+    except Exception as e:
+        logger.error(f"⚠️ Unexpected error while running {module_name}: {e}")
+
 def run_sequential_scripts(scripts_list):
-    """Run a list of scripts sequentially."""
+    """Run a list of scripts (file paths) or package modules (dotted names) sequentially."""
     for script in scripts_list:
-        script_full_path = os.path.join(os.getcwd(), script)
-        run_script(script_full_path)
+        if script.endswith(".py"):
+            script_full_path = os.path.join(os.getcwd(), script)
+            run_script(script_full_path)
+        else:
+            run_module(script)
         time.sleep(0.1)  # Sleep for 100ms between scripts to reduce CPU load
 
 def run_vol_oi_scripts():
-    """Run vol_oi_initial.py first, then vol_oi_tracker.py, and finally vol_oi_zero_visual.py."""
-    vol_oi_initial_path = os.path.join(os.getcwd(), "processing/oi_vol/vol_oi_initial.py")
-    vol_oi_tracker_path = os.path.join(os.getcwd(), "processing/oi_vol/vol_oi_tracker.py")
-    vol_oi_visual_path = os.path.join(os.getcwd(), "processing/oi_vol/vol_oi_zero_visual.py")
-    vol_oi_tryouts_path = os.path.join(os.getcwd(), "processing/oi_vol/tryouts.py")
+    """
+    Run vol_oi_tracker, then vol_oi_zero_visual and tryouts on the vol/oi tables and the
+    snapshot ring the IV stage built from its in-memory chain (processing/oi_vol/vol_oi_initial.py).
+    """
+    vol_oi_tracker_module = "processing.oi_vol.vol_oi_tracker"  # window summaries of the snapshot ring
+    vol_oi_visual_module = "processing.oi_vol.vol_oi_zero_visual"  # put/call chart payloads (processing/chart_shell.py)
+    vol_oi_tryouts_module = "processing.oi_vol.tryouts"  # strike x expiration heatmaps (processing/heatmap.py)
 
     logger.info("Starting vol_oi scripts sequence...")
 
-    # Run vol_oi_initial.py and wait for completion
-    run_script(vol_oi_initial_path)
+    # Run vol_oi_tracker and wait for completion
+    run_module(vol_oi_tracker_module)
     time.sleep(0.1)
 
-    # Run vol_oi_tracker.py and wait for completion
-    run_script(vol_oi_tracker_path)
+    # Run vol_oi_zero_visual after vol_oi_tracker completes
+    run_module(vol_oi_visual_module)
     time.sleep(0.1)
 
-    # Run vol_oi_zero_visual.py after vol_oi_tracker completes
-    run_script(vol_oi_visual_path)
-    time.sleep(0.1)
-
-    # run tryouts.py after vol_oi_visual.py completes
-    run_script(vol_oi_tryouts_path)
+    # run tryouts after vol_oi_visual.py completes
+    run_module(vol_oi_tryouts_module)
     time.sleep(0.1)
 
     logger.info("Completed vol_oi scripts sequence.")
 
-def run_iv_models_parallel():
-    """Run IV model scripts in parallel, starting vol_oi_zero_visual.py only after vol_oi_initial and vol_oi_tracker complete."""
-    logger.info(f"Starting IV model scripts in parallel - Selected: {iv_method_selected}")
-
-    # Run vol_oi scripts sequentially first
-    run_vol_oi_scripts()
+def run_iv_stage():
+    """Run the single IV stage for the selected model(s), then the vol_oi scripts."""
+    logger.info(f"Starting IV stage - Selected: {iv_method_selected}")
 
-    selected_scripts = []
-    if iv_method_selected == "All":
-        selected_scripts = list(iv_model_scripts_all.values())  # Run all IV models
-    elif iv_method_selected in iv_model_scripts_all:
-        selected_scripts.append(iv_model_scripts_all[iv_method_selected])  # Run only the selected IV model
+    # One process reads the chain once, writes the vol/oi tables and runs every selected model over shared arrays
+    run_module(iv_stage_module)
 
-    with ThreadPoolExecutor(max_workers=len(selected_scripts)) as executor:
-        futures = [executor.submit(run_script, os.path.join(os.getcwd(), script)) for script in selected_scripts]
-        for future in as_completed(futures):
-            future.result()
+    # Vol/oi tracking and charts on the tables the IV stage wrote
+    run_vol_oi_scripts()
 
-    logger.info("✅ Completed IV model scripts execution.")
+    logger.info("✅ Completed IV stage execution.")
 
 # ---------------------------- Main Execution Loop ---------------------------- #
 def main():
@@ -149,16 +145,11 @@ def main():
         # Run initial sequential scripts
         run_sequential_scripts(sequential_scripts_before_iv)
         
-        # Run IV models in parallel with vol_oi scripts
-        run_iv_models_parallel()
+        # Run the IV stage (vol/oi tables included), then the vol_oi scripts
+        run_iv_stage()
         
-        # Run post-IV scripts, optionally skipping clean.py
-        scripts_after_iv = sequential_scripts_after_iv.copy()
-        if not run_clean:
-            scripts_after_iv.remove(clean_script)
-            logger.info("⏭️ Skipping clean.py as per user selection.")
-
-        run_sequential_scripts(scripts_after_iv)
+        # Run post-IV scripts (kClean is applied inside the exposure stage)
+        run_sequential_scripts(sequential_scripts_after_iv)
         
         logger.info(f"⏳ All scripts executed. Sleeping for {interval_seconds} seconds...")
         time.sleep(interval_seconds)  # Sleep based on user-selected interval